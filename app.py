@@ -1,13 +1,14 @@
 import streamlit as st
 import os
-import fitz  # PyMuPDF
+import json
 import pandas as pd
-from utils.bom_handler import extract_bom_from_pdf
-from utils.pdf_to_tiff import convert_pdf_to_tiffs
-from utils.ocr_client import detect_text_with_boxes
-from utils.postprocess import extract_part_boxes
-from utils.linker import link_parts_by_page, find_anomalies
-from PIL import Image, ImageDraw
+from utils.bom_handler import extract_bom_from_pdf, list_manufacturers, TABLE_ENGINES
+from utils.pipeline import parse_page_range, iter_ocr_and_link
+from utils.document import DocumentSession
+from utils.metrics import get_metrics
+from utils.annotate import annotate_pdf
+from utils.results_store import get_results_store
+from utils.page_classifier import suggest_pages, format_page_range
 
 # ------------------------------
 # Streamlit setup
@@ -15,14 +16,31 @@ from PIL import Image, ImageDraw
 st.set_page_config(page_title="Exploded View OCR", layout="wide")
 st.title("Exploded View OCR")
 
-os.makedirs("tmp", exist_ok=True)
-
 # ------------------------------
 # Cache function
 # ------------------------------
 @st.cache_data(show_spinner="Extracting BOM from PDF...")
-def extract_bom_cached(pdf_path: str, table_pages: list, manufacturer: str):
-    return extract_bom_from_pdf(pdf_path, table_pages, manufacturer)
+def extract_bom_cached(file_key: str, table_pages: list, manufacturer: str, engine: str, _session: DocumentSession):
+    # Keyed by the PDF content hash; the session argument is not hashed
+    return extract_bom_from_pdf(_session, table_pages, manufacturer, engine=engine)
+
+# ------------------------------
+# Result rendering
+# ------------------------------
+def show_page(page_num: int, data: dict):
+    st.markdown(f"**Diagram Page {page_num}**")
+    st.write(f"Detected tokens: {data['detected_tokens'][page_num]}")
+    st.image(data["annotated_images"][page_num], caption=f"Diagram {page_num}", use_container_width=True)
+    st.dataframe(data["linked_tables"].get(page_num, pd.DataFrame()), use_container_width=True)
+
+def annotated_pdf_download(session: DocumentSession, data: dict):
+    # Box annotations on the original PDF: no rasterizing, so this is cheap to build
+    st.download_button(
+        "Download annotated PDF",
+        annotate_pdf(session, data["part_boxes"], data["page_dpi"]),
+        file_name=f"annotated_{session.name}.pdf",
+        mime="application/pdf",
+    )
 
 # ------------------------------
 # Step 0: Manufacturer
@@ -30,7 +48,8 @@ def extract_bom_cached(pdf_path: str, table_pages: list, manufacturer: str):
 st.subheader("Step 0: Select Manufacturer")
 if "manufacturer" not in st.session_state:
     st.session_state["manufacturer"] = "Liebherr"
-manufacturer = st.selectbox("Manufacturer", ["Liebherr", "Viking"], index=["Liebherr","Viking"].index(st.session_state["manufacturer"]))
+manufacturers = list_manufacturers()
+manufacturer = st.selectbox("Manufacturer", manufacturers, index=manufacturers.index(st.session_state["manufacturer"]))
 st.session_state["manufacturer"] = manufacturer
 
 # ------------------------------
@@ -38,44 +57,40 @@ st.session_state["manufacturer"] = manufacturer
 # ------------------------------
 uploaded_pdf = st.file_uploader("Upload Exploded View PDF", type=["pdf"])
 if uploaded_pdf:
-    pdf_path = os.path.join("tmp", uploaded_pdf.name)
-    with open(pdf_path, "wb") as f:
-        f.write(uploaded_pdf.getbuffer())
-    st.session_state["pdf_path"] = pdf_path
+    # One open document (and render cache) per upload, reused by every rerun;
+    # the upload is read from memory instead of being written to disk
+    if st.session_state.get("doc_file_id") != uploaded_pdf.file_id:
+        if "doc_session" in st.session_state:
+            st.session_state["doc_session"].close()
+        st.session_state["doc_session"] = DocumentSession(
+            uploaded_pdf.getvalue(), name=os.path.splitext(uploaded_pdf.name)[0]
+        )
+        st.session_state["doc_file_id"] = uploaded_pdf.file_id
+    session = st.session_state["doc_session"]
     st.success(f"PDF uploaded: {uploaded_pdf.name}")
 
     # Page count
-    doc = fitz.open(pdf_path)
-    total_pages = len(doc)
-    doc.close()
+    total_pages = session.page_count
     st.info(f"Total pages in PDF: {total_pages}")
 
     # ------------------------------
     # Step 2: Page selection
     # ------------------------------
     st.subheader("Step 2: Select Pages")
-    diagram_pages = st.text_input("Enter diagram pages (e.g., 1,3,5-7):")
-    table_pages = st.text_input("Enter table pages (e.g., 2,4,8):")
-
-    def parse_page_range(input_str, total_pages):
-        pages = set()
-        if not input_str:
-            return []
-        for p in input_str.split(","):
-            p = p.strip()
-            if "-" in p:
-                try:
-                    start, end = map(int, p.split("-"))
-                    for i in range(start, end + 1):
-                        if 1 <= i <= total_pages:
-                            pages.add(i)
-                except ValueError:
-                    continue
-            elif p.isdigit():
-                i = int(p)
-                if 1 <= i <= total_pages:
-                    pages.add(i)
-        return sorted(pages)
+    # Local layout pass (no API calls) to pre-fill the selections; edit them freely
+    if st.session_state.get("suggested_file_id") != uploaded_pdf.file_id:
+        with st.spinner("Classifying pages..."):
+            st.session_state["suggested_pages"] = suggest_pages(session)
+        st.session_state["suggested_file_id"] = uploaded_pdf.file_id
+    suggested = st.session_state["suggested_pages"]
+    st.caption(
+        f"Suggested from the page layout: {len(suggested['diagram'])} diagram, "
+        f"{len(suggested['table'])} BOM table and {len(suggested['other'])} other pages"
+    )
+    diagram_pages = st.text_input("Enter diagram pages (e.g., 1,3,5-7):", value=format_page_range(suggested["diagram"]),
+                                  key=f"diagram_pages_{uploaded_pdf.file_id}")
+    table_pages = st.text_input("Enter table pages (e.g., 2,4,8):", value=format_page_range(suggested["table"]),
+                                key=f"table_pages_{uploaded_pdf.file_id}")
 
     diagram_pages_list = parse_page_range(diagram_pages, total_pages)
     table_pages_list = parse_page_range(table_pages, total_pages)
@@ -85,10 +100,16 @@ if uploaded_pdf:
     # ------------------------------
     if table_pages_list:
         st.subheader("Step 3: Extract BOM from PDF")
+        table_engine = st.selectbox(
+            "Table engine", TABLE_ENGINES,
+            help="auto: read tables from the PDF text layer, upload only scanned pages to ExtractTable"
+        )
         if st.button("Extract BOM Table"):
             st.session_state["extracted_bom_df"] = extract_bom_cached(
-                pdf_path, tuple(table_pages_list), manufacturer
+                session.file_key, tuple(table_pages_list), manufacturer, table_engine, session
             )
+            for page_num, error in st.session_state["extracted_bom_df"].attrs.get("failed_pages", {}).items():
+                st.warning(f"Table page {page_num} could not be extracted: {error}")
 
     extracted_bom_df = st.session_state.get("extracted_bom_df", pd.DataFrame())
     if not extracted_bom_df.empty:
@@ -101,51 +122,78 @@ if uploaded_pdf:
     if diagram_pages_list and not extracted_bom_df.empty:
         st.subheader("Step 4: Run OCR and Link Parts")
         if st.button("Run OCR and Link"):
-            pdf_path = st.session_state["pdf_path"]
-            tiff_files = convert_pdf_to_tiffs(pdf_path, diagram_pages_list)
-            bom_refs = set(extracted_bom_df["REF"].astype(str).str.upper())
-            detected_refs_by_page = {}
-            annotated_images = {}
-
-            for page_num, tiff_path in zip(diagram_pages_list, tiff_files):
-                full_text, words = detect_text_with_boxes(tiff_path)
-                part_boxes = extract_part_boxes(words, bom_refs)
-                detected_refs_by_page[page_num] = part_boxes
-                detected_tokens = {box["token"] for box in part_boxes}
-                st.write(f"Page {page_num} detected tokens: {detected_tokens}")
-
-                img = Image.open(tiff_path).convert("RGB")
-                draw = ImageDraw.Draw(img)
-                for box in part_boxes:
-                    x, y, w, h = box["x"], box["y"], box["w"], box["h"]
-                    x0, y0 = x - w / 2, y - h / 2
-                    x1, y1 = x + w / 2, y + h / 2
-                    color = "green" if box["color"] == "green" else "red"
-                    draw.rectangle([x0, y0, x1, y1], outline=color, width=3)
-
-                annotated_path = os.path.join("tmp", f"annotated_diagram_{page_num}.png")
-                img.save(annotated_path)
-                annotated_images[page_num] = annotated_path
-
-            linked_tables = link_parts_by_page(detected_refs_by_page, extracted_bom_df)
-            anomalies_table = find_anomalies(
-                {p: {b["token"] for b in boxes} for p, boxes in detected_refs_by_page.items()},
-                extracted_bom_df
+            data = {"detected_tokens": {}, "part_boxes": {}, "page_dpi": {}, "annotated_images": {},
+                    "linked_tables": {}, "anomalies_table": pd.DataFrame(),
+                    "done": 0, "total": len(diagram_pages_list)}
+            # Kept in session state as pages finish, so a cancelled run keeps its pages
+            st.session_state["linked_data"] = data
+            # Any widget interaction stops the running script; this button makes that explicit
+            st.button("Cancel")
+            progress = st.progress(0.0, text="Starting OCR...")
+            st.subheader("Linked BOM Tables (per diagram page)")
+            pages_area = st.container()
+            st.subheader("Anomalies Table")
+            anomalies_area = st.empty()
+
+            # Vector overlay: the browser only gets downscaled previews
+            for page in iter_ocr_and_link(session, diagram_pages_list, extracted_bom_df, overlay="vector"):
+                page_num = page["page"]
+                data["detected_tokens"][page_num] = {box["token"] for box in page["part_boxes"]}
+                data["part_boxes"][page_num] = page["part_boxes"]
+                data["page_dpi"][page_num] = page["page_dpi"]
+                data["annotated_images"][page_num] = page["annotated_image"]
+                data["linked_tables"][page_num] = page["linked_table"]
+                data["anomalies_table"] = page["anomalies_table"]
+                data["done"] = page["done"]
+                with pages_area:
+                    if page["error"]:
+                        st.warning(f"Page {page_num}: OCR failed after retries, results are incomplete ({page['error']})")
+                    show_page(page_num, data)
+                anomalies_area.dataframe(data["anomalies_table"], use_container_width=True)
+                progress.progress(page["done"] / page["total"], text=f"Processed {page['done']} of {page['total']} pages")
+            progress.empty()
+            store = get_results_store()
+            if store is not None:
+                store.save_document(session, manufacturer, extracted_bom_df, data["linked_tables"], data["page_dpi"])
+            annotated_pdf_download(session, data)
+
+        elif "linked_data" in st.session_state:
+            data = st.session_state["linked_data"]
+            if data["done"] < data["total"]:
+                st.warning(f"Run cancelled after {data['done']} of {data['total']} pages.")
+            st.subheader("Linked BOM Tables (per diagram page)")
+            for page_num in data["annotated_images"]:
+                show_page(page_num, data)
+
+            st.subheader("Anomalies Table")
+            st.dataframe(data["anomalies_table"], use_container_width=True)
+            annotated_pdf_download(session, data)
+
+# ------------------------------
+# Search processed manuals
+# ------------------------------
+results_store = get_results_store()
+if results_store is not None:
+    with st.sidebar.expander("Find a part in processed manuals"):
+        search_part = st.text_input("Part number")
+        search_ref = st.text_input("REF")
+        search_manufacturer = st.selectbox("Manufacturer filter", [""] + manufacturers)
+        if search_part or search_ref:
+            st.dataframe(
+                results_store.find_part(search_part, search_ref, search_manufacturer or None),
+                use_container_width=True,
             )
 
-            st.session_state["linked_data"] = {
-                "annotated_images": annotated_images,
-                "linked_tables": linked_tables,
-                "anomalies_table": anomalies_table
-            }
-
-    if "linked_data" in st.session_state:
-        data = st.session_state["linked_data"]
-        st.subheader("Linked BOM Tables (per diagram page)")
-        for page_num, img_path in data["annotated_images"].items():
-            st.markdown(f"**Diagram Page {page_num}**")
-            st.image(img_path, caption=f"Diagram {page_num}", use_container_width=True)
-            st.dataframe(data["linked_tables"].get(page_num, pd.DataFrame()), use_container_width=True)
-
-        st.subheader("Anomalies Table")
-        st.dataframe(data["anomalies_table"], use_container_width=True)
+# ------------------------------
+# Pipeline metrics (this server process)
+# ------------------------------
+with st.sidebar.expander("Pipeline metrics"):
+    metrics_summary = get_metrics().summary()
+    stages = metrics_summary.pop("stages")
+    if stages:
+        st.dataframe(pd.DataFrame.from_dict(stages, orient="index"), use_container_width=True)
+    st.json(metrics_summary)
+    report = get_metrics().snapshot()
+    report["summary"] = get_metrics().summary()
+    st.download_button("Download metrics JSON", json.dumps(report, indent=2, default=str),
+                       file_name="metrics.json", mime="application/json")
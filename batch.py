@@ -0,0 +1,89 @@
+"""
+Headless batch runner for the Exploded View OCR pipeline.
+
+Examples:
+    python batch.py manuals/ --manufacturer Liebherr --diagram-pages 1-4 --table-pages 5-8 --workers 8
+    python batch.py manifest.csv --output-dir results
+    python batch.py manuals/ --manufacturer Viking    # diagram/table pages classified automatically
+
+Manifest columns (CSV) or keys (JSON list): pdf, manufacturer, diagram_pages, table_pages
+"""
+import argparse
+import os
+import sys
+
+from utils.bom_handler import TABLE_ENGINES
+from utils.cache import get_cache
+from utils.metrics import get_metrics, serve_prometheus
+from utils.tiling import TILING_MODES
+from utils.annotate import OVERLAY_MODES
+from utils.encoding import UPLOAD_ENCODINGS
+from utils.pipeline import load_jobs, run_batch
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run BOM extraction, OCR and linking over many PDFs.")
+    parser.add_argument("source", help="Directory of PDFs or a .csv/.json manifest")
+    parser.add_argument("--manufacturer", help="Default manufacturer (e.g. Liebherr, Viking)")
+    parser.add_argument("--diagram-pages", help="Default diagram pages (e.g. 1,3,5-7; default: classified automatically)")
+    parser.add_argument("--table-pages", help="Default table pages (e.g. 2,4,8; default: classified automatically)")
+    parser.add_argument("--output-dir", default="output", help="Folder for per-document results")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--no-cache", action="store_true", help="Do not read or write the OCR/table result cache")
+    parser.add_argument("--clear-cache", action="store_true", help="Delete all cached OCR/table results before running")
+    parser.add_argument("--no-text-layer", action="store_true", help="Always OCR diagram pages, ignoring PDF text")
+    parser.add_argument("--table-engine", choices=TABLE_ENGINES, default="auto",
+                        help="BOM table engine: local text-layer tables, ExtractTable, or local with ExtractTable fallback")
+    parser.add_argument("--tiling", choices=TILING_MODES, default="auto",
+                        help="OCR large sheets in overlapping tiles (auto: pages above the tile threshold)")
+    parser.add_argument("--overlay", choices=OVERLAY_MODES, default="png",
+                        help="png: full-resolution annotated pages; vector: JSON/SVG overlays, previews and annotated.pdf")
+    parser.add_argument("--upload-encoding", choices=UPLOAD_ENCODINGS, default=None,
+                        help="Image encoding sent to Vision/ExtractTable (default: auto; png is the old RGB PNG)")
+    parser.add_argument("--results-db", default=None,
+                        help="SQLite results store (default: $PIPELINE_RESULTS_DB or tmp/results.sqlite; 'off' disables)")
+    parser.add_argument("--memory-budget", type=float, default=None,
+                        help="Peak MB of page buffers per worker: grayscale renders, lower DPI or tiles to fit")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="Serve Prometheus metrics on this port at /metrics while the batch runs")
+    args = parser.parse_args(argv)
+
+    if args.upload_encoding:
+        os.environ["PIPELINE_UPLOAD_ENCODING"] = args.upload_encoding  # inherited by worker processes
+    if args.results_db:
+        os.environ["PIPELINE_RESULTS_DB"] = args.results_db  # inherited by worker processes
+    if args.memory_budget:
+        os.environ["PIPELINE_MEMORY_BUDGET_MB"] = str(args.memory_budget)  # inherited by worker processes
+    if args.no_cache:
+        os.environ["PIPELINE_CACHE"] = "0"  # inherited by worker processes
+    elif args.clear_cache and get_cache() is not None:
+        get_cache().clear()
+
+    jobs = load_jobs(args.source, args.manufacturer, args.diagram_pages, args.table_pages)
+    if not jobs:
+        print(f"No PDFs found in {args.source}")
+        return 1
+    for job in jobs:
+        job["use_text_layer"] = not args.no_text_layer
+        job.setdefault("table_engine", args.table_engine)
+        job.setdefault("tiling", args.tiling)
+        job.setdefault("overlay", args.overlay)
+
+    if args.metrics_port:
+        serve_prometheus(args.metrics_port)
+        print(f"Serving metrics on http://0.0.0.0:{args.metrics_port}/metrics")
+
+    summaries = run_batch(jobs, output_dir=args.output_dir, workers=args.workers)
+    failed = [s for s in summaries if s["status"] != "ok"]
+    print(f"Processed {len(summaries)} documents, {len(failed)} failed. Results in {args.output_dir}")
+    print(f"  peak worker RSS {max((s.get('peak_rss_mb', 0) for s in summaries), default=0):.0f} MB")
+    metrics_summary = get_metrics().summary()
+    for stage, agg in metrics_summary["stages"].items():
+        print(f"  {stage:<18}{agg['count']:>6} x {agg['seconds']:>9.3f}s total")
+    print(f"  uploaded {metrics_summary['bytes_uploaded'] / 2**20:.1f} MB, "
+          f"encoding saved {metrics_summary['upload_bytes_saved'] / 2**20:.1f} MB")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
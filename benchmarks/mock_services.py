@@ -0,0 +1,184 @@
+"""
+Local stand-ins for the paid APIs, for offline benchmarks:
+
+- a Vision images:annotate server returning DOCUMENT_TEXT_DETECTION-shaped responses
+- an ExtractTable server plus a client with the ExtractTable session API
+  (process_file/check_usage), selected through EXTRACTTABLE_SESSION_FACTORY
+
+Both servers sleep for a configurable latency (fixed + per uploaded MB) so
+network-bound stages can be measured without spending quota.
+"""
+import base64
+import json
+import os
+import random
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Tuple
+
+import pandas as pd
+import requests
+
+from benchmarks.synthetic import DESCRIPTION_WORDS
+
+MOCK_TABLE_URL_ENV = "MOCK_EXTRACTTABLE_URL"
+NOISE_WORDS = ["EXPLODED", "VIEW", "SCREW", "ASSY", "Fig."]
+
+
+def _image_size(data: bytes) -> Tuple[int, int]:
+    """
+    Width/height from a PNG header; other formats get a nominal letter page at 300 DPI.
+    """
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        return struct.unpack(">II", data[16:24])
+    return 2550, 3300
+
+
+def _fake_words(width: int, height: int, count: int, rng: random.Random) -> List[Dict]:
+    annotations = []
+    for i in range(count):
+        text = str(i + 1) if i % 8 else rng.choice(NOISE_WORDS)
+        w, h = 12 * len(text), 18
+        x, y = rng.randint(0, max(0, width - w)), rng.randint(0, max(0, height - h))
+        annotations.append({
+            "description": text,
+            "boundingPoly": {"vertices": [
+                {"x": x, "y": y}, {"x": x + w, "y": y}, {"x": x + w, "y": y + h}, {"x": x, "y": y + h}
+            ]},
+        })
+    return annotations
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "MockService/1.0"
+
+    def log_message(self, format, *args):  # keep benchmark output clean
+        pass
+
+    def _delay(self, payload_bytes: int):
+        cfg = self.server.config
+        time.sleep(cfg["latency"] + cfg["latency_per_mb"] * payload_bytes / (1024 * 1024))
+
+    def _send_json(self, data: Dict, status: int = 200):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        payload = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        with self.server.stats_lock:
+            self.server.stats["requests"] += 1
+            self.server.stats["bytes"] += len(payload)
+        self._delay(len(payload))
+        if self.path.startswith("/v1/images:annotate"):
+            self._annotate(payload)
+        elif self.path.startswith("/extracttable"):
+            self._extract_table(payload)
+        else:
+            self._send_json({"error": {"message": "not found"}}, status=404)
+
+    def _annotate(self, payload: bytes):
+        cfg = self.server.config
+        responses = []
+        for req in json.loads(payload).get("requests", []):
+            data = base64.b64decode(req["image"]["content"])
+            width, height = _image_size(data)
+            rng = random.Random(len(data))
+            words = _fake_words(width, height, cfg["words_per_image"], rng)
+            text = " ".join(w["description"] for w in words)
+            responses.append({
+                "textAnnotations": [{"description": text}] + words,
+                "fullTextAnnotation": {"text": text},
+            })
+        self._send_json({"responses": responses})
+
+    def _extract_table(self, payload: bytes):
+        cfg = self.server.config
+        rows = [["Remark", "Item", "Part No.", "Quantity", "Description"]]
+        # Descriptions must not look like a header row (profiles drop rows matching e.g. "part")
+        rows += [["", str(i), f"L{100000 + i}", "1", DESCRIPTION_WORDS[i % len(DESCRIPTION_WORDS)]]
+                 for i in range(1, cfg["rows_per_table"] + 1)]
+        self._send_json({"tables": [rows]})
+
+
+class MockServer:
+    """
+    Threaded local server for both stand-ins. Use as a context manager:
+
+        with MockServer(latency=0.3) as server:
+            os.environ["VISION_ENDPOINT"] = server.vision_endpoint
+    """
+
+    def __init__(self, latency: float = 0.2, latency_per_mb: float = 0.05, words_per_image: int = 60,
+                 rows_per_table: int = 40, host: str = "127.0.0.1", port: int = 0):
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.config = {
+            "latency": latency,
+            "latency_per_mb": latency_per_mb,
+            "words_per_image": words_per_image,
+            "rows_per_table": rows_per_table,
+        }
+        self.httpd.stats = {"requests": 0, "bytes": 0}
+        self.httpd.stats_lock = threading.Lock()
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def vision_endpoint(self) -> str:
+        return f"{self.base_url}/v1/images:annotate"
+
+    @property
+    def table_url(self) -> str:
+        return f"{self.base_url}/extracttable"
+
+    @property
+    def stats(self) -> Dict:
+        return dict(self.httpd.stats)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class MockExtractTable:
+    """
+    Drop-in for ExtractTable sessions that posts pages to the local stand-in at
+    $MOCK_EXTRACTTABLE_URL. Enable with
+    EXTRACTTABLE_SESSION_FACTORY="benchmarks.mock_services:MockExtractTable".
+    """
+
+    def __init__(self, api_key=None):
+        self.url = os.environ[MOCK_TABLE_URL_ENV]
+        self.session = requests.Session()
+
+    def check_usage(self) -> Dict:
+        return {"credits": 1_000_000, "queued": 0, "used": 0}
+
+    def process_file(self, filepath, output_format="df", **kwargs):
+        with open(filepath, "rb") as f:
+            resp = self.session.post(self.url, data=f.read(), timeout=120)
+        tables = resp.json()["tables"]
+        return [
+            pd.DataFrame(rows, columns=[str(i) for i in range(len(rows[0]))])
+            for rows in tables
+        ]
@@ -0,0 +1,220 @@
+"""
+Offline pipeline benchmarks against local Vision/ExtractTable stand-ins.
+
+    python -m benchmarks.run_benchmarks --pages 4,16,64 --workers 1,2,4 --latency 0.3
+    python -m benchmarks.run_benchmarks --scanned --output bench_results.json
+
+For every page count a synthetic manual is generated and each stage of the
+app flow (render, OCR, postprocess, link, BOM extraction, end to end) is run in
+a fresh process, recording wall time, Python allocation peak (tracemalloc) and
+process peak RSS. Worker scaling runs the batch pipeline over several copies of
+a manual with each worker count. The OCR/table result cache and the results
+store are disabled.
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Dict, List
+
+from benchmarks.mock_services import MockServer, MOCK_TABLE_URL_ENV
+from benchmarks.synthetic import make_manual
+
+
+def _rss_mb(who=resource.RUSAGE_SELF) -> float:
+    return resource.getrusage(who).ru_maxrss / 1024  # Linux reports KiB
+
+
+class _Stage:
+    """
+    Times one stage and records its tracemalloc peak and the process RSS high-water mark.
+    """
+
+    def __init__(self, results: Dict, name: str):
+        self.results, self.name = results, name
+
+    def __enter__(self):
+        tracemalloc.reset_peak()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.start
+        self.results[self.name] = {
+            "seconds": round(seconds, 4),
+            "py_peak_mb": round(tracemalloc.get_traced_memory()[1] / 2**20, 2),
+            "rss_peak_mb": round(_rss_mb(), 1),
+        }
+
+
+def _stage_suite(job: Dict, work_dir: str) -> Dict:
+    """
+    Run each app stage once on job's manual (executed in a fresh process).
+    """
+    import fitz  # PyMuPDF
+    from utils.bom_handler import extract_bom_from_pdf
+    from utils.linker import link_and_find_anomalies
+    from utils.ocr_client import detect_text_batch
+    from utils.encoding import encode_for_upload
+    from utils.pdf_to_tiff import convert_pdf_to_tiffs, render_pages
+    from utils.pipeline import parse_page_range, process_document
+    from utils.postprocess import extract_part_boxes
+    from utils.page_classifier import suggest_pages
+
+    tracemalloc.start()
+    results = {}
+    with fitz.open(job["pdf"]) as doc:
+        total = len(doc)
+    diagram_pages = parse_page_range(job["diagram_pages"], total)
+    table_pages = parse_page_range(job["table_pages"], total)
+
+    with _Stage(results, "classify"):
+        suggested = suggest_pages(job["pdf"])
+    results["classify"]["found_diagram_pages"] = len(set(suggested["diagram"]) & set(diagram_pages))
+    results["classify"]["found_table_pages"] = len(set(suggested["table"]) & set(table_pages))
+    with _Stage(results, "render_tiff"):
+        convert_pdf_to_tiffs(job["pdf"], diagram_pages, output_dir=os.path.join(work_dir, "tiffs"))
+    with _Stage(results, "render_memory"):
+        images = [encode_for_upload(pix, "vision")[0] for _, pix in render_pages(job["pdf"], diagram_pages)]
+    results["render_memory"]["upload_mb"] = round(sum(len(img) for img in images) / 2**20, 2)
+    with _Stage(results, "ocr"):
+        ocr_results = detect_text_batch(images)
+    del images
+
+    with _Stage(results, "bom_extracttable"):
+        bom_df = extract_bom_from_pdf(job["pdf"], table_pages, job["manufacturer"], engine="extracttable")
+    with _Stage(results, "bom_local"):
+        local_bom = extract_bom_from_pdf(job["pdf"], table_pages, job["manufacturer"], engine="local")
+    if not local_bom.empty:
+        bom_df = local_bom
+
+    bom_refs = set(bom_df["REF"].astype(str).str.upper())
+    with _Stage(results, "postprocess"):
+        boxes = {p: extract_part_boxes(words, bom_refs) for p, (_, words) in zip(diagram_pages, ocr_results)}
+    with _Stage(results, "link"):
+        link_and_find_anomalies(boxes, bom_df)
+
+    with _Stage(results, "end_to_end"):
+        summary = process_document(job, os.path.join(work_dir, "out"))
+    results["end_to_end"]["status"] = summary["status"]
+    return results
+
+
+def _batch_run(jobs: List[Dict], workers: int, work_dir: str) -> Dict:
+    from utils.pipeline import run_batch
+
+    start = time.perf_counter()
+    summaries = run_batch(jobs, output_dir=work_dir, workers=workers)
+    return {
+        "seconds": round(time.perf_counter() - start, 4),
+        "failed": sum(s["status"] != "ok" for s in summaries),
+        "rss_peak_mb": round(max(_rss_mb(), _rss_mb(resource.RUSAGE_CHILDREN)), 1),
+    }
+
+
+def _child(queue, fn, args):
+    try:
+        queue.put(fn(*args))
+    except Exception as e:
+        queue.put({"error": f"{type(e).__name__}: {e}"})
+
+
+def _in_fresh_process(fn, *args) -> Dict:
+    """
+    Run fn in a spawned interpreter so memory numbers start from a clean baseline.
+    """
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_child, args=(queue, fn, args))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+
+def _ints(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline throughput benchmarks with mock OCR/table services.")
+    parser.add_argument("--pages", type=_ints, default=[4, 16], help="Diagram page counts to generate (e.g. 4,16,64)")
+    parser.add_argument("--workers", type=_ints, default=[1, 2, 4], help="Worker counts for batch scaling")
+    parser.add_argument("--docs", type=int, default=8, help="Manuals per batch scaling run")
+    parser.add_argument("--callouts", type=int, default=40, help="Callouts per diagram page")
+    parser.add_argument("--bom-pages", type=int, default=2, help="BOM table pages per manual")
+    parser.add_argument("--scanned", action="store_true", help="Rasterize manuals (no text layer)")
+    parser.add_argument("--large-format", action="store_true", help="A1 diagram pages instead of Letter")
+    parser.add_argument("--memory-budget", type=float, default=0,
+                        help="PIPELINE_MEMORY_BUDGET_MB for the runs (0: unbounded renders)")
+    parser.add_argument("--latency", type=float, default=0.2, help="Mock service latency per call (s)")
+    parser.add_argument("--latency-per-mb", type=float, default=0.05, help="Mock latency per uploaded MB (s)")
+    parser.add_argument("--output", default="bench_results.json", help="JSON report path")
+    args = parser.parse_args(argv)
+
+    report = {"config": vars(args), "stages": {}, "scaling": {}}
+    with MockServer(latency=args.latency, latency_per_mb=args.latency_per_mb,
+                    words_per_image=args.callouts) as server, tempfile.TemporaryDirectory() as work_dir:
+        # Inherited by every spawned benchmark and worker process
+        os.environ.update({
+            "VISION_ENDPOINT": server.vision_endpoint,
+            MOCK_TABLE_URL_ENV: server.table_url,
+            "EXTRACTTABLE_SESSION_FACTORY": "benchmarks.mock_services:MockExtractTable",
+            "PIPELINE_CACHE": "0",
+            "PIPELINE_RESULTS_DB": "off",
+            # The stand-ins have no quota; measure the pipeline, not the client rate limits
+            "VISION_RATE_PER_S": "100000",
+            "EXTRACTTABLE_RATE_PER_S": "100000",
+            "PIPELINE_MEMORY_BUDGET_MB": str(args.memory_budget),
+        })
+        page_size = (1684, 2384) if args.large_format else (612, 792)
+
+        for pages in args.pages:
+            job = make_manual(
+                os.path.join(work_dir, f"manual_{pages}.pdf"), diagram_pages=pages, bom_pages=args.bom_pages,
+                callouts_per_page=args.callouts, scanned=args.scanned, page_size=page_size,
+            )
+            stage_dir = tempfile.mkdtemp(dir=work_dir)
+            report["stages"][pages] = _in_fresh_process(_stage_suite, job, stage_dir)
+            _print_stages(pages, report["stages"][pages])
+
+        pages = args.pages[0]
+        jobs = []
+        for i in range(args.docs):
+            job = make_manual(
+                os.path.join(work_dir, f"batch_{i}.pdf"), diagram_pages=pages, bom_pages=args.bom_pages,
+                callouts_per_page=args.callouts, scanned=args.scanned, page_size=page_size, seed=i,
+            )
+            jobs.append(job)
+        for workers in args.workers:
+            result = _in_fresh_process(_batch_run, jobs, workers, tempfile.mkdtemp(dir=work_dir))
+            if "seconds" in result:
+                result["docs_per_s"] = round(args.docs / result["seconds"], 3)
+                result["pages_per_s"] = round(args.docs * pages / result["seconds"], 3)
+            report["scaling"][workers] = result
+            print(f"workers={workers}: {result}")
+        report["mock_service"] = server.stats
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {args.output}")
+    return 0
+
+
+def _print_stages(pages: int, results: Dict):
+    print(f"\n{pages} diagram pages")
+    if "error" in results:
+        print(f"  failed: {results['error']}")
+        return
+    print(f"  {'stage':<18}{'seconds':>10}{'py peak MB':>12}{'RSS peak MB':>13}")
+    for name, r in results.items():
+        print(f"  {name:<18}{r['seconds']:>10.3f}{r['py_peak_mb']:>12.1f}{r['rss_peak_mb']:>13.1f}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
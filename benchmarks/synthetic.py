@@ -0,0 +1,135 @@
+"""
+Synthetic service manuals for benchmarks: exploded-view diagram pages with
+numbered callouts followed by ruled BOM table pages, generated with PyMuPDF.
+"""
+import random
+from typing import Dict, Tuple
+
+import fitz  # PyMuPDF
+
+# Header row and column of each field per manufacturer profile layout
+LAYOUTS = {
+    "liebherr": {
+        "header": ["Remark", "Item", "Part No.", "Quantity", "Description"],
+        "widths": [60, 50, 110, 70, 230],
+        "fields": {"REF": 1, "PART_NUMBER": 2, "QTY": 3, "DESCRIPTION": 4},
+    },
+    "viking": {
+        "header": ["Item", "Part No.", "Name", "Qty", "UoM"],
+        "widths": [50, 110, 250, 50, 60],
+        "fields": {"REF": 0, "PART_NUMBER": 1, "DESCRIPTION": 2, "QTY": 3},
+    },
+}
+DESCRIPTION_WORDS = ["bracket", "hinge", "gasket", "shelf", "drawer", "cover", "fan", "motor",
+                     "sensor", "valve", "tube", "clip", "seal", "panel", "lamp", "door"]
+
+
+def _draw_diagram(page, first_ref: int, callouts: int, rng: random.Random):
+    w, h = page.rect.width, page.rect.height
+    page.insert_text((40, 40), "EXPLODED VIEW", fontsize=14)
+    # Vector "parts": outlined boxes and circles
+    for _ in range(callouts):
+        x, y = rng.uniform(80, w - 120), rng.uniform(80, h - 120)
+        if rng.random() < 0.5:
+            page.draw_rect(fitz.Rect(x, y, x + rng.uniform(20, 60), y + rng.uniform(10, 40)), width=0.6)
+        else:
+            page.draw_circle((x, y), rng.uniform(5, 25), width=0.6)
+    # Callouts with leader lines
+    for ref in range(first_ref, first_ref + callouts):
+        x, y = rng.uniform(50, w - 60), rng.uniform(70, h - 70)
+        page.draw_line((x + 8, y - 3), (x + rng.uniform(20, 50), y + rng.uniform(-30, 30)), width=0.4)
+        page.insert_text((x, y), str(ref), fontsize=9)
+    page.insert_text((w / 2, h - 20), str(page.number + 1), fontsize=9)
+
+
+def _draw_bom(page, layout: Dict, first_ref: int, rows: int, prefix: str, rng: random.Random):
+    widths, fields = layout["widths"], layout["fields"]
+    x0, y, row_h = 30, 40, 16
+    xs = [x0]
+    for cw in widths:
+        xs.append(xs[-1] + cw)
+
+    def _row(cells, y):
+        for x, cell in zip(xs, cells):
+            page.insert_text((x + 3, y + row_h - 4), cell, fontsize=8)
+        page.draw_line((xs[0], y + row_h), (xs[-1], y + row_h), width=0.4)
+
+    page.draw_line((xs[0], y), (xs[-1], y), width=0.4)
+    _row(layout["header"], y)
+    for ref in range(first_ref, first_ref + rows):
+        y += row_h
+        cells = [""] * len(widths)
+        cells[fields["REF"]] = str(ref)
+        cells[fields["PART_NUMBER"]] = f"{prefix}{100000 + ref}"
+        cells[fields["DESCRIPTION"]] = " ".join(rng.sample(DESCRIPTION_WORDS, 2))
+        cells[fields["QTY"]] = str(rng.randint(1, 4))
+        _row(cells, y)
+    for x in xs:
+        page.draw_line((x, 40), (x, y + row_h), width=0.4)
+
+
+def _rasterize(doc: fitz.Document, page_indices, dpi: int = 200) -> fitz.Document:
+    """
+    Replace the given pages by grayscale scans of themselves (no text layer).
+    """
+    out = fitz.open()
+    for i, page in enumerate(doc):
+        if i in page_indices:
+            pix = page.get_pixmap(matrix=fitz.Matrix(dpi / 72, dpi / 72), colorspace=fitz.csGRAY)
+            new_page = out.new_page(width=page.rect.width, height=page.rect.height)
+            new_page.insert_image(new_page.rect, pixmap=pix)
+        else:
+            out.insert_pdf(doc, from_page=i, to_page=i)
+    return out
+
+
+def make_manual(
+    path: str,
+    diagram_pages: int = 4,
+    bom_pages: int = 2,
+    callouts_per_page: int = 40,
+    manufacturer: str = "Liebherr",
+    scanned: bool = False,
+    page_size: Tuple[float, float] = (612, 792),
+    missing_refs: int = 3,
+    seed: int = 0,
+) -> Dict:
+    """
+    Write a synthetic manual and return a batch job for it.
+    Diagram pages come first, then BOM pages listing every callout except the
+    last missing_refs (so the anomaly table is never empty).
+    scanned: rasterize all pages, forcing the OCR and ExtractTable paths
+    page_size: diagram page size in points (e.g. (1684, 2384) for A1)
+    """
+    rng = random.Random(seed)
+    layout = LAYOUTS[manufacturer.lower()]
+    doc = fitz.open()
+
+    total_refs = diagram_pages * callouts_per_page
+    for i in range(diagram_pages):
+        page = doc.new_page(width=page_size[0], height=page_size[1])
+        _draw_diagram(page, 1 + i * callouts_per_page, callouts_per_page, rng)
+
+    bom_refs = max(total_refs - missing_refs, 1)
+    rows_per_page = -(-bom_refs // max(bom_pages, 1))
+    for i in range(bom_pages):
+        first = 1 + i * rows_per_page
+        rows = max(0, min(rows_per_page, bom_refs - first + 1))
+        page = doc.new_page(width=612, height=max(792, 60 + (rows + 2) * 16))
+        _draw_bom(page, layout, first, rows, manufacturer[0].upper(), rng)
+
+    if scanned:
+        scanned_doc = _rasterize(doc, set(range(len(doc))))
+        doc.close()
+        doc = scanned_doc
+    doc.save(path, garbage=3, deflate=True)
+    doc.close()
+
+    diagram_range = f"1-{diagram_pages}"
+    table_range = f"{diagram_pages + 1}-{diagram_pages + bom_pages}"
+    return {
+        "pdf": path,
+        "manufacturer": manufacturer,
+        "diagram_pages": diagram_range,
+        "table_pages": table_range,
+    }
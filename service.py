@@ -0,0 +1,378 @@
+"""
+HTTP job service for the Exploded View OCR pipeline: jobs are queued in a
+persistent SQLite queue and processed by a fixed pool of worker processes.
+
+Examples:
+    python service.py --port 8080 --workers 4
+
+    curl -X POST --data-binary @manual.pdf -H "Content-Type: application/pdf" \\
+        "http://localhost:8080/jobs?manufacturer=Liebherr&diagram_pages=1-4&table_pages=5-8"
+    python service.py --pdf-root /shared/manuals   # also accept PDFs already on the server
+    curl -X POST -H "Content-Type: application/json" http://localhost:8080/jobs \\
+        -d '{"pdf": "/shared/manuals/manual.pdf", "manufacturer": "Viking"}'
+    curl http://localhost:8080/jobs/<id>
+    curl http://localhost:8080/jobs/<id>/results
+    curl -O http://localhost:8080/jobs/<id>/files/bom.csv
+
+Endpoints:
+    POST   /jobs                   queue a job (PDF body + query parameters, or JSON with a "pdf" path under --pdf-root)
+    GET    /jobs[?status=queued&limit=100]   recent jobs
+    GET    /jobs/<id>              status, queue position and summary
+    GET    /jobs/<id>/results      BOM, linked detections and anomalies as JSON
+    GET    /jobs/<id>/files/<path> an output file (bom.csv, linked_page_<n>.csv, overlays/..., annotated.pdf)
+    DELETE /jobs/<id>              cancel a queued job
+    GET    /health                 job counts and live workers
+
+Job parameters (query string or JSON keys): manufacturer (required), table_pages and
+diagram_pages (default: classified automatically), name, table_engine, tiling,
+overlay, use_text_layer.
+"""
+import argparse
+import csv
+import json
+import multiprocessing as mp
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from utils.bom_handler import TABLE_ENGINES, list_manufacturers
+from utils.tiling import TILING_MODES
+from utils.annotate import OVERLAY_MODES
+from utils.job_queue import JobQueue, QUEUE_DB, FINAL_STATES, JOB_STATES, worker_loop, worker_name
+
+JOB_ID_RE = re.compile(r"[0-9a-f]{32}")
+JOB_OPTIONS = {"table_engine": TABLE_ENGINES, "tiling": TILING_MODES, "overlay": OVERLAY_MODES}
+SUPERVISE_SECONDS = 5
+
+
+class JobService:
+    """
+    Queue, upload folder and worker pool behind the HTTP handler.
+    """
+
+    def __init__(self, queue_path: str, output_dir: str, upload_dir: str, workers: int,
+                 max_queued: int, max_upload_mb: float, pdf_root: str = None):
+        self.queue_path = queue_path
+        self.queue = JobQueue(queue_path)
+        self.output_dir = output_dir
+        self.upload_dir = upload_dir
+        self.workers = workers
+        self.max_queued = max_queued
+        self.max_upload_bytes = int(max_upload_mb * 1024 * 1024)
+        # Server-side "pdf" paths are only read below this folder (None: uploads only)
+        self.pdf_root = os.path.realpath(pdf_root) if pdf_root else None
+        self.manufacturers = set(list_manufacturers())
+        self._ctx = mp.get_context("spawn")  # the service process runs HTTP threads; don't fork them
+        self._stop = self._ctx.Event()
+        self._procs = []
+        os.makedirs(output_dir, exist_ok=True)
+        os.makedirs(upload_dir, exist_ok=True)
+
+    def start_workers(self):
+        requeued = self.queue.requeue_running()
+        if requeued:
+            print(f"Requeued {requeued} jobs left running by the previous service")
+        self._procs = [self._start_worker() for _ in range(self.workers)]
+
+    def _start_worker(self):
+        proc = self._ctx.Process(
+            target=worker_loop, args=(self.queue_path, self.output_dir, self.workers, self._stop), daemon=True
+        )
+        proc.start()
+        return proc
+
+    def supervise(self):
+        """
+        Replace workers that died (e.g. OOM-killed); the job they were running is failed.
+        """
+        for i, proc in enumerate(self._procs):
+            if not proc.is_alive() and not self._stop.is_set():
+                failed = self.queue.fail_running(worker_name(proc.pid), f"worker exited with code {proc.exitcode}")
+                print(f"Worker {proc.pid} exited ({proc.exitcode}), {failed} job(s) failed; restarting")
+                self._procs[i] = self._start_worker()
+
+    def alive_workers(self) -> int:
+        return sum(proc.is_alive() for proc in self._procs)
+
+    def stop(self, timeout: float = 30):
+        """
+        Let workers finish their current job (up to timeout); unfinished jobs are requeued on the next start.
+        """
+        self._stop.set()
+        for proc in self._procs:
+            proc.join(timeout)
+            if proc.is_alive():
+                proc.terminate()
+
+    def make_job(self, params: dict, pdf_path: str) -> dict:
+        """
+        process_document job from request parameters; raises ValueError for invalid ones.
+        """
+        manufacturer = params.get("manufacturer")
+        if not isinstance(manufacturer, str) or manufacturer not in self.manufacturers:
+            raise ValueError(f"manufacturer must be one of {sorted(self.manufacturers)}")
+        job = {
+            "pdf": pdf_path,
+            "manufacturer": manufacturer,
+            "table_pages": params.get("table_pages"),  # None: classified automatically
+            "diagram_pages": params.get("diagram_pages"),
+            "use_text_layer": str(params.get("use_text_layer", "true")).lower() not in ("0", "false", "no"),
+        }
+        for key, choices in JOB_OPTIONS.items():
+            if params.get(key):
+                if not isinstance(params[key], str) or params[key] not in choices:
+                    raise ValueError(f"{key} must be one of {choices}")
+                job[key] = params[key]
+        return job
+
+    def submit(self, params: dict, pdf_bytes: bytes = None) -> dict:
+        if self.queue.counts()["queued"] >= self.max_queued:
+            raise OverflowError("queue is full")
+        job_id = uuid.uuid4().hex
+        if pdf_bytes is not None:
+            if not pdf_bytes.startswith(b"%PDF"):
+                raise ValueError("body is not a PDF")
+            pdf_path = os.path.join(self.upload_dir, f"{job_id}.pdf")
+        else:
+            pdf_path = self.server_pdf(params.get("pdf"))
+        job = self.make_job(params, pdf_path)
+        job["name"] = job_id  # outputs go to output_dir/<id>
+        job["document_name"] = params.get("name") or os.path.splitext(os.path.basename(params.get("pdf") or job_id))[0]
+        if pdf_bytes is not None:
+            with open(pdf_path, "wb") as f:
+                f.write(pdf_bytes)
+        self.queue.submit(job, job_id)
+        return self.queue.get(job_id)
+
+    def server_pdf(self, pdf_path) -> str:
+        """
+        Resolved path of a PDF already on the server; raises ValueError unless it is under pdf_root.
+        """
+        if self.pdf_root is None:
+            raise ValueError("server-side pdf paths are disabled; upload the PDF as the request body")
+        if not isinstance(pdf_path, str) or not pdf_path:
+            raise ValueError("pdf must be a path under the server's pdf root")
+        path = os.path.realpath(os.path.join(self.pdf_root, pdf_path))
+        if not path.startswith(self.pdf_root + os.sep) or not os.path.isfile(path):
+            raise ValueError(f"pdf not found under the server's pdf root: {pdf_path}")
+        return path
+
+    def results(self, record: dict) -> dict:
+        """
+        A finished job's tables read back from its output folder.
+        """
+        job_dir = os.path.join(self.output_dir, record["id"])
+        linked = {}
+        for name in sorted(os.listdir(job_dir)) if os.path.isdir(job_dir) else []:
+            if name.startswith("linked_page_") and name.endswith(".csv"):
+                linked[int(name[len("linked_page_"):-4])] = _read_csv(os.path.join(job_dir, name))
+        return {
+            "id": record["id"],
+            "status": record["status"],
+            "summary": _public_summary(record["summary"]),
+            "bom": _read_csv(os.path.join(job_dir, "bom.csv")),
+            "linked": linked,
+            "anomalies": _read_csv(os.path.join(job_dir, "anomalies.csv")),
+            "files": _list_files(job_dir),
+        }
+
+
+def _read_csv(path: str):
+    if not os.path.isfile(path):
+        return []
+    with open(path, newline="") as f:
+        return list(csv.DictReader(f))
+
+
+def _list_files(job_dir: str):
+    files = []
+    for root, _, names in os.walk(job_dir):
+        files.extend(os.path.relpath(os.path.join(root, n), job_dir) for n in names)
+    return sorted(files)
+
+
+def _public_summary(summary):
+    # The raw spans and tracebacks are for the operator, not the API client
+    if not summary:
+        return summary
+    return {k: v for k, v in summary.items() if k not in ("metrics", "traceback", "output_dir", "pdf")}
+
+
+def make_handler(service: JobService):
+    class _Handler(BaseHTTPRequestHandler):
+        def _send_json(self, status: int, payload, headers=None):
+            body = json.dumps(payload, indent=2, default=str).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _error(self, status: int, message: str, headers=None):
+            self._send_json(status, {"error": message}, headers)
+
+        def _parts(self):
+            url = urlparse(self.path)
+            params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            return [p for p in url.path.split("/") if p], params
+
+        def _record(self, job_id: str):
+            record = service.queue.get(job_id)
+            if record is None:
+                self._error(404, f"unknown job {job_id}")
+            return record
+
+        def do_POST(self):
+            parts, params = self._parts()
+            if parts != ["jobs"]:
+                self._error(404, "not found")
+                return
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+            except ValueError:
+                self._error(400, "invalid Content-Length")
+                return
+            if length > service.max_upload_bytes:
+                self._error(413, f"upload larger than {service.max_upload_bytes // 2**20} MB")
+                return
+            body = self.rfile.read(length)
+            content_type = (self.headers.get("Content-Type") or "").split(";")[0].strip()
+            try:
+                if content_type == "application/json":
+                    fields = json.loads(body or b"{}")
+                    if not isinstance(fields, dict):
+                        raise ValueError("JSON body must be an object")
+                    record = service.submit({**params, **fields})
+                else:
+                    record = service.submit(params, pdf_bytes=body)
+            except OverflowError as e:
+                self._error(503, str(e), {"Retry-After": "60"})
+                return
+            except ValueError as e:  # includes invalid JSON
+                self._error(400, str(e))
+                return
+            self._send_json(202, _public_record(record), {"Location": f"/jobs/{record['id']}"})
+
+        def do_GET(self):
+            parts, params = self._parts()
+            if parts == ["health"]:
+                self._send_json(200, {"workers": service.workers, "alive_workers": service.alive_workers(),
+                                      "jobs": service.queue.counts()})
+            elif parts == ["jobs"]:
+                status, limit = params.get("status"), params.get("limit", "100")
+                if status and status not in JOB_STATES:
+                    self._error(400, f"status must be one of {JOB_STATES}")
+                elif not limit.isdigit() or int(limit) < 1:
+                    self._error(400, "limit must be a positive integer")
+                else:
+                    self._send_json(200, service.queue.list(status, int(limit)))
+            elif len(parts) == 2 and parts[0] == "jobs":
+                record = self._record(parts[1])
+                if record is not None:
+                    self._send_json(200, _public_record(record))
+            elif len(parts) == 3 and parts[0] == "jobs" and parts[2] == "results":
+                record = self._record(parts[1])
+                if record is None:
+                    return
+                if record["status"] not in FINAL_STATES:
+                    self._error(409, f"job is {record['status']}", {"Retry-After": "10"})
+                    return
+                self._send_json(200, service.results(record))
+            elif len(parts) >= 4 and parts[0] == "jobs" and parts[2] == "files":
+                self._send_file(parts[1], "/".join(parts[3:]))
+            else:
+                self._error(404, "not found")
+
+        def _send_file(self, job_id: str, rel_path: str):
+            # Only ids the service generated (uuid hex) and still knows name a job folder
+            if not JOB_ID_RE.fullmatch(job_id):
+                self._error(404, f"unknown job {job_id}")
+                return
+            if self._record(job_id) is None:
+                return
+            output_dir = os.path.realpath(service.output_dir)
+            job_dir = os.path.join(output_dir, job_id)
+            path = os.path.realpath(os.path.join(job_dir, rel_path))
+            if not path.startswith(job_dir + os.sep) or not os.path.isfile(path):
+                self._error(404, f"no file {rel_path} for job {job_id}")
+                return
+            content_type = {".csv": "text/csv", ".json": "application/json", ".png": "image/png",
+                            ".svg": "image/svg+xml", ".pdf": "application/pdf"}.get(
+                os.path.splitext(path)[1].lower(), "application/octet-stream")
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(os.path.getsize(path)))
+            self.end_headers()
+            with open(path, "rb") as f:
+                while chunk := f.read(1 << 20):
+                    self.wfile.write(chunk)
+
+        def do_DELETE(self):
+            parts, _ = self._parts()
+            if len(parts) != 2 or parts[0] != "jobs":
+                self._error(404, "not found")
+                return
+            record = self._record(parts[1])
+            if record is None:
+                return
+            if not service.queue.cancel(parts[1]):
+                self._error(409, f"job is {record['status']}; only queued jobs can be cancelled")
+                return
+            self._send_json(200, _public_record(service.queue.get(parts[1])))
+
+        def log_message(self, format, *args):
+            pass
+
+    return _Handler
+
+
+def _public_record(record: dict) -> dict:
+    record = dict(record)
+    record["job"] = {k: v for k, v in record.get("job", {}).items() if k != "pdf"}
+    record["summary"] = _public_summary(record.get("summary"))
+    record["links"] = {"status": f"/jobs/{record['id']}", "results": f"/jobs/{record['id']}/results"}
+    return record
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the OCR pipeline as an HTTP job queue with a worker pool.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--queue-db", default=QUEUE_DB, help="SQLite job queue (default: $PIPELINE_QUEUE_DB or tmp/jobs.sqlite)")
+    parser.add_argument("--output-dir", default="output", help="Folder for per-job results")
+    parser.add_argument("--upload-dir", default=os.path.join("tmp", "uploads"), help="Folder for uploaded PDFs")
+    parser.add_argument("--max-queued", type=int, default=100, help="Reject new jobs (503) beyond this many queued")
+    parser.add_argument("--max-upload-mb", type=float, default=200, help="Largest accepted PDF upload")
+    parser.add_argument("--pdf-root", default=None,
+                        help="Folder JSON jobs may name PDFs in (default: none, uploads only)")
+    args = parser.parse_args(argv)
+
+    service = JobService(args.queue_db, args.output_dir, args.upload_dir, args.workers or os.cpu_count() or 1,
+                         args.max_queued, args.max_upload_mb, args.pdf_root)
+    service.start_workers()
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(service))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Serving jobs on http://{args.host}:{args.port} with {service.workers} workers")
+    try:
+        while True:
+            time.sleep(SUPERVISE_SECONDS)
+            service.supervise()
+    except KeyboardInterrupt:
+        print("Stopping: waiting for running jobs")
+    finally:
+        server.shutdown()
+        service.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
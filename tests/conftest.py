@@ -0,0 +1,58 @@
+import os
+
+import pytest
+
+from benchmarks.mock_services import MockServer, MOCK_TABLE_URL_ENV
+from benchmarks.synthetic import make_manual
+
+
+@pytest.fixture(autouse=True, scope="session")
+def cache_dir(tmp_path_factory):
+    """
+    Keep the result cache and the precompiled lexicon out of the working tree.
+    """
+    with pytest.MonkeyPatch.context() as mp:
+        path = tmp_path_factory.mktemp("cache")
+        mp.setenv("PIPELINE_CACHE_DIR", str(path))
+        yield path
+
+
+@pytest.fixture(scope="session")
+def mock_services():
+    """
+    Local Vision/ExtractTable stand-ins (see benchmarks/mock_services.py).
+    """
+    with MockServer(latency=0, latency_per_mb=0) as server:
+        yield server
+
+
+@pytest.fixture
+def pipeline_env(mock_services, monkeypatch, tmp_path):
+    """
+    Point the pipeline at the stand-ins, with the result cache and results store off.
+    """
+    import utils.ocr_client as ocr_client
+
+    monkeypatch.setattr(ocr_client, "ENDPOINT_URL", f"{mock_services.vision_endpoint}?key=test")
+    monkeypatch.setattr(ocr_client, "API_KEY", "test")
+    for key, value in {
+        MOCK_TABLE_URL_ENV: mock_services.table_url,
+        "EXTRACTTABLE_SESSION_FACTORY": "benchmarks.mock_services:MockExtractTable",
+        "PIPELINE_CACHE": "0",
+        "PIPELINE_RESULTS_DB": "off",
+        "PIPELINE_MEMORY_BUDGET_MB": "0",
+        "VISION_RATE_PER_S": "100000",
+        "EXTRACTTABLE_RATE_PER_S": "100000",
+    }.items():
+        monkeypatch.setenv(key, value)
+    return tmp_path
+
+
+@pytest.fixture
+def manual(tmp_path):
+    """
+    Factory for synthetic manuals: manual(scanned=False, **make_manual kwargs) -> batch job.
+    """
+    def _make(name: str = "manual", **kwargs):
+        return make_manual(os.path.join(tmp_path, f"{name}.pdf"), **kwargs)
+    return _make
@@ -0,0 +1,62 @@
+import pandas as pd
+import pytest
+
+from utils import bom_handler
+from utils.bom_handler import (
+    BOM_COLUMNS, _parse_table, extract_bom_from_pdf, get_profile, list_manufacturers, register_profile
+)
+
+
+@pytest.fixture
+def profiles(monkeypatch):
+    # Profiles registered by a test do not outlive it
+    monkeypatch.setattr(bom_handler, "BOM_PROFILES", dict(bom_handler.BOM_PROFILES))
+    return bom_handler.BOM_PROFILES
+
+
+def test_builtin_profiles_are_registered():
+    assert {"Liebherr", "Viking"} <= set(list_manufacturers())
+    assert get_profile("VIKING") is get_profile("viking")
+    with pytest.raises(ValueError, match="Unsupported manufacturer"):
+        get_profile("acme")
+
+
+def test_register_profile(profiles):
+    profile = register_profile("Acme", columns={"REF": 3, "PART_NUMBER": 0, "DESCRIPTION": 1},
+                               min_columns=2, header_ignore={"Pos"})
+    assert get_profile("acme") is profile and "acme" in profiles
+    assert profile["label"] == "Acme"
+    assert profile["min_columns"] == 4  # wide enough for every mapped column
+    assert profile["header_ignore"] == {"pos"}
+    with pytest.raises(ValueError, match="DESCRIPTION"):
+        register_profile("broken", columns={"REF": 0, "PART_NUMBER": 1}, min_columns=2, header_ignore=set())
+
+
+def test_parse_table_viking():
+    table = pd.DataFrame([
+        ["Item", "Part No.", "Name", "Qty", "UoM"],
+        [" 1 ", "V-100", "Door hinge", "2", "EA"],
+        ["2", "", "Shelf", "1", "EA"],
+        ["", "V-300", "Gasket", "1", "EA"],
+        ["4", "V-400", "Fan motor", "1", "EA"],
+    ])
+    rows = _parse_table(table, get_profile("viking"), page_num=7)
+    assert list(rows.columns) == BOM_COLUMNS + ["PAGE"]
+    assert rows.values.tolist() == [["1", "V-100", "Door hinge", 7], ["4", "V-400", "Fan motor", 7]]
+
+
+def test_parse_table_liebherr_positions():
+    table = pd.DataFrame([
+        ["", "Item", "Part No.", "Quantity", "Description"],
+        ["x", "12", "L-12", "1", "Bracket"],
+    ])
+    rows = _parse_table(table, get_profile("liebherr"), page_num=1)
+    assert rows[BOM_COLUMNS].values.tolist() == [["12", "L-12", "Bracket"]]
+
+
+def test_extract_viking_bom_from_text_layer(pipeline_env, manual):
+    job = manual(diagram_pages=1, bom_pages=1, callouts_per_page=10, manufacturer="Viking")
+    bom = extract_bom_from_pdf(job["pdf"], [2], "Viking", engine="local")
+    assert bom["REF"].tolist() == [str(i) for i in range(1, 8)]  # 10 callouts, 3 left out of the BOM
+    assert bom["PART_NUMBER"].str.len().gt(0).all()
+    assert set(bom["PAGE"]) == {2}
@@ -0,0 +1,64 @@
+import pandas as pd
+
+from utils.linker import (
+    ANOMALY_COLUMNS, LINKED_COLUMNS, IncrementalLinker, build_ref_index, find_anomalies, link_and_find_anomalies
+)
+
+
+def _bom():
+    return pd.DataFrame({
+        "REF": ["1", "2", "2", "a3"],
+        "PART_NUMBER": ["P1", "P2", "P2-DUP", "P3"],
+        "DESCRIPTION": ["BOLT", "NUT", "NUT (again)", "WASHER"],
+    })
+
+
+def _box(token, x=10.0, color="green"):
+    return {"token": token, "x": x, "y": 20.0, "w": 8.0, "h": 12.0, "color": color}
+
+
+def test_ref_index_is_upper_cased_first_occurrence():
+    index = build_ref_index(_bom())
+    assert list(index.index) == ["1", "2", "A3"]
+    assert index.loc["2", "PART_NUMBER"] == "P2"
+    assert list(index.columns) == ["REF", "PART_NUMBER", "DESCRIPTION"]
+
+
+def test_incremental_anomalies_follow_the_pages():
+    linker = IncrementalLinker(_bom())
+    anomalies = linker.anomalies()
+    assert list(anomalies.columns) == ANOMALY_COLUMNS == ["Type", "REF", "PART_NUMBER", "DESCRIPTION"]
+    assert anomalies.values.tolist() == [
+        ["Not in Diagram", "1", "P1", "BOLT"],
+        ["Not in Diagram", "2", "P2", "NUT"],
+        ["Not in Diagram", "a3", "P3", "WASHER"],
+    ]
+
+    linked = linker.add_page(1, [_box("2", x=5), _box("A3", x=15), _box("99", color="red")])
+    assert list(linked.columns) == LINKED_COLUMNS
+    assert linked[["REF", "PART_NUMBER", "X"]].values.tolist() == [["2", "P2", 5.0], ["a3", "P3", 15.0]]
+    assert linker.anomalies().values.tolist() == [
+        ["Not in Diagram", "1", "P1", "BOLT"],
+        ["Not in BOM", "99", "", ""],
+    ]
+
+    linker.add_page(2, [_box("1")])
+    assert linker.anomalies().values.tolist() == [["Not in BOM", "99", "", ""]]
+
+
+def test_batch_and_incremental_linking_agree():
+    pages = {1: [_box("2"), _box("7")], 2: [_box("1")], 3: []}
+    linked, anomalies = link_and_find_anomalies(pages, _bom())
+
+    linker = IncrementalLinker(_bom())
+    for page_num, boxes in pages.items():
+        assert linker.add_page(page_num, boxes).equals(linked[page_num])
+    assert linker.anomalies().equals(anomalies)
+    refs = {page_num: {b["token"] for b in boxes} for page_num, boxes in pages.items()}
+    assert find_anomalies(refs, _bom()).equals(anomalies)
+
+
+def test_no_anomalies_is_an_empty_frame():
+    linker = IncrementalLinker(_bom())
+    linker.add_page(1, [_box("1"), _box("2"), _box("a3")])
+    assert linker.anomalies().empty
@@ -0,0 +1,34 @@
+import threading
+
+from utils.metrics import get_metrics, incr, metrics_scope
+
+
+def test_scope_leaves_process_registry_alone():
+    registry = get_metrics()
+    before = registry.counter_total("test_scoped")
+    with metrics_scope() as scope:
+        incr("test_scoped", 2)
+        assert get_metrics() is scope
+        assert scope.counter_total("test_scoped") == 2
+    assert get_metrics() is registry
+    assert registry.counter_total("test_scoped") == before
+
+
+def test_concurrent_scopes_are_separate():
+    inside, release, totals = threading.Barrier(2), threading.Event(), {}
+
+    def _document(name: str, count: int):
+        with metrics_scope() as scope:
+            incr("test_concurrent", count)
+            inside.wait(5)  # both scopes open at once
+            release.wait(5)
+            totals[name] = scope.counter_total("test_concurrent")
+
+    threads = [threading.Thread(target=_document, args=(name, n)) for name, n in (("a", 1), ("b", 5))]
+    for t in threads:
+        t.start()
+    release.set()
+    for t in threads:
+        t.join(5)
+    assert totals == {"a": 1, "b": 5}
+    assert get_metrics().counter_total("test_concurrent") == 0
@@ -0,0 +1,41 @@
+import fitz  # PyMuPDF
+import pytest
+
+from utils.page_classifier import classify_document, format_page_range, suggest_pages
+
+
+@pytest.mark.parametrize("kwargs", [
+    {},
+    {"manufacturer": "Viking"},
+    {"page_size": (1684, 2384)},  # A1 diagrams
+    {"callouts_per_page": 10},
+    {"scanned": True},
+    {"scanned": True, "page_size": (1684, 2384)},
+])
+def test_suggest_pages_finds_synthetic_diagrams_and_tables(manual, kwargs):
+    job = manual(diagram_pages=3, bom_pages=2, **kwargs)
+    suggested = suggest_pages(job["pdf"])
+    assert format_page_range(suggested["diagram"]) == job["diagram_pages"]
+    assert format_page_range(suggested["table"]) == job["table_pages"]
+
+
+def test_text_cover_and_blank_pages_are_other():
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_textbox(fitz.Rect(50, 50, 560, 740), "Read this manual before servicing the appliance. " * 60)
+    page = doc.new_page()
+    page.insert_text((200, 300), "SERVICE MANUAL", fontsize=30)
+    page.draw_rect(fitz.Rect(20, 20, 592, 772))
+    paper = fitz.Pixmap(fitz.csGRAY, fitz.IRect(0, 0, 100, 130), False)
+    paper.clear_with(245)
+    page = doc.new_page()
+    page.insert_image(page.rect, pixmap=paper)  # blank scan
+
+    results = classify_document(doc.tobytes())
+    assert [r["label"] for r in results] == ["other", "other", "other"]
+    assert results[2]["reason"] == "blank page"
+
+
+def test_format_page_range():
+    assert format_page_range([8, 1, 2, 3, 5, 7]) == "1-3,5,7-8"
+    assert format_page_range([]) == ""
@@ -0,0 +1,18 @@
+import gc
+
+import fitz  # PyMuPDF
+import pytest
+
+from utils.pdf_to_tiff import pixmap_to_image
+
+
+@pytest.mark.filterwarnings("error::pytest.PytestUnraisableExceptionWarning")
+@pytest.mark.parametrize("colorspace", [fitz.csRGB, fitz.csGRAY])
+def test_pixmap_to_image_outlives_pixmap(colorspace):
+    pix = fitz.Pixmap(colorspace, fitz.IRect(0, 0, 8, 4), False)
+    pix.clear_with(200)
+    img = pixmap_to_image(pix)
+    del pix
+    gc.collect()  # Pixmap.__del__ must be able to release its buffer
+    assert img.size == (8, 4)
+    assert img.getpixel((0, 0)) in (200, (200, 200, 200))
@@ -0,0 +1,86 @@
+import os
+
+import pytest
+
+from utils.pipeline import process_document
+
+
+@pytest.mark.parametrize("overlay", ["png", "vector"])
+@pytest.mark.parametrize("memory_budget", ["0", "40"])
+def test_process_document_vector_manual(pipeline_env, manual, monkeypatch, overlay, memory_budget):
+    monkeypatch.setenv("PIPELINE_MEMORY_BUDGET_MB", memory_budget)
+    job = manual(diagram_pages=2, bom_pages=1, callouts_per_page=20)
+    job["overlay"] = overlay
+    summary = process_document(job, str(pipeline_env / "out"))
+
+    assert summary["status"] == "ok", summary.get("traceback")
+    assert summary["bom_rows"] == 37
+    assert set(summary["linked_rows"]) == {1, 2}
+    assert all(rows > 0 for rows in summary["linked_rows"].values())
+    assert os.path.isfile(os.path.join(summary["output_dir"], "overlays", "annotated_diagram_1.png"))
+    if overlay == "vector":
+        assert os.path.isfile(os.path.join(summary["output_dir"], "annotated.pdf"))
+
+
+def test_process_document_scanned_manual(pipeline_env, manual):
+    # No text layer: diagrams go to (mock) Vision, the BOM to (mock) ExtractTable
+    job = manual(diagram_pages=2, bom_pages=1, callouts_per_page=20, scanned=True)
+    summary = process_document(job, str(pipeline_env / "out"))
+
+    assert summary["status"] == "ok", summary.get("traceback")
+    assert summary["bom_rows"] > 0
+    assert set(summary["word_sources"].values()) == {"ocr"}
+    assert all(rows > 0 for rows in summary["linked_rows"].values())
+
+
+@pytest.mark.parametrize("scanned", [False, True])
+def test_process_document_auto_pages(pipeline_env, manual, scanned):
+    job = manual(diagram_pages=2, bom_pages=1, callouts_per_page=20, scanned=scanned)
+    job["diagram_pages"] = job["table_pages"] = "auto"
+    summary = process_document(job, str(pipeline_env / "out"))
+
+    assert summary["status"] == "ok", summary.get("traceback")
+    assert summary["diagram_pages"] == [1, 2]
+    assert summary["table_pages"] == [3]
+
+
+def test_process_document_without_diagram_pages_is_incomplete(pipeline_env, manual):
+    job = manual(diagram_pages=0, bom_pages=1)
+    job["table_pages"], job["diagram_pages"] = "1", "auto"
+    summary = process_document(job, str(pipeline_env / "out"))
+
+    assert summary["status"] == "incomplete"
+    assert "no diagram pages" in summary["warning"]
+    assert "linked_rows" not in summary
+
+
+def test_document_metrics_include_ocr_threads(pipeline_env, manual):
+    from utils.metrics import get_metrics
+
+    before = get_metrics().counter_total("api_calls", service="vision")
+    job = manual(diagram_pages=2, bom_pages=1, callouts_per_page=20, scanned=True)
+    summary = process_document(job, str(pipeline_env / "out"))
+
+    vision_calls = sum(c["value"] for c in summary["metrics"]["counters"]
+                       if c["name"] == "api_calls" and c["labels"].get("service") == "vision")
+    assert vision_calls > 0
+    assert get_metrics().counter_total("api_calls", service="vision") == before
+
+
+def test_stored_page_results_follow_the_bom(pipeline_env, manual, monkeypatch):
+    import pandas as pd
+    import utils.pipeline as pipeline
+    from utils.cache import DiskCache
+
+    cache = DiskCache(str(pipeline_env / "cache"))
+    monkeypatch.setattr(pipeline, "get_cache", lambda: cache)
+    job = manual(diagram_pages=1, bom_pages=1, callouts_per_page=10)
+    bom = pd.DataFrame({"REF": [str(i) for i in range(1, 11)], "PART_NUMBER": "P", "DESCRIPTION": "D"})
+
+    def reused(bom_df):
+        return [r["reused"] for r in pipeline.iter_ocr_and_link(job["pdf"], [1], bom_df)]
+
+    assert reused(bom) == [False]
+    assert reused(bom) == [True]
+    # Another BOM can change whether the text layer holds callouts, so nothing is reused
+    assert reused(bom.iloc[:2]) == [False]
@@ -0,0 +1,43 @@
+from utils.postprocess import extract_part_boxes, merge_split_callouts, lexicon_path, load_lexicon
+from utils.spatial import GridIndex, suppress_duplicates
+
+
+def _word(text, x, y, w=20.0, h=30.0):
+    return {"text": text, "x": x, "y": y, "w": w, "h": h}
+
+
+def test_split_callout_is_merged_when_bom_lists_it():
+    words = [_word("1", 100, 100), _word("2", 135, 100), _word("7", 400, 100)]  # half a height apart
+    merged = merge_split_callouts(words, {"12", "7"})
+    assert sorted(w["text"] for w in merged) == ["12", "7"]
+    # Separate REFs side by side stay separate
+    assert len(merge_split_callouts(words, {"1", "2", "12", "7"})) == 3
+
+
+def test_duplicate_callouts_are_dropped():
+    words = [_word("12", 100, 100), _word("12", 102, 101), _word("12", 600, 100), _word("40", 300, 900)]
+    boxes = extract_part_boxes(words, {"12"})
+    assert [(b["token"], b["x"]) for b in boxes] == [("12", 100), ("12", 600)]  # 40 is the page number
+
+
+def test_grid_query_matches_brute_force():
+    boxes = [_word(str(i), (i * 37) % 500, (i * 91) % 700, 10 + i % 7, 12) for i in range(200)]
+    index = GridIndex.from_boxes(boxes)
+    rect = (120, 200, 260, 330)
+    expected = {i for i, b in enumerate(boxes)
+                if b["x"] - b["w"] / 2 <= rect[2] and b["x"] + b["w"] / 2 >= rect[0]
+                and b["y"] - b["h"] / 2 <= rect[3] and b["y"] + b["h"] / 2 >= rect[1]}
+    assert set(index.query(*rect)) == expected
+    assert suppress_duplicates(boxes + boxes[:5]) == boxes
+
+
+def test_lexicon_stays_in_memory_without_cache(tmp_path, monkeypatch):
+    monkeypatch.delenv("PIPELINE_LEXICON_PATH", raising=False)
+    monkeypatch.setenv("PIPELINE_CACHE_DIR", str(tmp_path))
+    monkeypatch.setenv("PIPELINE_CACHE", "0")
+    assert lexicon_path() is None
+    assert "the" in load_lexicon()
+    assert list(tmp_path.iterdir()) == []
+
+    monkeypatch.setenv("PIPELINE_CACHE", "1")
+    assert lexicon_path().startswith(str(tmp_path))
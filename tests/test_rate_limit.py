@@ -0,0 +1,100 @@
+import pytest
+
+from utils import rate_limit
+from utils.rate_limit import ApiScheduler, QuotaExceeded, RetryableError, ServiceError, get_scheduler
+
+
+class FlakyCall:
+    """
+    Raises the given errors in turn, then returns "ok".
+    """
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+class HttpError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    slept = []
+    monkeypatch.setattr(rate_limit.time, "sleep", slept.append)
+    return slept
+
+
+def _scheduler(max_retries=3, budget=None):
+    return ApiScheduler("vision", rate_per_s=1000, burst=100, max_retries=max_retries, budget=budget)
+
+
+def test_transient_errors_are_retried_with_backoff(sleeps):
+    fn = FlakyCall(RetryableError("busy", status=503), HttpError(502))
+    assert _scheduler().call(fn) == "ok"
+    assert fn.calls == 3
+    assert len(sleeps) == 2
+    assert all(0 <= s <= rate_limit.BASE_DELAY * 2 ** i for i, s in enumerate(sleeps))
+
+
+def test_retry_after_is_honoured(sleeps):
+    fn = FlakyCall(RetryableError("slow down", status=429, retry_after=7.0))
+    assert _scheduler().call(fn) == "ok"
+    assert sleeps == [7.0]
+
+
+def test_gives_up_after_max_retries(sleeps):
+    scheduler = _scheduler(max_retries=2, budget=10)
+    fn = FlakyCall(*[RetryableError("busy", status=503)] * 5)
+    with pytest.raises(ServiceError, match="gave up after 3 attempts"):
+        scheduler.call(fn)
+    assert fn.calls == 3
+    assert scheduler.used == 0  # failed calls are not billed
+
+
+def test_permanent_error_is_not_retried(sleeps):
+    fn = FlakyCall(HttpError(400))
+    with pytest.raises(ServiceError):
+        _scheduler().call(fn)
+    assert fn.calls == 1
+    assert sleeps == []
+
+
+def test_quota_exceeded_before_calling(sleeps):
+    scheduler = _scheduler(budget=3)
+    fn = FlakyCall()
+    assert scheduler.call(fn, cost=2) == "ok"
+    with pytest.raises(QuotaExceeded):
+        scheduler.call(fn, cost=2)
+    assert fn.calls == 1
+
+
+def test_set_budget_keeps_usage_until_the_reported_value_changes(sleeps):
+    scheduler = _scheduler()
+    scheduler.set_budget(5)
+    scheduler.call(FlakyCall(), cost=4)
+    scheduler.set_budget(5)  # same usage reply again: the 4 units stay used
+    with pytest.raises(QuotaExceeded):
+        scheduler.call(FlakyCall(), cost=2)
+    scheduler.set_budget(1)  # fresh reply already accounts for them
+    assert scheduler.used == 0 and scheduler.budget == 1
+
+
+def test_budget_is_shared_between_worker_processes(monkeypatch):
+    monkeypatch.setattr(rate_limit, "_schedulers", {})
+    monkeypatch.setenv("PIPELINE_RATE_SHARE", "4")
+    monkeypatch.setenv("VISION_BUDGET", "100")
+    monkeypatch.setenv("VISION_RATE_PER_S", "40")
+    scheduler = get_scheduler("vision", "key")
+    assert scheduler.budget == 25
+    assert scheduler.bucket.rate == 10
+    scheduler.set_budget(80)
+    assert scheduler.budget == 20
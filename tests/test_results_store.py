@@ -0,0 +1,31 @@
+import fitz  # PyMuPDF
+import pandas as pd
+
+from utils.document import DocumentSession
+from utils.results_store import ResultsStore
+
+
+def _pdf_bytes() -> bytes:
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), "12")
+    return doc.tobytes()
+
+
+def test_save_document_path_and_upload(tmp_path):
+    store = ResultsStore(str(tmp_path / "results.sqlite"))
+    bom = pd.DataFrame([{"REF": "12", "PART_NUMBER": "L100012", "DESCRIPTION": "hinge", "PAGE": 2}])
+    linked = {1: pd.DataFrame([{"REF": "12", "PART_NUMBER": "L100012", "DESCRIPTION": "hinge",
+                                "X": 10.0, "Y": 20.0, "W": 8.0, "H": 12.0, "Color": "green"}])}
+    path = tmp_path / "manual.pdf"
+    path.write_bytes(_pdf_bytes())
+
+    with DocumentSession(str(path)) as session:
+        store.save_document(session, "Liebherr", bom, linked, {1: 300})
+    with DocumentSession(path.read_bytes() + b"\n", name="upload") as session:  # in memory, other content
+        store.save_document(session, "Liebherr", bom, linked, {1: 300})
+
+    docs = store.documents().set_index("name")
+    assert docs.loc["manual", "pdf_path"] == str(path)
+    assert docs.loc["upload", "pdf_path"] is None  # no file on disk to point to
+    assert len(store.find_part(part_number="L100012")) == 2
+    store.close()
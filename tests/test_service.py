@@ -0,0 +1,96 @@
+import http.client
+import json
+import os
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+import requests
+
+from service import JobService, make_handler
+
+
+@pytest.fixture
+def service(tmp_path):
+    """
+    Service with its HTTP handler on a local port and no worker processes (jobs stay queued).
+    """
+    pdf_root = tmp_path / "manuals"
+    pdf_root.mkdir()
+    (pdf_root / "manual.pdf").write_bytes(b"%PDF-1.7\n")
+    svc = JobService(str(tmp_path / "jobs.sqlite"), str(tmp_path / "out"), str(tmp_path / "uploads"),
+                     workers=1, max_queued=10, max_upload_mb=1, pdf_root=str(pdf_root))
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(svc))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    svc.url = f"http://127.0.0.1:{server.server_address[1]}"
+    yield svc
+    server.shutdown()
+    server.server_close()
+    svc.queue.close()
+
+
+@pytest.mark.parametrize("query", ["limit=abc", "limit=0", "status=bogus"])
+def test_list_jobs_rejects_bad_parameters(service, query):
+    resp = requests.get(f"{service.url}/jobs?{query}", timeout=5)
+    assert resp.status_code == 400
+    assert "error" in resp.json()
+
+
+@pytest.mark.parametrize("body", ["[1]", "\"manual.pdf\"", "{not json"])
+def test_submit_rejects_non_object_json(service, body):
+    resp = requests.post(f"{service.url}/jobs", data=body, headers={"Content-Type": "application/json"}, timeout=5)
+    assert resp.status_code == 400
+
+
+@pytest.mark.parametrize("pdf", ["/etc/passwd", "../jobs.sqlite", "missing.pdf", 42])
+def test_submit_confines_server_paths_to_pdf_root(service, pdf):
+    resp = requests.post(f"{service.url}/jobs", json={"pdf": pdf, "manufacturer": "Liebherr"}, timeout=5)
+    assert resp.status_code == 400
+
+
+def test_submit_server_path_and_upload(service):
+    resp = requests.post(f"{service.url}/jobs", json={"pdf": "manual.pdf", "manufacturer": "Liebherr"}, timeout=5)
+    assert resp.status_code == 202, resp.text
+    assert resp.json()["name"] == "manual"
+
+    resp = requests.post(f"{service.url}/jobs?manufacturer=Viking&name=upload", data=b"%PDF-1.7\n",
+                         headers={"Content-Type": "application/pdf"}, timeout=5)
+    assert resp.status_code == 202, resp.text
+    assert resp.json()["position"] == 1
+    assert [job["name"] for job in requests.get(f"{service.url}/jobs?limit=5", timeout=5).json()] == ["upload", "manual"]
+
+
+def test_server_paths_disabled_without_pdf_root(service):
+    service.pdf_root = None
+    resp = requests.post(f"{service.url}/jobs", json={"pdf": "manual.pdf", "manufacturer": "Liebherr"}, timeout=5)
+    assert resp.status_code == 400
+    assert "upload" in json.loads(resp.text)["error"]
+
+
+@pytest.mark.parametrize("path", [
+    "/jobs/../files/secret.txt",
+    "/jobs/%2e%2e/files/secret.txt",
+    "/jobs/..%2fout/files/secret.txt",
+    "/jobs/0123456789abcdef0123456789abcdef/files/../../secret.txt",
+])
+def test_files_reject_traversal(service, tmp_path, path):
+    (tmp_path / "secret.txt").write_text("VISION_API_KEY=secret")
+    conn = http.client.HTTPConnection(service.url[len("http://"):], timeout=5)
+    conn.request("GET", path)  # sent as is, without client-side path normalization
+    resp = conn.getresponse()
+    body = resp.read()
+    conn.close()
+    assert resp.status == 404
+    assert b"secret" not in body
+
+
+def test_files_served_for_known_job(service):
+    resp = requests.post(f"{service.url}/jobs", json={"pdf": "manual.pdf", "manufacturer": "Liebherr"}, timeout=5)
+    job_id = resp.json()["id"]
+    job_dir = os.path.join(service.output_dir, job_id)
+    os.makedirs(job_dir)
+    with open(os.path.join(job_dir, "bom.csv"), "w") as f:
+        f.write("REF\n1\n")
+    resp = requests.get(f"{service.url}/jobs/{job_id}/files/bom.csv", timeout=5)
+    assert resp.status_code == 200
+    assert resp.text == "REF\n1\n"
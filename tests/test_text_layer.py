@@ -0,0 +1,49 @@
+import fitz  # PyMuPDF
+
+from utils.text_layer import extract_text_layer_words, has_callout_text, raster_regions
+
+
+def _words(*texts, page_number="4"):
+    words = [{"text": t, "x": 100.0 + 60 * i, "y": 100.0, "w": 30.0, "h": 20.0} for i, t in enumerate(texts)]
+    return words + [{"text": page_number, "x": 300.0, "y": 3000.0, "w": 15.0, "h": 20.0}]  # not a callout
+
+
+def test_title_alone_is_not_callout_text():
+    assert not has_callout_text(_words("EXPLODED", "VIEW"), {"1", "2", "3"})
+    assert not has_callout_text(_words("Fig.", "12"), {"1", "2", "3"})
+
+
+def test_bom_callouts_are_callout_text():
+    assert has_callout_text(_words("EXPLODED", "VIEW", "1", "2", "3"), {"1", "2", "3", "4"})
+    assert has_callout_text(_words("7"), {"7"})  # BOMs shorter than MIN_CALLOUT_WORDS
+    assert has_callout_text(_words("11", "12", "13"), set())  # no BOM: any callout-like tokens
+
+
+def test_outlined_callouts_fall_back_to_ocr(pipeline_env, manual):
+    from utils.pipeline import process_document
+
+    job = manual(diagram_pages=1, bom_pages=1, callouts_per_page=20)
+    with fitz.open(job["pdf"]) as doc:
+        # Diagram page redrawn with its text as vector outlines, plus a real-text title
+        outlined = fitz.open("svg", doc[0].get_svg_image(text_as_path=True).encode("utf-8"))
+        pdf = fitz.open("pdf", outlined.convert_to_pdf())
+        pdf[0].insert_text((40, 60), "REFRIGERATOR ASSEMBLY", fontsize=14)
+        pdf.insert_pdf(doc, from_page=1)
+        pdf.save(job["pdf"] + ".outlined.pdf")
+    job["pdf"] += ".outlined.pdf"
+    assert not has_callout_text(extract_text_layer_words(pdf[0]), {str(i) for i in range(1, 21)})
+
+    summary = process_document(job, str(pipeline_env / "out"))
+    assert summary["status"] == "ok", summary.get("traceback")
+    assert summary["word_sources"] == {1: "ocr"}
+
+
+def test_raster_regions_clipped_to_page():
+    doc = fitz.open()
+    page = doc.new_page(width=612, height=792)
+    pix = fitz.Pixmap(fitz.csGRAY, fitz.IRect(0, 0, 50, 50), False)
+    pix.clear_with(128)
+    page.insert_image(fitz.Rect(400, 600, 800, 1000), pixmap=pix)  # partly off the page
+    page.insert_image(fitz.Rect(700, 900, 900, 1100), pixmap=pix)  # wholly off the page
+
+    assert raster_regions(page, dpi=72) == [(400, 600, 612, 792)]
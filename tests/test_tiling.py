@@ -0,0 +1,57 @@
+from collections import Counter
+
+from utils.text_layer import offset_words
+from utils.tiling import OVERLAP_PX, dedupe_words, drop_cut_words, tile_boxes
+
+
+def _word(text, x, y, w=40.0, h=30.0):
+    return {"text": text, "x": x, "y": y, "w": w, "h": h}
+
+
+def _ocr_tile(page_words, tile):
+    """
+    What OCR of one tile returns: the words inside it in tile coordinates, those
+    crossing its edge cut to the part that is visible.
+    """
+    x0, y0, x1, y1 = tile["box"]
+    seen = []
+    for w in page_words:
+        left, right = max(w["x"] - w["w"] / 2, x0), min(w["x"] + w["w"] / 2, x1)
+        top, bottom = max(w["y"] - w["h"] / 2, y0), min(w["y"] + w["h"] / 2, y1)
+        if left < right and top < bottom:
+            seen.append(_word(w["text"], (left + right) / 2 - x0, (top + bottom) / 2 - y0, right - left, bottom - top))
+    return seen
+
+
+def _merge(page_words, width, height):
+    # Same steps as iter_ocr_and_link for "ocr_tiled" pages
+    words = []
+    for tile in tile_boxes(width, height):
+        x0, y0 = tile["box"][:2]
+        words.extend(offset_words(drop_cut_words(_ocr_tile(page_words, tile), tile), x0, y0))
+    return dedupe_words(words)
+
+
+def test_tiles_cover_the_page_with_overlap():
+    tiles = tile_boxes(4000, 3000)
+    assert [t["box"] for t in tiles] == [
+        (0, 0, 2400, 2400), (1600, 0, 4000, 2400), (0, 600, 2400, 3000), (1600, 600, 4000, 3000)
+    ]
+    assert tiles[0]["inner"] == (False, False, True, True)
+    assert 2400 - 1600 >= OVERLAP_PX
+
+
+def test_callouts_crossing_seams_are_reported_once():
+    page_words = [
+        _word("11", 2390, 300),    # cut by the right edge of the first tile column
+        _word("12", 1610, 1000),   # cut by the left edge of the second tile column
+        _word("13", 2000, 2400),   # in all four tiles, cut by the bottom edge of the first row
+        _word("14", 2000, 1500),   # whole in all four tiles
+        _word("15", 300, 300),     # one tile only
+    ]
+    merged = _merge(page_words, 4000, 3000)
+
+    assert Counter(w["text"] for w in merged) == {"11": 1, "12": 1, "13": 1, "14": 1, "15": 1}
+    for w in merged:
+        original = next(p for p in page_words if p["text"] == w["text"])
+        assert (w["x"], w["y"], w["w"], w["h"]) == (original["x"], original["y"], original["w"], original["h"])
@@ -0,0 +1,174 @@
+import io
+import os
+from typing import Dict, List, Optional, Tuple, Union
+from xml.sax.saxutils import escape
+
+import fitz  # PyMuPDF
+from PIL import Image, ImageColor, ImageDraw
+from utils.pdf_to_tiff import pixmap_to_image
+from utils.document import DocumentSession
+
+OVERLAY_MODES = ("png", "vector")
+PREVIEW_MAX_PX = 1600  # longest side of the browser preview
+PDF_COLORS = {"green": (0, 0.6, 0), "red": (0.9, 0, 0)}
+# Grayscale renders are drawn on as palette images: 254 gray levels plus the box colors
+PALETTE_INDEX = {"green": 254, "red": 255}
+_GRAY_LUT = [v * 253 // 255 for v in range(256)]
+_PALETTE = [g * 255 // 253 for g in range(254) for _ in range(3)] + [
+    c for name in PALETTE_INDEX for c in ImageColor.getrgb(name)
+]
+
+
+def _box_corners(box: Dict, scale: float = 1.0) -> Tuple[float, float, float, float]:
+    x, y, w, h = box["x"] * scale, box["y"] * scale, box["w"] * scale, box["h"] * scale
+    return x - w / 2, y - h / 2, x + w / 2, y + h / 2
+
+
+def _box_color(box: Dict) -> str:
+    return "green" if box.get("color") == "green" else "red"
+
+
+def draw_part_boxes(img: Image.Image, part_boxes: List[Dict], scale: float = 1.0, width: int = 3) -> Image.Image:
+    """
+    Draw detected part boxes onto an RGB image (in place).
+    part_boxes: list of box dicts with {"x","y","w","h","color"} (center-based)
+    scale: factor from box coordinates to image pixels (e.g. for a downscaled preview)
+    """
+    draw = ImageDraw.Draw(img)
+    for box in part_boxes:
+        color = _box_color(box)
+        outline = PALETTE_INDEX[color] if img.mode == "P" else color
+        draw.rectangle(list(_box_corners(box, scale)), outline=outline, width=width)
+    return img
+
+
+def palette_image(pix) -> Image.Image:
+    """
+    Drawable copy of a grayscale pixmap as a palette image: one byte per pixel
+    (instead of an RGB conversion's three) that still shows green/red boxes.
+    """
+    img = pixmap_to_image(pix).point(_GRAY_LUT)
+    img.putpalette(_PALETTE)
+    return img
+
+
+def _drawable(pix) -> Image.Image:
+    # Drawn on as an image copy: RGB as is, grayscale through a palette image
+    return palette_image(pix) if pix.n == 1 else pixmap_to_image(pix)
+
+
+def annotate_pixmap(pix, part_boxes: List[Dict], out_path: Optional[str] = None,
+                    scale: float = 1.0) -> Union[str, bytes]:
+    """
+    Draw the part boxes directly on a rendered page pixmap (no intermediate file).
+    Saves a PNG to out_path and returns the path, or returns the PNG bytes when out_path is None.
+    The pixmap itself is not modified; grayscale pixmaps give a palette PNG.
+    scale: factor from box coordinates to pixmap pixels (page rendered below the box DPI)
+    """
+    img = draw_part_boxes(_drawable(pix), part_boxes, scale)
+    if out_path is None:
+        buf = io.BytesIO()
+        img.save(buf, format="PNG")
+        return buf.getvalue()
+
+    out_dir = os.path.dirname(out_path)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    img.save(out_path)
+    return out_path
+
+
+def preview_pixmap(pix, part_boxes: List[Dict], max_px: int = PREVIEW_MAX_PX, full_width: Optional[int] = None) -> bytes:
+    """
+    Downscaled PNG preview of a page with the part boxes drawn on it.
+    The pixmap is shrunk in place by powers of two until its longest side is
+    at most max_px, so the full-resolution page is never PNG-encoded.
+    full_width: page width in box coordinates when pix was rendered at a lower DPI
+    """
+    full_width = full_width or pix.width
+    factor = 0
+    while max(pix.width, pix.height) >> factor > max_px:
+        factor += 1
+    if factor:
+        pix.shrink(factor)
+    img = draw_part_boxes(_drawable(pix), part_boxes, scale=pix.width / full_width, width=2)
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def overlay_json(part_boxes: List[Dict], width: int, height: int, dpi: int) -> Dict:
+    """
+    Box overlay for a page rendered at dpi (width x height pixels), with
+    corner coordinates in those pixels.
+    """
+    return {
+        "width": width,
+        "height": height,
+        "dpi": dpi,
+        "boxes": [
+            dict(zip(("x0", "y0", "x1", "y1"), (round(v, 1) for v in _box_corners(box))),
+                 token=box["token"], color=_box_color(box))
+            for box in part_boxes
+        ],
+    }
+
+
+def overlay_svg(part_boxes: List[Dict], width: int, height: int) -> str:
+    """
+    Transparent SVG overlay in page pixel coordinates; scales with the image it is laid over.
+    """
+    rects = []
+    for box in part_boxes:
+        x0, y0, x1, y1 = _box_corners(box)
+        rects.append(
+            f'<rect x="{x0:.1f}" y="{y0:.1f}" width="{x1 - x0:.1f}" height="{y1 - y0:.1f}" '
+            f'stroke="{_box_color(box)}"><title>{escape(str(box["token"]))}</title></rect>'
+        )
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {width} {height}" '
+        f'fill="none" stroke-width="3">' + "".join(rects) + "</svg>"
+    )
+
+
+def pixel_to_page_matrix(page, dpi: int) -> fitz.Matrix:
+    """
+    Inverse of the render transform: page pixels at dpi -> unrotated PDF coordinates.
+    """
+    return ~(page.rotation_matrix * fitz.Matrix(dpi / 72, dpi / 72))
+
+
+def annotate_pdf(
+    pdf_path: Union[str, DocumentSession],
+    boxes_by_page: Dict[int, List[Dict]],
+    page_dpi: Dict[int, int],
+    out_path: Optional[str] = None,
+) -> Union[str, bytes]:
+    """
+    Copy of the original PDF with the part boxes as rectangle annotations
+    (token as the annotation text), so nothing is rasterized.
+    pdf_path: path, or a DocumentSession (its bytes are reopened, the shared document is left untouched)
+    boxes_by_page: {1-based page: box dicts in pixels}; page_dpi: DPI of those pixels
+    Saves to out_path and returns it, or returns the PDF bytes when out_path is None.
+    """
+    if isinstance(pdf_path, DocumentSession):
+        source = fitz.open(stream=pdf_path.data, filetype="pdf")
+    else:
+        source = fitz.open(pdf_path)
+    with source as doc:
+        for page_num, boxes in boxes_by_page.items():
+            page = doc[page_num - 1]
+            to_page = pixel_to_page_matrix(page, page_dpi.get(page_num, 300))
+            for box in boxes:
+                annot = page.add_rect_annot(fitz.Rect(_box_corners(box)) * to_page)
+                annot.set_colors(stroke=PDF_COLORS[_box_color(box)])
+                annot.set_border(width=1)
+                annot.set_info(content=str(box["token"]), title="OCR")
+                annot.update()
+        if out_path is None:
+            return doc.tobytes(garbage=0, deflate=True)
+        out_dir = os.path.dirname(out_path)
+        if out_dir:
+            os.makedirs(out_dir, exist_ok=True)
+        doc.save(out_path, garbage=0, deflate=True)
+    return out_path
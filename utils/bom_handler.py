@@ -1,146 +1,294 @@
 import pandas as pd
-import fitz  # PyMuPDF
-from typing import List
+from typing import Dict, List, Optional, Set, Union
 import os
-import io
-from PIL import Image
+import re
+import importlib
+import tempfile
 from dotenv import load_dotenv
 from ExtractTable import ExtractTable
+from utils.cache import get_cache, make_key
+from utils.table_geometry import extract_tables_from_page
+from utils.metrics import span, incr
+from utils.encoding import encode_for_upload
+from utils.fingerprint import page_fingerprint, page_result_key, PAGE_RESULTS_NAMESPACE
+from utils.document import DocumentSession, document_session
+from utils.rate_limit import get_scheduler, ServiceError
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Header ignore words per manufacturer
-HEADER_IGNORE = {
-    "liebherr": {"remark", "item", "part no.", "quantity", "description", "price", "part"},
-    "viking": {"item", "part no.", "name", "qty", "uom", "note"},
-}
+BOM_COLUMNS = ["REF", "PART_NUMBER", "DESCRIPTION"]
 
+# Manufacturer profiles, keyed by lower-case name:
+#   label: display name
+#   min_columns: tables with fewer columns are skipped
+#   columns: BOM field -> 0-based column position in the extracted table
+#   header_ignore: rows whose REF/PART_NUMBER/DESCRIPTION text contains any of these are headers
+BOM_PROFILES: Dict[str, Dict] = {}
 
-def _process_page_with_extracttable(pdf_path: str, page_num: int, et_sess, tmp_dir: str = "tmp"):
+
+def register_profile(
+    name: str, columns: Dict[str, int], min_columns: int, header_ignore: Set[str], label: Optional[str] = None
+) -> Dict:
+    """
+    Add (or replace) a manufacturer profile. columns must map every field in BOM_COLUMNS.
+    """
+    missing = [c for c in BOM_COLUMNS if c not in columns]
+    if missing:
+        raise ValueError(f"Profile {name} is missing column positions for {missing}")
+    words = sorted(w.lower() for w in header_ignore)
+    profile = {
+        "label": label or name,
+        "min_columns": max(min_columns, max(columns.values()) + 1),
+        "columns": dict(columns),
+        "header_ignore": set(words),
+        # substring match of any header word, compiled once per profile
+        "header_re": re.compile("|".join(re.escape(w) for w in words)) if words else None,
+    }
+    BOM_PROFILES[name.lower()] = profile
+    return profile
+
+
+def get_profile(manufacturer: str) -> Dict:
+    profile = BOM_PROFILES.get(manufacturer.lower())
+    if profile is None:
+        raise ValueError(f"Unsupported manufacturer: {manufacturer}. Please implement extractor.")
+    return profile
+
+
+def list_manufacturers() -> List[str]:
+    return [p["label"] for p in BOM_PROFILES.values()]
+
+
+register_profile(
+    "liebherr",
+    columns={"REF": 1, "PART_NUMBER": 2, "DESCRIPTION": 4},
+    min_columns=5,
+    header_ignore={"remark", "item", "part no.", "quantity", "description", "price", "part"},
+    label="Liebherr",
+)
+register_profile(
+    "viking",
+    columns={"REF": 0, "PART_NUMBER": 1, "DESCRIPTION": 2},
+    min_columns=3,
+    header_ignore={"item", "part no.", "name", "qty", "uom", "note"},
+    label="Viking",
+)
+
+TABLE_DPI = 300
+# "auto": local text-layer tables, ExtractTable for pages without them (scans);
+# "local": text layer only; "extracttable": always upload
+TABLE_ENGINES = ("auto", "local", "extracttable")
+CACHE_NAMESPACE = "extracttable"
+
+# ExtractTable's client only accepts a file path, so the page JPEG is handed over
+# through a RAM-backed scratch file when one is available instead of tmp/.
+RAM_TMP_DIR = "/dev/shm" if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK) else None
+
+
+def _table_session_factory():
+    """
+    Class used for ExtractTable sessions. EXTRACTTABLE_SESSION_FACTORY="module:Class"
+    swaps in a compatible client (same process_file/check_usage API), e.g. the
+    local stand-in used by the benchmarks.
+    """
+    spec = os.getenv("EXTRACTTABLE_SESSION_FACTORY")
+    if not spec:
+        return ExtractTable
+    module_name, _, attr = spec.partition(":")
+    return getattr(importlib.import_module(module_name), attr)
+
+
+class _LazyExtractTable:
+    """
+    ExtractTable session that is only created (and its usage checked) on the
+    first page that actually has to be sent, so fully cached runs make no API calls.
+    """
+
+    def __init__(self, label: str):
+        self.label = label
+        self._sess = None
+
+    def process_file(self, **kwargs):
+        """
+        Upload one page through the ExtractTable scheduler (rate limit, credit
+        budget, backoff on 429/5xx). Raises ServiceError/QuotaExceeded on failure.
+        """
+        api_key = os.getenv("EXTRACTTABLE_API_KEY")
+        scheduler = get_scheduler("extracttable", api_key)
+        if self._sess is None:
+            try:
+                self._sess = _table_session_factory()(api_key=api_key)
+                usage = self._sess.check_usage()
+            except Exception as e:
+                self._sess = None
+                raise ServiceError(f"extracttable: could not start session: {e}") from e
+            print(f"{self.label} usage check:", usage)
+            scheduler.set_budget(_remaining_credits(usage))
+        return scheduler.call(self._sess.process_file, **kwargs)
+
+
+def _remaining_credits(usage) -> Optional[float]:
     """
-    Render a PDF page to image and run ExtractTable.
-    Returns list of DataFrames or [] if failed.
+    Credits left from an ExtractTable check_usage() reply ({"credits", "used", "queued"}),
+    or None when the reply has no usable numbers.
     """
     try:
-        with fitz.open(pdf_path) as pdf_doc:
-            page_doc = pdf_doc[page_num - 1]  # 1-based -> 0-based
-            pix = page_doc.get_pixmap(matrix=fitz.Matrix(300/72, 300/72))  # 300 DPI
-            img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+        return float(usage["credits"]) - float(usage.get("used", 0)) - float(usage.get("queued", 0))
+    except (TypeError, KeyError, ValueError):
+        return None
 
-            img_bytes_io = io.BytesIO()
-            img.save(img_bytes_io, format="JPEG")
-            img_bytes = img_bytes_io.getvalue()
 
-            os.makedirs(tmp_dir, exist_ok=True)
-            temp_img_path = os.path.join(tmp_dir, f"page_{page_num}.jpg")
-            with open(temp_img_path, "wb") as f:
-                f.write(img_bytes)
+def _process_page_with_extracttable(session: DocumentSession, page_num: int, et_sess, tmp_dir: Optional[str] = None):
+    """
+    Render a PDF page to image (through the session's render cache) and run ExtractTable.
+    The upload is encoded straight from the pixmap (1-bit PNG for line-art tables,
+    see utils.encoding); tmp_dir overrides the scratch
+    folder used for the upload file (default: RAM disk, else system temp).
+    Results are cached on disk by rendered image bytes + DPI + extractor.
+    Returns list of DataFrames; raises ServiceError when the page could not be processed.
+    """
+    pix = session.render(page_num, TABLE_DPI, stage="table")
+    img_bytes, img_format = encode_for_upload(pix, "extracttable")
 
-            # Process with ExtractTable
-            tables = et_sess.process_file(filepath=temp_img_path, output_format="df")
+    cache = get_cache()
+    key = make_key(img_bytes, dpi=TABLE_DPI, extractor="extracttable")
+    if cache is not None:
+        cached = cache.get(CACHE_NAMESPACE, key)
+        if cached is not None:
+            return cached
 
-            os.remove(temp_img_path)  # cleanup
-            return tables or []
+    if tmp_dir:
+        os.makedirs(tmp_dir, exist_ok=True)
+    with tempfile.NamedTemporaryFile(
+        prefix=f"page_{page_num}_", suffix=".png" if img_format == "png" else ".jpg", dir=tmp_dir or RAM_TMP_DIR
+    ) as f:
+        f.write(img_bytes)
+        f.flush()
+        # Process with ExtractTable
+        incr("api_calls", service="extracttable")
+        incr("bytes_uploaded", len(img_bytes), service="extracttable")
+        with span("extracttable_page", page=page_num):
+            tables = et_sess.process_file(filepath=f.name, output_format="df")
 
-    except Exception as e:
-        print(f"Failed to process page {page_num}: {e}")
-        return []
+    tables = tables or []
+    if cache is not None:
+        cache.set(CACHE_NAMESPACE, key, tables)
+    return tables
 
 
-def _should_ignore_row(ref: str, pn: str, desc: str, manufacturer: str) -> bool:
+def _get_page_tables(
+    session: DocumentSession, page_num: int, et_sess, tmp_dir: Optional[str], engine: str, min_columns: int
+):
     """
-    Check if the row looks like a header (to be ignored).
+    Return the tables of one page using the selected engine (see TABLE_ENGINES).
+    Results are stored under the page's content fingerprint, so an unchanged
+    page in a reissued manual is neither rendered nor sent to ExtractTable again.
     """
-    ignore_words = HEADER_IGNORE.get(manufacturer.lower(), set())
-    row_text = f"{ref} {pn} {desc}".lower()
-    return any(word in row_text for word in ignore_words)
+    cache = get_cache()
+    key = None
+    if cache is not None:
+        key = page_result_key(page_fingerprint(session.page(page_num)), "table", engine=engine, min_columns=min_columns)
+        tables = cache.get(PAGE_RESULTS_NAMESPACE, key)
+        if tables is not None:
+            incr("pages_reused", stage="table")
+            return tables
+
+    tables = []
+    if engine != "extracttable":
+        with span("table_local", page=page_num):
+            tables = extract_tables_from_page(session.page(page_num), min_columns=min_columns)
+    if not tables and engine != "local":
+        tables = _process_page_with_extracttable(session, page_num, et_sess, tmp_dir)
+    if key is not None:  # failed API calls raise, so empty results are genuine
+        cache.set(PAGE_RESULTS_NAMESPACE, key, tables)
+    return tables
 
 
-def extract_bom_liebherr(pdf_path: str, table_pages: List[int], tmp_dir: str = "tmp") -> pd.DataFrame:
+def _parse_table(table_df: pd.DataFrame, profile: Dict, page_num: int) -> pd.DataFrame:
     """
-    Extract BOM for Liebherr PDFs.
-    Columns: REF=col1, PART_NUMBER=col2, DESCRIPTION=col4
+    Map one extracted table to BOM rows with vectorized string operations.
+    Rows with an empty REF or PART_NUMBER and header rows are dropped.
+    Returns DataFrame with columns ["REF", "PART_NUMBER", "DESCRIPTION", "PAGE"].
     """
-    all_rows = []
-    api_key = os.getenv("EXTRACTTABLE_API_KEY")
-    et_sess = ExtractTable(api_key=api_key)
-    print("Liebherr usage check:", et_sess.check_usage())
+    positions = [profile["columns"][c] for c in BOM_COLUMNS]
+    rows = table_df.iloc[:, positions].astype(str)
+    rows.columns = BOM_COLUMNS
+    for col in BOM_COLUMNS:
+        rows[col] = rows[col].str.strip()
 
-    for page_num in table_pages:
-        tables = _process_page_with_extracttable(pdf_path, page_num, et_sess, tmp_dir)
-        for table_df in tables:
-            if not table_df.empty and len(table_df.columns) >= 5:
-                table_df.columns = table_df.columns.str.strip()
-                print(f"[Liebherr] Page {page_num} columns: {table_df.columns.tolist()}")
-                ref_col, pn_col, desc_col = table_df.columns[1], table_df.columns[2], table_df.columns[4]
+    keep = (rows["REF"] != "") & (rows["PART_NUMBER"] != "")
+    if profile["header_re"] is not None:
+        row_text = (rows["REF"] + " " + rows["PART_NUMBER"] + " " + rows["DESCRIPTION"]).str.lower()
+        keep &= ~row_text.str.contains(profile["header_re"])
 
-                for _, row in table_df.iterrows():
-                    ref = str(row[ref_col]).strip()
-                    pn = str(row[pn_col]).strip()
-                    desc = str(row[desc_col]).strip()
+    rows = rows[keep].reset_index(drop=True)
+    rows["PAGE"] = page_num
+    return rows
 
-                    if not ref or not pn:
-                        continue
-                    if _should_ignore_row(ref, pn, desc, "liebherr"):
-                        continue
 
-                    all_rows.append({
-                        "REF": ref,
-                        "PART_NUMBER": pn,
-                        "DESCRIPTION": desc,
-                        "PAGE": page_num
-                    })
+def extract_bom(
+    pdf_path: Union[str, DocumentSession], table_pages: List[int], manufacturer: str, tmp_dir: Optional[str] = None, engine: str = "auto"
+) -> pd.DataFrame:
+    """
+    Extract the BOM using the manufacturer's registered profile.
+    pdf_path: path to the PDF, or an open DocumentSession (reused, not closed)
+    Returns DataFrame with columns ["REF", "PART_NUMBER", "DESCRIPTION", "PAGE"].
+    Pages ExtractTable could not process after retries (or for lack of credits)
+    are listed in df.attrs["failed_pages"] as {page: error}.
+    """
+    profile = get_profile(manufacturer)
+    label = profile["label"]
+    frames = []
+    failed_pages = {}
+    et_sess = _LazyExtractTable(label)
+    with document_session(pdf_path) as session:
+        for page_num in table_pages:
+            try:
+                tables = _get_page_tables(
+                    session, page_num, et_sess, tmp_dir, engine, min_columns=profile["min_columns"]
+                )
+            except ServiceError as e:
+                print(f"[{label}] Page {page_num} failed: {e}")
+                failed_pages[page_num] = str(e)
+                continue
+            for table_df in tables:
+                if not table_df.empty and len(table_df.columns) >= profile["min_columns"]:
+                    print(f"[{label}] Page {page_num} columns: {[str(c).strip() for c in table_df.columns]}")
+                    frames.append(_parse_table(table_df, profile, page_num))
 
-    return pd.DataFrame(all_rows)
+    bom_df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    bom_df.attrs["failed_pages"] = failed_pages
+    return bom_df
 
 
-def extract_bom_viking(pdf_path: str, table_pages: List[int], tmp_dir: str = "tmp") -> pd.DataFrame:
+def extract_bom_liebherr(
+    pdf_path: str, table_pages: List[int], tmp_dir: Optional[str] = None, engine: str = "auto"
+) -> pd.DataFrame:
+    """
+    Extract BOM for Liebherr PDFs.
+    Columns: REF=col1, PART_NUMBER=col2, DESCRIPTION=col4
+    """
+    return extract_bom(pdf_path, table_pages, "liebherr", tmp_dir, engine)
+
+
+def extract_bom_viking(
+    pdf_path: str, table_pages: List[int], tmp_dir: Optional[str] = None, engine: str = "auto"
+) -> pd.DataFrame:
     """
     Extract BOM for Viking PDFs.
     Columns: REF=col0, PART_NUMBER=col1, DESCRIPTION=col2
     """
-    all_rows = []
-    api_key = os.getenv("EXTRACTTABLE_API_KEY")
-    et_sess = ExtractTable(api_key=api_key)
-    print("Viking usage check:", et_sess.check_usage())
-
-    for page_num in table_pages:
-        tables = _process_page_with_extracttable(pdf_path, page_num, et_sess, tmp_dir)
-        for table_df in tables:
-            if not table_df.empty and len(table_df.columns) >= 3:
-                table_df.columns = table_df.columns.str.strip()
-                print(f"[Viking] Page {page_num} columns: {table_df.columns.tolist()}")
-                ref_col, pn_col, desc_col = table_df.columns[0], table_df.columns[1], table_df.columns[2]
-
-                for _, row in table_df.iterrows():
-                    ref = str(row[ref_col]).strip()
-                    pn = str(row[pn_col]).strip()
-                    desc = str(row[desc_col]).strip()
-
-                    if not ref or not pn:
-                        continue
-                    if _should_ignore_row(ref, pn, desc, "viking"):
-                        continue
-
-                    all_rows.append({
-                        "REF": ref,
-                        "PART_NUMBER": pn,
-                        "DESCRIPTION": desc,
-                        "PAGE": page_num
-                    })
-
-    return pd.DataFrame(all_rows)
-
-
-def extract_bom_from_pdf(pdf_path: str, table_pages: List[int], manufacturer: str, tmp_dir: str = "tmp") -> pd.DataFrame:
-    """
-    Dispatcher: call manufacturer-specific BOM extractor.
-    """
-    manufacturer = manufacturer.lower()
-    if manufacturer == "liebherr":
-        return extract_bom_liebherr(pdf_path, table_pages, tmp_dir)
-    elif manufacturer == "viking":
-        return extract_bom_viking(pdf_path, table_pages, tmp_dir)
-    else:
-        raise ValueError(f"Unsupported manufacturer: {manufacturer}. Please implement extractor.")
+    return extract_bom(pdf_path, table_pages, "viking", tmp_dir, engine)
+
+
+def extract_bom_from_pdf(
+    pdf_path: Union[str, DocumentSession], table_pages: List[int], manufacturer: str, tmp_dir: Optional[str] = None, engine: str = "auto"
+) -> pd.DataFrame:
+    """
+    Dispatcher: look up the manufacturer profile and extract the BOM.
+    engine: table engine, one of TABLE_ENGINES
+    """
+    if engine not in TABLE_ENGINES:
+        raise ValueError(f"Unsupported table engine: {engine}. Choose from {TABLE_ENGINES}.")
+    return extract_bom(pdf_path, table_pages, manufacturer, tmp_dir, engine)
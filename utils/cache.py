@@ -0,0 +1,176 @@
+import os
+import hashlib
+import pickle
+import tempfile
+import threading
+from typing import Any, Optional
+from utils.metrics import incr
+
+CACHE_DIR = os.getenv("PIPELINE_CACHE_DIR", os.path.join("tmp", "cache"))
+CACHE_MAX_BYTES = int(float(os.getenv("PIPELINE_CACHE_MAX_MB", "2048")) * 1024 * 1024)
+
+_MISSING = object()
+
+
+def make_key(data: bytes, **params) -> str:
+    """
+    Content-addressed key: sha256 of the payload bytes plus sorted params
+    (e.g. dpi=300, feature="DOCUMENT_TEXT_DETECTION", extractor="extracttable").
+    """
+    h = hashlib.sha256(data)
+    for name in sorted(params):
+        h.update(f"|{name}={params[name]}".encode("utf-8"))
+    return h.hexdigest()
+
+
+def make_file_key(path: str, **params) -> str:
+    """
+    Same as make_key, but streams the file instead of loading it into memory.
+    """
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    for name in sorted(params):
+        h.update(f"|{name}={params[name]}".encode("utf-8"))
+    return h.hexdigest()
+
+
+class DiskCache:
+    """
+    Persistent pickle cache shared by processes through the filesystem.
+    Entries live in <cache_dir>/<namespace>/<key[:2]>/<key>.pkl; writes are atomic
+    (rename), reads bump the file mtime and the oldest entries are evicted once
+    the total size goes over max_bytes.
+    """
+
+    def __init__(self, cache_dir: str = CACHE_DIR, max_bytes: int = CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._approx_bytes = None
+        self._lock = threading.Lock()
+
+    def _path(self, namespace: str, key: str) -> str:
+        return os.path.join(self.cache_dir, namespace, key[:2], f"{key}.pkl")
+
+    def get(self, namespace: str, key: str, default: Any = None) -> Any:
+        path = self._path(namespace, key)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+        except FileNotFoundError:
+            incr("cache_misses", namespace=namespace)
+            return default
+        except Exception as e:
+            print(f"Dropping unreadable cache entry {path}: {e}")
+            self._remove(path)
+            incr("cache_misses", namespace=namespace)
+            return default
+        incr("cache_hits", namespace=namespace)
+        try:
+            os.utime(path)  # LRU: mark as recently used
+        except OSError:
+            pass
+        return value
+
+    def set(self, namespace: str, key: str, value: Any):
+        path = self._path(namespace, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            size = os.path.getsize(tmp_path)
+            os.replace(tmp_path, path)
+        except Exception:
+            self._remove(tmp_path)
+            raise
+
+        with self._lock:
+            if self._approx_bytes is None:
+                self._approx_bytes = self._total_bytes()
+            else:
+                self._approx_bytes += size
+            over_budget = self._approx_bytes > self.max_bytes
+        if over_budget:
+            self.evict()
+
+    def invalidate(self, namespace: str, key: Optional[str] = None):
+        """
+        Remove one entry, or the whole namespace when key is None.
+        """
+        if key is not None:
+            self._remove(self._path(namespace, key))
+            return
+        for path, _, _ in self._entries(os.path.join(self.cache_dir, namespace)):
+            self._remove(path)
+
+    def clear(self):
+        for path, _, _ in self._entries(self.cache_dir):
+            self._remove(path)
+        with self._lock:
+            self._approx_bytes = 0
+
+    def evict(self, target_ratio: float = 0.9):
+        """
+        Delete least recently used entries until the cache is under target_ratio * max_bytes.
+        """
+        entries = sorted(self._entries(self.cache_dir), key=lambda e: e[1])
+        total = sum(size for _, _, size in entries)
+        limit = self.max_bytes * target_ratio
+        for path, _, size in entries:
+            if total <= limit:
+                break
+            self._remove(path)
+            total -= size
+        with self._lock:
+            self._approx_bytes = total
+
+    def _total_bytes(self) -> int:
+        return sum(size for _, _, size in self._entries(self.cache_dir))
+
+    @staticmethod
+    def _entries(root: str):
+        """
+        Yield (path, mtime, size) for every cache entry under root.
+        """
+        for dirpath, _, filenames in os.walk(root):
+            for name in filenames:
+                if not name.endswith(".pkl"):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                yield path, st.st_mtime, st.st_size
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+_default_cache = _MISSING
+
+
+def cache_enabled() -> bool:
+    """
+    False when the disk cache is disabled with PIPELINE_CACHE=0 (batch --no-cache).
+    """
+    return os.getenv("PIPELINE_CACHE", "1").lower() not in ("0", "false", "no", "off")
+
+
+def get_cache() -> Optional[DiskCache]:
+    """
+    Process-wide cache instance, or None when disabled with PIPELINE_CACHE=0.
+    """
+    global _default_cache
+    if _default_cache is _MISSING:
+        if not cache_enabled():
+            _default_cache = None
+        else:
+            _default_cache = DiskCache(os.getenv("PIPELINE_CACHE_DIR", CACHE_DIR))
+    return _default_cache
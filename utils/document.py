@@ -0,0 +1,148 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Optional, Union
+
+import fitz  # PyMuPDF
+
+from utils.metrics import span, incr
+from utils.memory import memory_budget_bytes, RENDER_CACHE_SHARE
+
+RENDER_CACHE_BYTES = int(float(os.getenv("PIPELINE_RENDER_CACHE_MB", "512")) * 1024 * 1024)
+COLORSPACES = {"rgb": fitz.csRGB, "gray": fitz.csGRAY}
+
+
+class DocumentSession:
+    """
+    One open PDF shared by every stage (page count, table extraction, diagram
+    rendering, annotation export), plus an LRU cache of rendered pages keyed by
+    (page, dpi, colorspace) and bounded to max_bytes of pixel data (default
+    RENDER_CACHE_BYTES, capped to a share of the memory budget when one is set).
+    source: file path or the PDF bytes (e.g. a Streamlit upload, never written to disk)
+    Rendered pixmaps are shared: copy them (fitz.Pixmap(pix)) before drawing on them.
+    """
+
+    def __init__(self, source: Union[str, bytes], name: Optional[str] = None,
+                 max_bytes: Optional[int] = None):
+        if isinstance(source, str):
+            self.path, self._data = source, None
+            self.doc = fitz.open(source)
+        else:
+            self.path, self._data = None, bytes(source)
+            self.doc = fitz.open(stream=self._data, filetype="pdf")
+        self.name = name or (os.path.splitext(os.path.basename(self.path))[0] if self.path else "document")
+        if max_bytes is None:
+            budget = memory_budget_bytes()
+            max_bytes = min(RENDER_CACHE_BYTES, budget // RENDER_CACHE_SHARE) if budget else RENDER_CACHE_BYTES
+        self.max_bytes = max_bytes
+        self._renders = OrderedDict()
+        self._render_bytes = 0
+        self._file_key = None
+        self._lock = threading.RLock()  # PyMuPDF documents are not thread-safe
+
+    @property
+    def page_count(self) -> int:
+        return len(self.doc)
+
+    def page(self, page_num: int):
+        """
+        1-based page access.
+        """
+        return self.doc[page_num - 1]
+
+    @property
+    def data(self) -> bytes:
+        """
+        The original PDF bytes (read from disk on first use for path sessions).
+        """
+        if self._data is None:
+            with open(self.path, "rb") as f:
+                self._data = f.read()
+        return self._data
+
+    @property
+    def file_key(self) -> str:
+        """
+        sha256 of the PDF bytes.
+        """
+        if self._file_key is None:
+            self._file_key = hashlib.sha256(self.data).hexdigest()
+        return self._file_key
+
+    def render(self, page_num: int, dpi: int, colorspace: str = "rgb", stage: str = "diagram"):
+        """
+        Cached render of a 1-based page at dpi in "rgb" or "gray" (no alpha).
+        """
+        key = (page_num, dpi, colorspace)
+        with self._lock:
+            pix = self._renders.get(key)
+            if pix is not None:
+                self._renders.move_to_end(key)
+                incr("render_cache_hits", stage=stage)
+                return pix
+
+            with span("render", page=page_num, stage=stage):
+                pix = self.page(page_num).get_pixmap(
+                    matrix=fitz.Matrix(dpi / 72, dpi / 72), colorspace=COLORSPACES[colorspace], alpha=False
+                )
+            incr("pages_rendered", stage=stage)
+            incr("pixels_rendered", pix.width * pix.height, stage=stage)
+
+            size = len(pix.samples_mv)
+            if size <= self.max_bytes:
+                self._renders[key] = pix
+                self._render_bytes += size
+                while self._render_bytes > self.max_bytes:
+                    _, old = self._renders.popitem(last=False)
+                    self._render_bytes -= len(old.samples_mv)
+            return pix
+
+    def render_clip(self, page_num: int, dpi: int, box, colorspace: str = "rgb", stage: str = "diagram"):
+        """
+        Uncached render of the pixel box (x0, y0, x1, y1), in page pixels at dpi,
+        of a 1-based page; the pixmap keeps the box origin in pix.x / pix.y like
+        crop_pixmap. Used for bands and tiles of pages too large to render whole.
+        """
+        zoom = dpi / 72
+        clip = fitz.Rect(box) * fitz.Matrix(1 / zoom, 1 / zoom)
+        with self._lock:
+            with span("render", page=page_num, stage=stage):
+                pix = self.page(page_num).get_pixmap(
+                    matrix=fitz.Matrix(zoom, zoom), colorspace=COLORSPACES[colorspace], alpha=False, clip=clip
+                )
+        incr("pixels_rendered", pix.width * pix.height, stage=stage)
+        return pix
+
+    def drop_renders(self):
+        with self._lock:
+            self._renders.clear()
+            self._render_bytes = 0
+
+    def close(self):
+        with self._lock:
+            self.drop_renders()
+            self.doc.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+@contextmanager
+def document_session(source, **kwargs):
+    """
+    Use an existing DocumentSession as is, or open (and afterwards close) one for
+    a path or bytes; kwargs go to DocumentSession (e.g. max_bytes=0 for no render cache).
+    """
+    if isinstance(source, DocumentSession):
+        yield source
+        return
+    session = DocumentSession(source, **kwargs)
+    try:
+        yield session
+    finally:
+        session.close()
@@ -0,0 +1,93 @@
+import io
+import os
+from typing import Optional, Tuple
+
+import fitz  # PyMuPDF
+from PIL import Image
+
+from utils.metrics import incr
+
+UPLOAD_ENCODINGS = ("auto", "png", "gray", "bilevel", "jpeg")
+BILEVEL_THRESHOLD = 160     # gray level separating ink from paper
+MAX_MIDTONE_RATIO = 0.08    # line art has few pixels between ink and paper
+JPEG_QUALITY = {"vision": 85, "extracttable": 75}
+
+
+def _gray(pix):
+    return pix if pix.n == 1 else fitz.Pixmap(fitz.csGRAY, pix)
+
+
+def _gray_image(gray) -> Image.Image:
+    # A copy: a PIL view of samples_mv would keep the pixmap from being freed
+    return Image.frombytes("L", (gray.width, gray.height), gray.samples_mv, "raw", "L", gray.stride)
+
+
+def midtone_ratio(img: Image.Image) -> float:
+    """
+    Share of pixels that are neither ink nor paper (grayscale image).
+    """
+    hist = img.histogram()
+    total = sum(hist) or 1
+    return sum(hist[48:208]) / total
+
+
+def _bilevel_png(img: Image.Image) -> bytes:
+    lut = [255 if v > BILEVEL_THRESHOLD else 0 for v in range(256)]
+    buf = io.BytesIO()
+    img.point(lut, "1").save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def default_encoding() -> str:
+    # Read per call so worker processes pick up the batch runner's setting
+    return os.getenv("PIPELINE_UPLOAD_ENCODING", "auto")
+
+
+def encode_for_upload(pix, target: str = "vision", encoding: Optional[str] = None) -> Tuple[bytes, str]:
+    """
+    Compact upload encoding of a rendered page or region.
+    target: "vision" or "extracttable" (selects the JPEG quality)
+    encoding (default $PIPELINE_UPLOAD_ENCODING, else "auto"):
+        "png": RGB PNG (previous behaviour)
+        "gray": 8-bit grayscale PNG
+        "bilevel": 1-bit PNG
+        "jpeg": grayscale JPEG
+        "auto": 1-bit PNG for line art, else the smaller of gray PNG and JPEG;
+            the midtone guard keeps photos and shaded scans out of 1-bit
+    Returns (bytes, format) with format "png" or "jpeg"; raw and encoded sizes are
+    counted in the upload_bytes_raw / upload_bytes_encoded metrics.
+    """
+    encoding = encoding or default_encoding()
+    if encoding not in UPLOAD_ENCODINGS:
+        raise ValueError(f"Unknown upload encoding '{encoding}'. Choose from {UPLOAD_ENCODINGS}")
+
+    if encoding == "png":
+        data, fmt = pix.tobytes("png"), "png"
+    else:
+        gray = _gray(pix)
+        if encoding == "gray":
+            data, fmt = gray.tobytes("png"), "png"
+        elif encoding == "jpeg":
+            data, fmt = gray.tobytes("jpeg", jpg_quality=JPEG_QUALITY[target]), "jpeg"
+        else:
+            img = _gray_image(gray)
+            if encoding == "bilevel" or midtone_ratio(img) <= MAX_MIDTONE_RATIO:
+                data, fmt = _bilevel_png(img), "png"
+            else:
+                png = gray.tobytes("png")
+                jpg = gray.tobytes("jpeg", jpg_quality=JPEG_QUALITY[target])
+                data, fmt = (jpg, "jpeg") if len(jpg) < len(png) else (png, "png")
+
+    incr("upload_bytes_raw", pix.width * pix.height * pix.n, target=target)
+    incr("upload_bytes_encoded", len(data), target=target, encoding=fmt)
+    return data, fmt
+
+
+def encode_image_file(path: str, target: str = "vision", encoding: Optional[str] = None) -> Tuple[bytes, str]:
+    """
+    encode_for_upload for an image file on disk (e.g. a rendered TIFF).
+    """
+    with Image.open(path) as img:
+        img = img.convert("RGB")
+        pix = fitz.Pixmap(fitz.csRGB, img.width, img.height, img.tobytes(), False)
+    return encode_for_upload(pix, target, encoding)
@@ -0,0 +1,42 @@
+import hashlib
+from typing import Iterable
+
+from utils.cache import make_key
+
+PAGE_RESULTS_NAMESPACE = "page-results"
+
+
+def page_fingerprint(page) -> str:
+    """
+    Stable hash of what a page shows, independent of the file it sits in, so a
+    reissued manual maps unchanged pages to the same fingerprint: page geometry,
+    content stream, images, form XObjects and font names (cheap, no rendering;
+    object numbers are not hashed).
+    """
+    h = hashlib.sha256()
+    h.update(f"{tuple(page.cropbox)}|{page.rotation}".encode("utf-8"))
+
+    doc = page.parent
+    h.update(page.read_contents())
+    for img in page.get_images(full=True):
+        h.update(doc.xref_stream_raw(img[0]) or b"")
+    for xobj in page.get_xobjects():
+        h.update(doc.xref_stream_raw(xobj[0]) or b"")
+    for font in page.get_fonts(full=True):
+        h.update(f"|{font[3]}|{font[5]}".encode("utf-8"))  # basefont, encoding
+    return h.hexdigest()
+
+
+def page_result_key(fingerprint: str, stage: str, **params) -> str:
+    """
+    Cache key of a stored per-page result (e.g. stage="diagram", dpi=300).
+    """
+    return make_key(fingerprint.encode("utf-8"), stage=stage, **params)
+
+
+def refs_digest(refs: Iterable[str]) -> str:
+    """
+    Short order-independent hash of a set of BOM references, for result keys
+    whose outcome depends on the BOM.
+    """
+    return hashlib.sha256("\n".join(sorted(refs)).encode("utf-8")).hexdigest()[:16]
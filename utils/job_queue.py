@@ -0,0 +1,216 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from typing import Dict, List, Optional
+
+QUEUE_DB = os.getenv("PIPELINE_QUEUE_DB", os.path.join("tmp", "jobs.sqlite"))
+JOB_STATES = ("queued", "running", "ok", "incomplete", "error", "cancelled")
+FINAL_STATES = ("ok", "incomplete", "error", "cancelled")
+POLL_SECONDS = 1.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    job TEXT NOT NULL,
+    submitted_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    worker TEXT,
+    summary TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, submitted_at);
+"""
+
+
+class JobQueue:
+    """
+    Persistent FIFO of pipeline jobs in SQLite, shared by the HTTP service and
+    its worker processes (WAL journal, one connection per instance).
+    A job is the process_document job dict; its summary is stored when it finishes.
+    """
+
+    def __init__(self, path: str = QUEUE_DB):
+        self.path = path
+        db_dir = os.path.dirname(path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    def submit(self, job: Dict, job_id: Optional[str] = None) -> str:
+        """
+        Queue a job; returns its id.
+        """
+        job_id = job_id or uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, job, submitted_at) VALUES (?, 'queued', ?, ?)",
+                (job_id, json.dumps(job), time.time()),
+            )
+        return job_id
+
+    def claim(self, worker: str) -> Optional[Dict]:
+        """
+        Atomically take the oldest queued job and mark it running.
+        Returns {"id", "job"} or None when the queue is empty.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT id, job FROM jobs WHERE status = 'queued' ORDER BY submitted_at LIMIT 1"
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'running', started_at = ?, worker = ? WHERE id = ?",
+                        (time.time(), worker, row[0]),
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return None if row is None else {"id": row[0], "job": json.loads(row[1])}
+
+    def finish(self, job_id: str, summary: Dict):
+        """
+        Store a job's summary; its status becomes the summary's ("ok", "incomplete" or "error").
+        """
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, summary = ? WHERE id = ?",
+                (summary.get("status", "error"), time.time(), json.dumps(summary, default=str), job_id),
+            )
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Cancel a job that has not started yet. Returns whether it was cancelled.
+        """
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE id = ? AND status = 'queued'",
+                (time.time(), job_id),
+            )
+        return cur.rowcount > 0
+
+    def requeue_running(self) -> int:
+        """
+        Put jobs left running by a stopped service back in the queue (call before starting workers).
+        """
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE jobs SET status = 'queued', started_at = NULL, worker = NULL WHERE status = 'running'"
+            )
+        return cur.rowcount
+
+    def fail_running(self, worker: str, error: str) -> int:
+        """
+        Mark the job a dead worker was running as failed (not requeued: it may be what killed it).
+        """
+        summary = json.dumps({"status": "error", "error": error})
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE jobs SET status = 'error', finished_at = ?, summary = ? WHERE status = 'running' AND worker = ?",
+                (time.time(), summary, worker),
+            )
+        return cur.rowcount
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, status, job, submitted_at, started_at, finished_at, worker, summary FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        record = _record(row[:7])
+        record["job"] = json.loads(row[2])
+        record["summary"] = json.loads(row[7]) if row[7] else None
+        if record["status"] == "queued":
+            record["position"] = self.position(job_id)
+        return record
+
+    def position(self, job_id: str) -> int:
+        """
+        Number of queued jobs ahead of this one.
+        """
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND submitted_at < "
+                "(SELECT submitted_at FROM jobs WHERE id = ?)",
+                (job_id,),
+            ).fetchone()[0]
+
+    def list(self, status: Optional[str] = None, limit: int = 100) -> List[Dict]:
+        """
+        Most recent jobs first, without their summaries.
+        """
+        sql = "SELECT id, status, job, submitted_at, started_at, finished_at, worker FROM jobs"
+        params = []
+        if status:
+            sql += " WHERE status = ?"
+            params.append(status)
+        with self._lock:
+            rows = self._conn.execute(sql + " ORDER BY submitted_at DESC LIMIT ?", params + [limit]).fetchall()
+        return [_record(row) for row in rows]
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {state: dict(rows).get(state, 0) for state in JOB_STATES}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def _record(row) -> Dict:
+    job_id, status, job, submitted_at, started_at, finished_at, worker = row
+    job = json.loads(job)
+    return {
+        "id": job_id,
+        "status": status,
+        "name": job.get("document_name") or job.get("name"),
+        "manufacturer": job.get("manufacturer"),
+        "submitted_at": submitted_at,
+        "started_at": started_at,
+        "finished_at": finished_at,
+        "worker": worker,
+    }
+
+
+def worker_name(pid: int) -> str:
+    return f"{socket.gethostname()}:{pid}"
+
+
+def worker_loop(queue_path: str, output_dir: str, workers: int = 1, stop: Optional[threading.Event] = None):
+    """
+    Worker process body: claim queued jobs one at a time and run process_document
+    on them until stop is set. workers is the pool size, used to share the API rate
+    limits between the workers.
+    Job outputs go to output_dir/<job name>/ (the service names jobs by their id).
+    """
+    from utils.pipeline import process_document
+
+    os.environ["PIPELINE_RATE_SHARE"] = str(workers)
+    queue = JobQueue(queue_path)
+    name = worker_name(os.getpid())
+    while stop is None or not stop.is_set():
+        claimed = queue.claim(name)
+        if claimed is None:
+            time.sleep(POLL_SECONDS)
+            continue
+        try:
+            summary = process_document(claimed["job"], output_dir)
+        except Exception as e:  # process_document reports its own failures; this covers e.g. an unwritable output dir
+            summary = {"status": "error", "error": f"{type(e).__name__}: {e}", "traceback": traceback.format_exc()}
+        print(f"[{name}] job {claimed['id']}: {summary['status']}")
+        queue.finish(claimed["id"], summary)
+    queue.close()
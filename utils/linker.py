@@ -1,5 +1,55 @@
 import pandas as pd
-from typing import Dict, List, Set
+from typing import Dict, List, Set, Tuple
+
+BOM_COLUMNS = ["REF", "PART_NUMBER", "DESCRIPTION"]
+LINKED_COLUMNS = BOM_COLUMNS + ["X", "Y", "W", "H", "Color"]
+ANOMALY_COLUMNS = ["Type"] + BOM_COLUMNS
+
+
+def build_ref_index(bom_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Normalize the BOM once: one row per upper-cased REF (first occurrence wins),
+    indexed by that normalized key.
+    """
+    index = bom_df[BOM_COLUMNS].copy()
+    index["_KEY"] = bom_df["REF"].astype(str).str.upper()
+    return index.drop_duplicates("_KEY", keep="first").set_index("_KEY")
+
+
+def _boxes_frame(detected_refs_by_page: Dict[int, List[Dict]]) -> pd.DataFrame:
+    records = [
+        (page_num, str(box["token"]).upper(), box["x"], box["y"], box["w"], box["h"], box.get("color", ""))
+        for page_num, boxes in detected_refs_by_page.items()
+        for box in boxes
+    ]
+    return pd.DataFrame(records, columns=["_PAGE", "_KEY", "X", "Y", "W", "H", "Color"])
+
+
+def _link(boxes: pd.DataFrame, ref_index: pd.DataFrame, pages) -> Dict[int, pd.DataFrame]:
+    # Inner join keeps the box order of each page
+    merged = boxes.join(ref_index, on="_KEY", how="inner")
+    linked = {page_num: pd.DataFrame() for page_num in pages}
+    for page_num, page_df in merged.groupby("_PAGE", sort=False):
+        linked[page_num] = page_df[LINKED_COLUMNS].reset_index(drop=True)
+    return linked
+
+
+def _anomalies(detected_keys: Set[str], ref_index: pd.DataFrame) -> pd.DataFrame:
+    missing = ref_index[~ref_index.index.isin(detected_keys)]
+    not_in_diagram = missing[BOM_COLUMNS].assign(Type="Not in Diagram")
+
+    unknown = sorted(detected_keys - set(ref_index.index))
+    not_in_bom = pd.DataFrame({
+        "Type": "Not in BOM",
+        "REF": unknown,
+        "PART_NUMBER": "",
+        "DESCRIPTION": ""
+    }, columns=ANOMALY_COLUMNS)
+
+    if not_in_diagram.empty and not_in_bom.empty:
+        return pd.DataFrame()
+    return pd.concat([not_in_diagram[ANOMALY_COLUMNS], not_in_bom], ignore_index=True)
+
 
 def link_parts_by_page(
     detected_refs_by_page: Dict[int, List[Dict]],  # now expects list of box dicts
@@ -11,24 +61,7 @@ def link_parts_by_page(
     bom_df: DataFrame with columns ["REF", "PART_NUMBER", "DESCRIPTION"]
     Returns: {page_num: DataFrame of linked BOM rows + coordinates}
     """
-    linked = {}
-    for page_num, boxes in detected_refs_by_page.items():
-        page_rows = []
-        for box in boxes:
-            ref_upper = str(box["token"]).upper()
-            match = bom_df[bom_df["REF"].astype(str).str.upper() == ref_upper]
-            if not match.empty:
-                row = match.iloc[0][["REF", "PART_NUMBER", "DESCRIPTION"]].to_dict()
-                row.update({
-                    "X": box["x"],
-                    "Y": box["y"],
-                    "W": box["w"],
-                    "H": box["h"],
-                    "Color": box.get("color", "")
-                })
-                page_rows.append(row)
-        linked[page_num] = pd.DataFrame(page_rows)
-    return linked
+    return _link(_boxes_frame(detected_refs_by_page), build_ref_index(bom_df), detected_refs_by_page.keys())
 
 
 def find_anomalies(
@@ -40,34 +73,43 @@ def find_anomalies(
     - Not in Diagram: BOM refs not found in any diagram
     - Not in BOM: Diagram refs not found in BOM
     """
-    bom_refs = set(bom_df["REF"].astype(str).str.upper())
-    all_detected = set()
-    for refs in detected_refs_by_page.values():
-        all_detected.update(str(r).upper() for r in refs)
-
-    # Not in Diagram
-    not_in_diagram = bom_refs - all_detected
-    not_in_diagram_rows = []
-    for ref in not_in_diagram:
-        match = bom_df[bom_df["REF"].astype(str).str.upper() == ref]
-        if not match.empty:
-            row = match.iloc[0]
-            not_in_diagram_rows.append({
-                "Type": "Not in Diagram",
-                "REF": row["REF"],
-                "PART_NUMBER": row["PART_NUMBER"],
-                "DESCRIPTION": row["DESCRIPTION"]
-            })
-
-    # Not in BOM
-    not_in_bom = all_detected - bom_refs
-    not_in_bom_rows = []
-    for ref in not_in_bom:
-        not_in_bom_rows.append({
-            "Type": "Not in BOM",
-            "REF": ref,
-            "PART_NUMBER": "",
-            "DESCRIPTION": ""
-        })
-
-    return pd.DataFrame(not_in_diagram_rows + not_in_bom_rows)
+    detected_keys = {str(r).upper() for refs in detected_refs_by_page.values() for r in refs}
+    return _anomalies(detected_keys, build_ref_index(bom_df))
+
+
+class IncrementalLinker:
+    """
+    Links pages one at a time against a single REF index, for streaming runs.
+    anomalies() reflects the pages added so far: "Not in Diagram" rows shrink
+    and "Not in BOM" rows grow as pages arrive.
+    """
+
+    def __init__(self, bom_df: pd.DataFrame):
+        self.ref_index = build_ref_index(bom_df)
+        self.detected_keys = set()
+
+    def add_page(self, page_num: int, boxes: List[Dict]) -> pd.DataFrame:
+        """
+        Record one page's box dicts and return its linked BOM rows.
+        """
+        frame = _boxes_frame({page_num: boxes})
+        self.detected_keys.update(frame["_KEY"])
+        return _link(frame, self.ref_index, [page_num])[page_num]
+
+    def anomalies(self) -> pd.DataFrame:
+        return _anomalies(self.detected_keys, self.ref_index)
+
+
+def link_and_find_anomalies(
+    detected_refs_by_page: Dict[int, List[Dict]],
+    bom_df: pd.DataFrame
+) -> Tuple[Dict[int, pd.DataFrame], pd.DataFrame]:
+    """
+    Linked tables and anomalies for all pages in one pass over a single REF index.
+    detected_refs_by_page: {page_num: list of box dicts} (as for link_parts_by_page)
+    Returns: (linked tables per page, anomalies table)
+    """
+    ref_index = build_ref_index(bom_df)
+    boxes = _boxes_frame(detected_refs_by_page)
+    linked = _link(boxes, ref_index, detected_refs_by_page.keys())
+    return linked, _anomalies(set(boxes["_KEY"]), ref_index)
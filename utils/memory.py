@@ -0,0 +1,79 @@
+import math
+import os
+import resource
+from typing import Optional, Tuple
+
+from utils.tiling import MIN_DPI
+
+# Peak page-sized buffers alive while one page is processed (render, drawing or
+# crop copy, encoder/PIL working image); the budget check multiplies by this.
+PEAK_COPIES = 3
+BYTES_PER_PIXEL = {"rgb": 3, "gray": 1, "bilevel": 1}
+MIN_BAND_ROWS = 64
+RENDER_CACHE_SHARE = 4  # under a budget, the session render cache gets 1/4 of it
+
+
+def memory_budget_bytes() -> int:
+    """
+    Per-process peak memory budget for page buffers from $PIPELINE_MEMORY_BUDGET_MB
+    (0 or unset: no budget). Read per call so worker processes pick up the batch runner's setting.
+    """
+    return int(float(os.getenv("PIPELINE_MEMORY_BUDGET_MB", "0") or 0) * 1024 * 1024)
+
+
+def page_budget_bytes(budget: Optional[int] = None) -> int:
+    """
+    Part of the budget left for the page being processed once the render cache
+    has its share (0: no budget).
+    """
+    budget = memory_budget_bytes() if budget is None else budget
+    return budget - budget // RENDER_CACHE_SHARE
+
+
+def page_pixels(page, dpi: int) -> Tuple[int, int]:
+    """
+    Width and height in pixels of a page rendered at dpi.
+    """
+    rect = page.rect
+    return math.ceil(rect.width * dpi / 72), math.ceil(rect.height * dpi / 72)
+
+
+def fit_render(page, dpi: int, colorspace: str = "gray", budget: Optional[int] = None,
+               copies: int = PEAK_COPIES, min_dpi: int = MIN_DPI) -> Tuple[int, int]:
+    """
+    DPI and number of horizontal bands to render a page within budget bytes.
+    The DPI is lowered until copies full-page buffers fit, but not below min_dpi;
+    if the page is still too large there, it is rendered in bands (>1) so only
+    one band is held at a time.
+    Returns (dpi, bands); (dpi, 1) when budget is 0/None or the page fits.
+    """
+    budget = memory_budget_bytes() if budget is None else budget
+    width, height = page_pixels(page, dpi)
+    bpp = BYTES_PER_PIXEL[colorspace]
+    if not budget or width * height * bpp * copies <= budget:
+        return dpi, 1
+
+    area_sq_in = (page.rect.width / 72) * (page.rect.height / 72)
+    fit_dpi = int(math.sqrt(budget / (copies * bpp * area_sq_in)))
+    if fit_dpi >= min(min_dpi, dpi):
+        return fit_dpi, 1
+
+    dpi = min(min_dpi, dpi)
+    width, height = page_pixels(page, dpi)
+    band_rows = max(MIN_BAND_ROWS, budget // (copies * bpp * width))
+    return dpi, math.ceil(height / band_rows)
+
+
+def band_boxes(width: int, height: int, bands: int):
+    """
+    Split a width x height render into horizontal (x0, y0, x1, y1) pixel bands.
+    """
+    rows = math.ceil(height / max(1, bands))
+    return [(0, y0, width, min(y0 + rows, height)) for y0 in range(0, height, rows)]
+
+
+def peak_rss_mb() -> float:
+    """
+    High-water mark of this process's resident memory.
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # Linux reports KiB
@@ -0,0 +1,224 @@
+import contextvars
+import json
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+METRIC_PREFIX = "ocr_pipeline"
+MAX_SPANS = 10000  # raw spans kept for the JSON report; aggregates cover everything
+
+
+def _label_key(labels: Dict) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Metrics:
+    """
+    Thread-safe, in-process spans and counters.
+    span("render", page=3) times a block; incr("bytes_uploaded", n, service="vision")
+    adds to a counter. Aggregates are kept per (name, labels) for counters and
+    per stage name for spans.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counters = {}
+            self.stages = {}
+            self.spans = []
+            self.started = time.time()
+
+    @contextmanager
+    def span(self, name: str, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_span(name, time.perf_counter() - start, **labels)
+
+    def record_span(self, name: str, seconds: float, **labels):
+        with self._lock:
+            agg = self.stages.setdefault(name, {"count": 0, "seconds": 0.0, "max_seconds": 0.0})
+            agg["count"] += 1
+            agg["seconds"] += seconds
+            agg["max_seconds"] = max(agg["max_seconds"], seconds)
+            if len(self.spans) < MAX_SPANS:
+                self.spans.append({"name": name, "seconds": round(seconds, 6), **labels})
+
+    def incr(self, name: str, value: float = 1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def snapshot(self) -> Dict:
+        """
+        Plain-data copy (JSON/pickle friendly), e.g. to ship from a worker process.
+        """
+        with self._lock:
+            return {
+                "started": self.started,
+                "counters": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in sorted(self.counters.items())
+                ],
+                "stages": {name: dict(agg) for name, agg in self.stages.items()},
+                "spans": list(self.spans),
+            }
+
+    def merge(self, snapshot: Dict):
+        """
+        Add a snapshot (from another process or scope) into this registry.
+        """
+        with self._lock:
+            for c in snapshot.get("counters", []):
+                key = (c["name"], _label_key(c["labels"]))
+                self.counters[key] = self.counters.get(key, 0) + c["value"]
+            for name, other in snapshot.get("stages", {}).items():
+                agg = self.stages.setdefault(name, {"count": 0, "seconds": 0.0, "max_seconds": 0.0})
+                agg["count"] += other["count"]
+                agg["seconds"] += other["seconds"]
+                agg["max_seconds"] = max(agg["max_seconds"], other["max_seconds"])
+            room = MAX_SPANS - len(self.spans)
+            if room > 0:
+                self.spans.extend(snapshot.get("spans", [])[:room])
+
+    def counter_total(self, name: str, **labels) -> float:
+        """
+        Sum of a counter over all label sets matching the given labels.
+        """
+        want = {k: str(v) for k, v in labels.items()}
+        with self._lock:
+            return sum(
+                value for (n, lbls), value in self.counters.items()
+                if n == name and all(dict(lbls).get(k) == v for k, v in want.items())
+            )
+
+    def summary(self) -> Dict:
+        """
+        Compact per-stage timings and headline counters for display.
+        """
+        with self._lock:
+            stages = {
+                name: {"count": agg["count"], "seconds": round(agg["seconds"], 3),
+                       "max_seconds": round(agg["max_seconds"], 3)}
+                for name, agg in sorted(self.stages.items(), key=lambda kv: -kv[1]["seconds"])
+            }
+        return {
+            "stages": stages,
+            "pages_rendered": self.counter_total("pages_rendered"),
+            "pixels_rendered": self.counter_total("pixels_rendered"),
+            "api_calls": self.counter_total("api_calls"),
+            "bytes_uploaded": self.counter_total("bytes_uploaded"),
+            "upload_bytes_saved": self.counter_total("upload_bytes_raw") - self.counter_total("upload_bytes_encoded"),
+            "cache_hits": self.counter_total("cache_hits"),
+            "cache_misses": self.counter_total("cache_misses"),
+        }
+
+    def to_prometheus(self) -> str:
+        """
+        Prometheus text exposition format.
+        """
+        lines = []
+        with self._lock:
+            by_name = {}
+            for (name, labels), value in sorted(self.counters.items()):
+                by_name.setdefault(name, []).append((labels, value))
+            for name, series in by_name.items():
+                metric = f"{METRIC_PREFIX}_{name}_total"
+                lines.append(f"# TYPE {metric} counter")
+                for labels, value in series:
+                    lines.append(f"{metric}{_format_labels(labels)} {value}")
+
+            if self.stages:
+                for suffix, field, kind in (("seconds_sum", "seconds", "counter"),
+                                            ("seconds_count", "count", "counter"),
+                                            ("seconds_max", "max_seconds", "gauge")):
+                    metric = f"{METRIC_PREFIX}_stage_{suffix}"
+                    lines.append(f"# TYPE {metric} {kind}")
+                    for name, agg in sorted(self.stages.items()):
+                        lines.append(f"{metric}{_format_labels((('stage', name),))} {agg[field]}")
+        return "\n".join(lines) + "\n"
+
+    def write_json(self, path: str):
+        report = self.snapshot()
+        report["summary"] = self.summary()
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2, default=str)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+_metrics = Metrics()
+# Registry of the current metrics_scope; per thread/task, so concurrent scopes
+# don't see each other's counters and the process-wide registry stays whole
+_scoped = contextvars.ContextVar("metrics_scope", default=None)
+
+
+def get_metrics() -> Metrics:
+    """
+    Registry span/incr record into: the innermost metrics_scope of this context,
+    else the process-wide one.
+    """
+    return _scoped.get() or _metrics
+
+
+@contextmanager
+def metrics_scope():
+    """
+    Record into a fresh registry for the duration of the block (e.g. one document)
+    in this thread only; get_metrics() elsewhere is unaffected. Threads started
+    inside the block must run in a copy of its context (contextvars.copy_context).
+    """
+    scope = Metrics()
+    token = _scoped.set(scope)
+    try:
+        yield scope
+    finally:
+        _scoped.reset(token)
+
+
+def span(name: str, **labels):
+    return get_metrics().span(name, **labels)
+
+
+def incr(name: str, value: float = 1, **labels):
+    get_metrics().incr(name, value, **labels)
+
+
+def serve_prometheus(port: int, host: str = "0.0.0.0", metrics: Optional[Metrics] = None) -> ThreadingHTTPServer:
+    """
+    Serve /metrics in a background thread. Returns the server (call shutdown() to stop).
+    """
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip("/") not in ("", "/metrics"):
+                self.send_error(404)
+                return
+            body = (metrics or get_metrics()).to_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -1,35 +1,75 @@
 import os
 import base64
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple, Union
 import requests
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
+from utils.cache import get_cache, make_key, make_file_key
+from utils.metrics import span, incr
+from utils.encoding import encode_image_file
+from utils.rate_limit import get_scheduler, RetryableError, ServiceError, RETRY_STATUS
 
 load_dotenv()
 API_KEY = os.getenv("VISION_API_KEY")
-ENDPOINT_URL = f"https://vision.googleapis.com/v1/images:annotate?key={API_KEY}"
+VISION_ENDPOINT = os.getenv("VISION_ENDPOINT", "https://vision.googleapis.com/v1/images:annotate")
+ENDPOINT_URL = f"{VISION_ENDPOINT}?key={API_KEY}"
 
-def detect_text_with_boxes(image_path: str):
+REQUEST_TIMEOUT = float(os.getenv("VISION_TIMEOUT", "120"))  # seconds per images:annotate call
+MAX_IMAGES_PER_REQUEST = 16  # Vision limit for one images:annotate call
+MAX_REQUEST_BYTES = 10 * 1024 * 1024  # Vision limit for the JSON request body
+DEFAULT_BATCH_SIZE = 4
+DEFAULT_MAX_IN_FLIGHT = 4
+FEATURE_TYPE = "DOCUMENT_TEXT_DETECTION"
+CACHE_NAMESPACE = "vision"
+# Per-image google.rpc codes worth retrying: DEADLINE_EXCEEDED, RESOURCE_EXHAUSTED, INTERNAL, UNAVAILABLE
+RETRY_CODES = {4, 8, 13, 14}
+
+_session = None
+_session_lock = threading.Lock()
+
+# An OCR input is either a path to an image file or the encoded image bytes (PNG/JPEG/TIFF)
+ImageInput = Union[str, bytes]
+
+
+def get_session() -> requests.Session:
     """
-    Returns (full_text, words)
-    words = list of dicts: {'text': str, 'x': float, 'y': float, 'w': int, 'h': int}
+    Shared keep-alive session for Vision calls (one connection pool per process).
     """
-    with open(image_path, "rb") as f:
-        content = base64.b64encode(f.read()).decode("utf-8")
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(DEFAULT_MAX_IN_FLIGHT, 16))
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
 
-    body = {
-        "requests": [{
-            "image": {"content": content},
-            "features": [{"type": "DOCUMENT_TEXT_DETECTION"}],
-        }]
-    }
 
-    resp = requests.post(ENDPOINT_URL, json=body)
-    data = resp.json()
+def _encode_image(image: ImageInput) -> str:
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        return base64.b64encode(image).decode("utf-8")
+    with open(image, "rb") as f:
+        return base64.b64encode(f.read()).decode("utf-8")
+
+
+def _image_key(image: ImageInput, **params) -> str:
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        return make_key(image, **params)
+    return make_file_key(image, **params)
+
+
+def _payload_size(image: ImageInput) -> int:
+    size = len(image) if isinstance(image, (bytes, bytearray, memoryview)) else os.path.getsize(image)
+    return (size + 2) // 3 * 4
 
-    try:
-        r = data["responses"][0]
-    except (KeyError, IndexError):
-        return "NO TEXT FOUND", []
 
+def _parse_response(r: Dict) -> Tuple[str, List[Dict]]:
+    """
+    Convert one entry of "responses" into (full_text, words).
+    """
     full_text = r.get("fullTextAnnotation", {}).get("text", "") or "NO TEXT FOUND"
 
     words = []
@@ -51,4 +91,179 @@ def detect_text_with_boxes(image_path: str):
                 "h": y_max - y_min
             })
 
-    return full_text, words
\ No newline at end of file
+    return full_text, words
+
+
+class OcrError(Exception):
+    """
+    Raised by detect_text_batch when images could not be OCRed and the caller
+    did not ask for per-image errors.
+    """
+
+    def __init__(self, errors: Dict[int, str]):
+        super().__init__(f"{len(errors)} image(s) failed OCR: " + "; ".join(sorted(set(errors.values()))))
+        self.errors = errors
+
+
+def _annotate_contents(contents: List[str]) -> List[Tuple[Optional[Tuple[str, List[Dict]]], Optional[Dict]]]:
+    """
+    Send base64 images in one images:annotate call.
+    Returns one (result, error) per image, in order: result is (full_text, words),
+    or None with Vision's per-image error dict ({"code", "message"}).
+    Raises RetryableError on 429/5xx and ServiceError on other HTTP failures.
+    """
+    body = {
+        "requests": [{
+            "image": {"content": content},
+            "features": [{"type": FEATURE_TYPE}],
+        } for content in contents]
+    }
+
+    incr("api_calls", service="vision")
+    incr("images_sent", len(contents), service="vision")
+    incr("bytes_uploaded", sum(len(c) for c in contents), service="vision")
+    with span("vision_request", images=len(contents)):
+        resp = get_session().post(ENDPOINT_URL, json=body, timeout=REQUEST_TIMEOUT)
+    if resp.status_code in RETRY_STATUS:
+        retry_after = resp.headers.get("Retry-After")
+        raise RetryableError(f"Vision HTTP {resp.status_code}", status=resp.status_code,
+                             retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None)
+    if resp.status_code != 200:
+        raise ServiceError(f"Vision HTTP {resp.status_code}: {resp.text[:200]}")
+    data = resp.json()
+
+    responses = data.get("responses", []) if isinstance(data, dict) else []
+    results = []
+    for i in range(len(contents)):
+        if i >= len(responses):
+            results.append((None, {"code": 14, "message": "missing response"}))
+        elif "error" in responses[i]:
+            results.append((None, responses[i]["error"]))
+        else:
+            results.append((_parse_response(responses[i]), None))
+    return results
+
+
+def _annotate_with_retries(contents: List[str]) -> Tuple[List[Optional[Tuple[str, List[Dict]]]], Dict[int, str]]:
+    """
+    One images:annotate call through the Vision scheduler (rate limit, budget,
+    backoff on 429/5xx); images with transient per-image errors are resent.
+    Returns (results, errors): results[i] is None where errors[i] explains why.
+    """
+    scheduler = get_scheduler("vision", API_KEY)
+    results = [None] * len(contents)
+    errors = {}
+    todo = list(range(len(contents)))
+    for attempt in range(scheduler.max_retries + 1):
+        try:
+            responses = scheduler.call(_annotate_contents, [contents[i] for i in todo], cost=len(todo))
+        except ServiceError as e:
+            errors.update({i: str(e) for i in todo})
+            break
+        retry = []
+        for i, (result, error) in zip(todo, responses):
+            if result is not None:
+                results[i] = result
+                errors.pop(i, None)
+                continue
+            errors[i] = f"Vision error {error.get('code')}: {error.get('message', '')}"
+            if error.get("code") in RETRY_CODES:
+                retry.append(i)
+        if not retry or attempt == scheduler.max_retries:
+            break
+        incr("api_retries", len(retry), service="vision", status="item")
+        scheduler.backoff(attempt)
+        todo = retry
+    return results, errors
+
+
+def _pack_batches(sizes: List[int], batch_size: int) -> List[List[int]]:
+    """
+    Group image indices into requests of at most batch_size images and MAX_REQUEST_BYTES.
+    sizes: base64 payload size of each image
+    """
+    batch_size = max(1, min(batch_size, MAX_IMAGES_PER_REQUEST))
+    batches, current, current_bytes = [], [], 0
+    for i, size in enumerate(sizes):
+        if current and (len(current) >= batch_size or current_bytes + size > MAX_REQUEST_BYTES):
+            batches.append(current)
+            current, current_bytes = [], 0
+        current.append(i)
+        current_bytes += size
+    if current:
+        batches.append(current)
+    return batches
+
+
+def detect_text_batch(
+    images: List[ImageInput],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+    dpi: Union[None, int, List[Optional[int]]] = None,
+    errors: Optional[Dict[int, str]] = None,
+) -> List[Tuple[str, List[Dict]]]:
+    """
+    OCR many images, packing several pages per images:annotate call and
+    keeping up to max_in_flight calls running at once. Calls go through the
+    Vision scheduler (utils.rate_limit), which rate-limits, tracks the budget
+    and retries 429/5xx and transient per-image errors.
+    images: image file paths or encoded image bytes (mixing is fine)
+    dpi: render DPI of the images (part of the cache key), one value or one per image
+    errors: when given, images that still fail are reported here as {index: message}
+        (their result is ("NO TEXT FOUND", [])); otherwise OcrError is raised
+    Pages already in the on-disk cache (same bytes, dpi and feature) are not sent.
+    Returns one (full_text, words) per image, in input order.
+    """
+    if not images:
+        return []
+    cache = get_cache()
+    results = [None] * len(images)
+    keys = [None] * len(images)
+    dpis = dpi if isinstance(dpi, (list, tuple)) else [dpi] * len(images)
+    pending = []
+    for i, image in enumerate(images):
+        if cache is not None:
+            keys[i] = _image_key(image, dpi=dpis[i], feature=FEATURE_TYPE)
+            results[i] = cache.get(CACHE_NAMESPACE, keys[i])
+        if results[i] is None:
+            pending.append(i)
+
+    sizes = [_payload_size(images[i]) for i in pending]
+    batches = [[pending[j] for j in batch] for batch in _pack_batches(sizes, batch_size)]
+
+    def _run(batch: List[int]):
+        # Encode inside the worker so only in-flight pages are held in memory
+        return _annotate_with_retries([_encode_image(images[i]) for i in batch])
+
+    failed = {}
+    if batches:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_in_flight, len(batches)))) as pool:
+            # Each call runs in a copy of this context, so its metrics go to the caller's metrics_scope
+            futures = {pool.submit(contextvars.copy_context().run, _run, batch): batch for batch in batches}
+            for future, batch in futures.items():
+                batch_results, batch_errors = future.result()
+                for j, (i, result) in enumerate(zip(batch, batch_results)):
+                    if result is None:
+                        failed[i] = batch_errors.get(j, "no response")
+                        result = ("NO TEXT FOUND", [])
+                    elif cache is not None:
+                        cache.set(CACHE_NAMESPACE, keys[i], result)
+                    results[i] = result
+
+    if failed:
+        incr("ocr_failed_images", len(failed), service="vision")
+        if errors is None:
+            raise OcrError(failed)
+        errors.update(failed)
+    return results
+
+
+def detect_text_with_boxes(image_path: ImageInput, dpi: Optional[int] = None):
+    """
+    image_path: image file path (re-encoded compactly, see utils.encoding) or encoded image bytes
+    Returns (full_text, words); raises OcrError if Vision could not process the image
+    words = list of dicts: {'text': str, 'x': float, 'y': float, 'w': int, 'h': int}
+    """
+    if isinstance(image_path, str):
+        image_path, _ = encode_image_file(image_path, "vision")
+    return detect_text_batch([image_path], batch_size=1, max_in_flight=1, dpi=dpi)[0]
@@ -0,0 +1,215 @@
+import re
+import sys
+from collections import defaultdict
+from typing import Dict, List, Union
+
+from PIL import Image
+
+from utils.document import DocumentSession, document_session
+from utils.metrics import span, incr
+from utils.pdf_to_tiff import pixmap_to_image
+
+PAGE_CLASSES = ("diagram", "table", "other")
+MIN_TEXT_WORDS = 5          # pages with fewer words are judged from a thumbnail
+THUMB_DPI = 36              # thumbnail resolution for pages judged from their pixels
+INK_CONTRAST = 32           # thumbnail pixels this much darker than the paper are ink
+BLANK_MAX_INK = 0.001       # share of ink pixels below which a scanned page is blank
+RULE_MIN_FRACTION = 0.4     # a ruling line spans at least this share of the page width/height
+MIN_TABLE_RULES = 3         # horizontal rules that make a ruled table
+MIN_PART_NUMBERS = 5        # part-number-like words a BOM page has at least
+MIN_PART_NUMBER_LINES = 0.3  # share of text lines holding a part number on unruled BOM pages
+DIAGRAM_MIN_PATHS = 20      # vector drawing items of a line-art diagram at least
+DIAGRAM_PATHS_PER_WORD = 1.0  # line art has at least as many drawing items as words
+DIAGRAM_MIN_IMAGE = 0.3     # share of the page covered by raster images on scanned-in diagrams
+DIAGRAM_MAX_TEXT = 0.15     # share of the page covered by words on a diagram
+DIAGRAM_MIN_CALLOUTS = 0.3  # share of words that look like callouts
+MIN_CALLOUTS = 3            # callout-like words on a diagram at least
+
+CALLOUT_RE = re.compile(r"^(?=.*\d)[A-Z0-9]{1,4}$")
+PART_NUMBER_RE = re.compile(r"^(?=(?:.*\d){3})[A-Z0-9][A-Z0-9\-./]{4,}$")
+
+
+def _rules(drawings, width: float, height: float):
+    """
+    Count horizontal and vertical ruling lines: straight segments (lines or
+    rectangle edges) added up per row/column, so cell grids drawn as many
+    short rectangles count as full rules.
+    """
+    rows, cols = defaultdict(float), defaultdict(float)
+    for path in drawings:
+        for item in path.get("items", ()):
+            if item[0] == "l":
+                (x0, y0), (x1, y1) = (item[1][0], item[1][1]), (item[2][0], item[2][1])
+                if abs(y1 - y0) < 1:
+                    rows[round(y0)] += abs(x1 - x0)
+                elif abs(x1 - x0) < 1:
+                    cols[round(x0)] += abs(y1 - y0)
+            elif item[0] == "re":
+                x0, y0, x1, y1 = tuple(item[1])
+                for y in (y0, y1):
+                    rows[round(y)] += abs(x1 - x0)
+                for x in (x0, x1):
+                    cols[round(x)] += abs(y1 - y0)
+    h_rules = sum(length >= RULE_MIN_FRACTION * width for length in rows.values())
+    v_rules = sum(length >= RULE_MIN_FRACTION * height for length in cols.values())
+    return h_rules, v_rules
+
+
+def page_features(page) -> Dict:
+    """
+    Cheap layout statistics of one page from its text layer, vector drawings
+    and image placements (nothing is rendered).
+    """
+    rect = page.rect
+    area = max(rect.width * rect.height, 1.0)
+    words = page.get_text("words")
+    tokens = [w[4].strip().upper() for w in words]
+
+    lines = defaultdict(list)
+    for w, token in zip(words, tokens):
+        lines[(w[5], w[6])].append(token)
+    part_number_lines = sum(any(PART_NUMBER_RE.match(t) for t in line) for line in lines.values())
+    callouts = sum(bool(CALLOUT_RE.match(t)) for t in tokens)
+
+    get_drawings = getattr(page, "get_cdrawings", page.get_drawings)  # raw form is faster where available
+    drawings = get_drawings()
+    h_rules, v_rules = _rules(drawings, rect.width, rect.height)
+    image_area = sum(abs(info["bbox"][2] - info["bbox"][0]) * abs(info["bbox"][3] - info["bbox"][1])
+                     for info in page.get_image_info())
+
+    return {
+        "words": len(words),
+        "text_coverage": sum((w[2] - w[0]) * (w[3] - w[1]) for w in words) / area,
+        "callouts": callouts,
+        "callout_ratio": callouts / max(len(tokens), 1),
+        "part_numbers": sum(bool(PART_NUMBER_RE.match(t)) for t in tokens),
+        "part_number_lines": part_number_lines / max(len(lines), 1),
+        "vector_paths": sum(len(path.get("items", ())) for path in drawings),
+        "h_rules": h_rules,
+        "v_rules": v_rules,
+        "image_coverage": min(image_area / area, 1.0),
+    }
+
+
+def thumbnail_features(session: DocumentSession, page_num: int) -> Dict:
+    """
+    Ink and ruling statistics from a low-resolution grayscale render, for pages
+    without a usable text layer (scans) or mostly covered by images.
+    Ink is judged against the paper level (the most common gray), since thin
+    lines average out to light gray at thumbnail resolution.
+    """
+    pix = session.render(page_num, THUMB_DPI, "gray", stage="classify")
+    img = pixmap_to_image(pix)
+    levels = img.histogram()
+    paper = max(range(256), key=levels.__getitem__)
+    ink = img.point([255 if v < paper - INK_CONTRAST else 0 for v in range(256)])
+    row_ink = list(ink.resize((1, pix.height), Image.BOX).getdata())
+    col_ink = list(ink.resize((pix.width, 1), Image.BOX).getdata())
+    hist = ink.histogram()
+    return {
+        "ink": hist[255] / max(pix.width * pix.height, 1),
+        "h_rules": _runs(row_ink, 255 * 0.6),
+        "v_rules": _runs(col_ink, 255 * 0.4),
+        "text_rows": sum(v >= 255 * 0.15 for v in row_ink) / max(len(row_ink), 1),
+    }
+
+
+def _runs(profile: List[int], threshold: float) -> int:
+    # Adjacent dark rows/columns are one line
+    runs, inside = 0, False
+    for v in profile:
+        if v >= threshold and not inside:
+            runs += 1
+        inside = v >= threshold
+    return runs
+
+
+def _label(f: Dict) -> tuple:
+    if f["part_numbers"] >= MIN_PART_NUMBERS and (
+        f["h_rules"] >= MIN_TABLE_RULES or f["part_number_lines"] >= MIN_PART_NUMBER_LINES
+    ):
+        return "table", "part numbers in ruled rows" if f["h_rules"] >= MIN_TABLE_RULES else "part numbers in rows"
+    # Drawing items relative to words, so sparse diagrams and large formats both count
+    line_art = f["vector_paths"] >= max(DIAGRAM_MIN_PATHS, DIAGRAM_PATHS_PER_WORD * f["words"])
+    if (line_art or f["image_coverage"] >= DIAGRAM_MIN_IMAGE) and f["text_coverage"] <= DIAGRAM_MAX_TEXT \
+            and f["callouts"] >= MIN_CALLOUTS and f["callout_ratio"] >= DIAGRAM_MIN_CALLOUTS:
+        return "diagram", "line art with callouts"
+    return "other", "text or cover page"
+
+
+def _label_scan(f: Dict) -> tuple:
+    if f["ink"] < BLANK_MAX_INK:
+        return "other", "blank page"
+    # Column rules of a short table do not span enough of the page; many row rules alone do
+    if f["h_rules"] >= 2 * MIN_TABLE_RULES or (f["h_rules"] >= MIN_TABLE_RULES + 1 and f["v_rules"] >= 2):
+        return "table", "scanned ruled table"
+    if f["text_rows"] >= 0.4:
+        return "other", "scanned text"
+    return "diagram", "scanned line art"
+
+
+def classify_page(session: DocumentSession, page_num: int) -> Dict:
+    """
+    Label one 1-based page as "diagram", "table" (BOM) or "other".
+    Returns {"page", "label", "reason", "scanned", "features"}.
+    """
+    features = page_features(session.page(page_num))
+    label, reason = _label(features)
+    # No text to go by on a raster or line-art page, or a raster page whose text
+    # layer (title block, OCR of a scan) says nothing: look at the pixels instead
+    pictured = features["image_coverage"] >= DIAGRAM_MIN_IMAGE
+    scanned = (features["words"] < MIN_TEXT_WORDS and (pictured or features["vector_paths"] >= DIAGRAM_MIN_PATHS)) \
+        or (label == "other" and pictured)
+    if scanned:
+        features.update(thumbnail_features(session, page_num))
+        label, reason = _label_scan(features)
+    incr("pages_classified", label=label)
+    return {"page": page_num, "label": label, "reason": reason, "scanned": scanned, "features": features}
+
+
+def classify_document(pdf_path: Union[str, bytes, DocumentSession]) -> List[Dict]:
+    """
+    One pass over every page (text layer, drawings and image placements; a
+    thumbnail only for pages without text) with classify_page.
+    """
+    with document_session(pdf_path) as session, span("classify", pages=session.page_count):
+        return [classify_page(session, page_num) for page_num in range(1, session.page_count + 1)]
+
+
+def suggest_pages(pdf_path: Union[str, bytes, DocumentSession, List[Dict]]) -> Dict[str, List[int]]:
+    """
+    Suggested page selections: {"diagram": [...], "table": [...], "other": [...]} (1-based).
+    pdf_path may also be the result list of classify_document.
+    """
+    results = pdf_path if isinstance(pdf_path, list) else classify_document(pdf_path)
+    suggested = {label: [] for label in PAGE_CLASSES}
+    for result in results:
+        suggested[result["label"]].append(result["page"])
+    return suggested
+
+
+def format_page_range(pages: List[int]) -> str:
+    """
+    Inverse of parse_page_range: [1, 2, 3, 5, 7, 8] -> "1-3,5,7-8".
+    """
+    parts = []
+    pages = sorted(set(pages))
+    start = prev = None
+    for p in pages + [None]:
+        if start is not None and (p is None or p != prev + 1):
+            parts.append(str(start) if start == prev else f"{start}-{prev}")
+            start = None
+        if p is not None and start is None:
+            start = p
+        prev = p
+    return ",".join(parts)
+
+
+if __name__ == "__main__":
+    # python -m utils.page_classifier manual.pdf
+    results = classify_document(sys.argv[1])
+    for result in results:
+        print(f"{result['page']:>4}  {result['label']:<8} {result['reason']}")
+    suggested = suggest_pages(results)
+    print(f"diagram pages: {format_page_range(suggested['diagram'])}")
+    print(f"table pages:   {format_page_range(suggested['table'])}")
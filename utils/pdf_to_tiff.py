@@ -1,36 +1,109 @@
 import os
 import fitz  # PyMuPDF
 from PIL import Image
+from utils.metrics import span
+from utils.document import document_session
+from utils.memory import fit_render, band_boxes, page_pixels
 
-def convert_pdf_to_tiffs(pdf_path, page_indices, output_dir="tmp/diagram_tiffs", dpi=300):
+TIFF_COLORSPACES = ("rgb", "gray", "bilevel")
+BILEVEL_THRESHOLD = 160  # gray level separating ink from paper
+
+
+def convert_pdf_to_tiffs(pdf_path, page_indices, output_dir="tmp/diagram_tiffs", dpi=300,
+                         colorspace="rgb", memory_budget=None):
     """
     Convert selected PDF pages to TIFFs using PyMuPDF.
     Args:
-        pdf_path: path to input PDF
+        pdf_path: path to input PDF, or an open DocumentSession (renders are shared)
         page_indices: list of 1-based page indices (user input)
         output_dir: folder to store TIFF files
         dpi: rendering resolution
+        colorspace: "rgb", "gray" (8-bit) or "bilevel" (1-bit, Group 4 compressed)
+        memory_budget: peak bytes for page buffers (default $PIPELINE_MEMORY_BUDGET_MB,
+            0: none); pages that would exceed it are rendered at a lower DPI, or in
+            horizontal bands when even MIN_DPI does not fit
     Returns:
         List of output TIFF file paths
     """
+    if colorspace not in TIFF_COLORSPACES:
+        raise ValueError(f"Unknown colorspace '{colorspace}'. Choose from {TIFF_COLORSPACES}")
     os.makedirs(output_dir, exist_ok=True)
-    doc = fitz.open(pdf_path)
+    render_cs = "rgb" if colorspace == "rgb" else "gray"
+    save_args = {"compression": "group4"} if colorspace == "bilevel" else {}
 
     output_files = []
-    zoom = dpi / 72  # scale factor (72 dpi is PDF default)
-    mat = fitz.Matrix(zoom, zoom)
-
-    for page_num in page_indices:
-        page_index = page_num - 1  # Convert to 0-based index
-        if page_index < 0 or page_index >= len(doc):
-            continue
-        page = doc[page_index]
-        pix = page.get_pixmap(matrix=mat, alpha=False)
-        img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-
-        out_file = os.path.join(output_dir, f"diagram_page_{page_num}.tiff")
-        img.save(out_file, "TIFF")
-        output_files.append(out_file)
-
-    doc.close()
-    return output_files
\ No newline at end of file
+    with document_session(pdf_path, max_bytes=0) as session:  # a one-off session has nothing to share
+        for page_num in page_indices:
+            if page_num < 1 or page_num > session.page_count:
+                continue
+            page_dpi, bands = fit_render(session.page(page_num), dpi, render_cs, memory_budget)
+            out_file = os.path.join(output_dir, f"diagram_page_{page_num}.tiff")
+            if bands == 1:
+                pix = session.render(page_num, page_dpi, render_cs)
+                img = _to_tiff_mode(pixmap_to_image(pix), colorspace)
+            else:
+                pix = None
+                img = _render_banded(session, page_num, page_dpi, bands, render_cs, colorspace)
+            with span("write_tiff", page=page_num):
+                img.save(out_file, "TIFF", **save_args)
+            del img, pix  # release this page's buffers before rendering the next one
+            output_files.append(out_file)
+    return output_files
+
+
+def _to_tiff_mode(img: Image.Image, colorspace: str) -> Image.Image:
+    if colorspace != "bilevel":
+        return img
+    return img.point([255 if v > BILEVEL_THRESHOLD else 0 for v in range(256)], "1")
+
+
+def _render_banded(session, page_num: int, dpi: int, bands: int, render_cs: str, colorspace: str) -> Image.Image:
+    """
+    Assemble a page from horizontal band renders so only the output image and
+    one band are in memory.
+    """
+    width, height = page_pixels(session.page(page_num), dpi)
+    mode = {"rgb": "RGB", "gray": "L", "bilevel": "1"}[colorspace]
+    out = Image.new(mode, (width, height), 1 if mode == "1" else "white")
+    for box in band_boxes(width, height, bands):
+        band = session.render_clip(page_num, dpi, box, render_cs)
+        out.paste(_to_tiff_mode(pixmap_to_image(band), colorspace), (band.x, band.y))
+        del band
+    return out
+
+
+def render_pages(pdf_path, page_indices, dpi=300):
+    """
+    Render selected PDF pages in memory, one at a time.
+    Args:
+        pdf_path: path to input PDF, or an open DocumentSession (renders are shared)
+        page_indices: list of 1-based page indices (user input)
+        dpi: rendering resolution
+    Yields:
+        (page_num, fitz.Pixmap) with RGB samples and no alpha
+    """
+    with document_session(pdf_path, max_bytes=0) as session:
+        for page_num in page_indices:
+            if 1 <= page_num <= session.page_count:
+                yield page_num, session.render(page_num, dpi)
+
+
+def pixmap_to_image(pix) -> Image.Image:
+    """
+    Copy a pixmap's samples into a PIL image (no alpha). The image does not
+    reference the pixmap, so either can be freed first.
+    """
+    mode = {1: "L", 3: "RGB"}[pix.n]
+    return Image.frombytes(mode, (pix.width, pix.height), pix.samples_mv, "raw", mode, pix.stride)
+
+
+def crop_pixmap(pix, box):
+    """
+    Copy a pixel box (x0, y0, x1, y1), relative to the pixmap origin, into a new
+    pixmap. The result keeps the box origin in pix.x / pix.y.
+    """
+    x0, y0, x1, y1 = box
+    irect = fitz.IRect(pix.x + x0, pix.y + y0, pix.x + x1, pix.y + y1) & pix.irect
+    out = fitz.Pixmap(pix.colorspace, irect, False)
+    out.copy(pix, irect)
+    return out
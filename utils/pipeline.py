@@ -0,0 +1,602 @@
+import os
+import csv
+import json
+import threading
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Iterator, List, Optional
+
+import fitz  # PyMuPDF
+import pandas as pd
+
+from utils.bom_handler import extract_bom_from_pdf
+from utils.pdf_to_tiff import crop_pixmap
+from utils.encoding import encode_for_upload
+from utils.ocr_client import detect_text_batch, DEFAULT_BATCH_SIZE, DEFAULT_MAX_IN_FLIGHT
+from utils.postprocess import extract_part_boxes
+from utils.linker import IncrementalLinker
+from utils.annotate import annotate_pixmap, annotate_pdf, preview_pixmap, overlay_json, overlay_svg
+from utils.text_layer import (
+    extract_text_layer_words, is_usable_text_layer, has_callout_text, raster_regions, offset_words, drop_covered_words
+)
+from utils.tiling import choose_dpi, needs_tiling, tile_boxes, drop_cut_words, dedupe_words
+from utils.metrics import span, incr, get_metrics, metrics_scope
+from utils.cache import get_cache
+from utils.document import DocumentSession, document_session
+from utils.results_store import get_results_store
+from utils.fingerprint import page_fingerprint, page_result_key, refs_digest, PAGE_RESULTS_NAMESPACE
+from utils.memory import fit_render, page_pixels, page_budget_bytes, peak_rss_mb
+from utils.page_classifier import suggest_pages, format_page_range
+
+MIN_ANNOTATION_DPI = 72  # lowest DPI a page is annotated at to fit a memory budget
+
+
+def parse_page_range(input_str, total_pages):
+    """
+    Parse a page selection like "1,3,5-7" into a sorted list of 1-based pages.
+    Pages outside 1..total_pages and malformed parts are ignored.
+    """
+    pages = set()
+    if not input_str:
+        return []
+    for p in str(input_str).split(","):
+        p = p.strip()
+        if "-" in p:
+            try:
+                start, end = map(int, p.split("-"))
+                for i in range(start, end + 1):
+                    if 1 <= i <= total_pages:
+                        pages.add(i)
+            except ValueError:
+                continue
+        elif p.isdigit():
+            i = int(p)
+            if 1 <= i <= total_pages:
+                pages.add(i)
+    return sorted(pages)
+
+
+def _plan_page(session: DocumentSession, page_num: int, dpi: int, use_text_layer: bool, tiling: str,
+               budget: int = 0, bom_refs: Optional[set] = None):
+    """
+    Render one diagram page and decide where its words come from.
+    The text layer replaces OCR only when it holds BOM callouts (has_callout_text).
+    With a memory budget the page is rendered in grayscale at a DPI whose buffers
+    fit it; pages too large even at MIN_DPI are not rendered whole but OCRed in
+    tiles rendered one at a time (whatever tiling says).
+    Returns (pixmap or None, page_dpi, text-layer words, OCR jobs, word source); each
+    OCR job is {"box": region in page pixels or None for the whole page, "tile": tile dict or None}.
+    """
+    page = session.page(page_num)
+    page_dpi = choose_dpi(page, dpi)
+    colorspace, bands = "gray" if budget else "rgb", 1
+    if budget:
+        page_dpi, bands = fit_render(page, page_dpi, colorspace, budget)
+    if bands > 1:
+        pix = None
+        width, height = page_pixels(page, page_dpi)
+    else:
+        pix = session.render(page_num, page_dpi, colorspace)
+        width, height = pix.width, pix.height
+
+    with span("text_layer", page=page_num):
+        words = extract_text_layer_words(page, page_dpi) if use_text_layer else []
+    if words and is_usable_text_layer(words) and has_callout_text(words, bom_refs or set()):
+        jobs = [{"box": box, "tile": None} for box in raster_regions(page, page_dpi)]
+        source = "text_layer+ocr" if jobs else "text_layer"
+    elif bands > 1 or needs_tiling(width, height, tiling):
+        words = []
+        jobs = [{"box": t["box"], "tile": t} for t in tile_boxes(width, height)]
+        source = "ocr_tiled"
+    else:
+        words = []
+        jobs = [{"box": None, "tile": None}]
+        source = "ocr"
+    incr("page_sources", source=source)
+    return pix, page_dpi, words, jobs, source
+
+
+def _job_pixmap(session: DocumentSession, page_num: int, page_dpi: int, pix, job: Dict, budget: int = 0):
+    """
+    Pixmap of one OCR job: the page render, a crop of it, or (page not rendered
+    whole) a separate render of the region.
+    """
+    if job["box"] is None:
+        return pix
+    if pix is None:
+        return session.render_clip(page_num, page_dpi, job["box"], "gray" if budget else "rgb")
+    return crop_pixmap(pix, job["box"])
+
+
+def _annotation_pixmap(session: DocumentSession, page_num: int, page_dpi: int, budget: int = 0):
+    """
+    Page render to draw the boxes on and its scale relative to page_dpi pixels;
+    under a memory budget a grayscale render, at a lower DPI if needed to fit.
+    """
+    if not budget:
+        return session.render(page_num, page_dpi), 1.0
+    render_dpi, _ = fit_render(session.page(page_num), page_dpi, "gray", budget, min_dpi=MIN_ANNOTATION_DPI)
+    return session.render(page_num, render_dpi, "gray"), render_dpi / page_dpi
+
+
+def _chunks(pages: List[int], chunk_size: int, first_chunk: Optional[int]):
+    """
+    Split pages into OCR chunks; a smaller first chunk gets the first results out sooner.
+    """
+    chunk_size = max(1, chunk_size)
+    size = max(1, min(first_chunk or chunk_size, chunk_size))
+    start = 0
+    while start < len(pages):
+        yield pages[start:start + size]
+        start += size
+        size = chunk_size
+
+
+def iter_ocr_and_link(
+    pdf_path,
+    diagram_pages: List[int],
+    bom_df: pd.DataFrame,
+    overlay_dir: Optional[str] = None,
+    dpi: int = 300,
+    chunk_size: int = DEFAULT_BATCH_SIZE * DEFAULT_MAX_IN_FLIGHT,
+    use_text_layer: bool = True,
+    tiling: str = "auto",
+    first_chunk: Optional[int] = DEFAULT_BATCH_SIZE,
+    cancel: Optional[threading.Event] = None,
+    overlay: str = "png",
+) -> Iterator[Dict]:
+    """
+    Streaming form of run_ocr_and_link: yields one result per diagram page as
+    soon as its chunk has been OCRed, linked and annotated.
+    Pages are rendered in memory through the document session (whose bounded
+    render cache serves repeated runs on the same upload) and OCRed chunk_size
+    pages at a time (first_chunk pages for the first chunk), so no intermediate
+    files are written.
+    With use_text_layer, pages whose PDF text layer holds BOM callouts take their
+    words from it and only embedded raster images on them are sent to OCR; other
+    pages are OCRed whole, or in overlapping tiles when large.
+    With the result cache enabled, each page's merged words are stored under its
+    content fingerprint, so pages unchanged since an earlier revision of the
+    manual skip the OCR (they are only rendered for the overlay).
+    With a memory budget ($PIPELINE_MEMORY_BUDGET_MB, per process) pages are rendered
+    in grayscale at a DPI that fits it (or OCRed from separately rendered tiles),
+    annotations are drawn on palette images, at a lower DPI when the page would not fit.
+    Only the encoded uploads are kept while a chunk is OCRed; pages are rendered
+    again (or served by the session's bounded render cache) for annotation.
+    Stops early when cancel is set (checked between pages) or when the caller
+    stops iterating.
+    Args:
+        pdf_path: path to input PDF, or an open DocumentSession
+        diagram_pages: list of 1-based diagram pages
+        bom_df: BOM DataFrame with columns ["REF", "PART_NUMBER", "DESCRIPTION"]
+        overlay_dir: folder for annotated PNGs; when None the PNG bytes are returned instead
+        dpi: base rendering resolution (lowered per page for very large sheets)
+        chunk_size: pages rendered and sent to OCR together
+        use_text_layer: read native PDF text before falling back to OCR
+        tiling: "auto" (large pages only), "always" or "never"
+        first_chunk: size of the first chunk (None: chunk_size)
+        cancel: event that stops the run
+        overlay: "png" draws the boxes on the full-resolution page; "vector" keeps them
+            as a JSON/SVG overlay and only encodes a downscaled preview
+    Yields:
+        {"page", "part_boxes", "annotated_image", "overlay", "linked_table", "anomalies_table",
+         "word_source", "page_dpi", "reused", "error", "done", "total"}
+        annotated_image is the PNG (or preview) path when overlay_dir is given, else its bytes
+        overlay is the overlay_json dict ("vector") or None
+        reused is True when the page's words came from a stored fingerprint result
+        error is None, or why OCR failed for (part of) the page after all retries; such a
+            page is still yielded with the words that were recovered, and is not stored
+        anomalies_table covers all pages yielded so far; done/total count pages
+    """
+    bom_refs = set(bom_df["REF"].astype(str).str.upper())
+    # Whether the text layer replaces OCR depends on the BOM (has_callout_text)
+    bom_key = refs_digest(bom_refs) if use_text_layer else None
+    linker = IncrementalLinker(bom_df)
+    cache = get_cache()
+    budget = page_budget_bytes()
+
+    with document_session(pdf_path) as session:
+        pages = [p for p in diagram_pages if 1 <= p <= session.page_count]
+        done = 0
+        for chunk in _chunks(pages, chunk_size, first_chunk):
+            if cancel is not None and cancel.is_set():
+                return
+            reused_pages = set()
+            page_words = {}
+            page_info = {}
+            page_keys = {}
+            ocr_jobs = []
+
+            for page_num in chunk:
+                if cache is not None:
+                    key = page_result_key(
+                        page_fingerprint(session.page(page_num)), "diagram", dpi=dpi,
+                        text_layer=use_text_layer, bom=bom_key, tiling=tiling
+                    )
+                    stored = cache.get(PAGE_RESULTS_NAMESPACE, key)
+                    if stored is not None:
+                        incr("pages_reused", stage="diagram")
+                        reused_pages.add(page_num)
+                        page_words[page_num] = stored["words"]
+                        page_info[page_num] = (stored["page_dpi"], stored["source"])
+                        continue
+                    page_keys[page_num] = key
+
+                pix, page_dpi, words, jobs, source = _plan_page(
+                    session, page_num, dpi, use_text_layer, tiling, budget, bom_refs
+                )
+                page_words[page_num] = words
+                page_info[page_num] = (page_dpi, source)
+                for job in jobs:
+                    region = _job_pixmap(session, page_num, page_dpi, pix, job, budget)
+                    # Only the compact upload is kept until the chunk has been OCRed
+                    job.update({"page": page_num, "data": encode_for_upload(region, "vision")[0],
+                                "dx": region.x - (pix.x if pix else 0), "dy": region.y - (pix.y if pix else 0)})
+                    ocr_jobs.append(job)
+                    del region
+                # The page is rendered again (or served by the bounded session cache)
+                # for annotation instead of held until the chunk is OCRed
+                del pix
+
+            ocr_errors = {}
+            with span("ocr_batch", images=len(ocr_jobs)):
+                ocr_results = detect_text_batch(
+                    [job["data"] for job in ocr_jobs],
+                    dpi=[page_info[job["page"]][0] for job in ocr_jobs],
+                    errors=ocr_errors,
+                )
+            page_errors = {ocr_jobs[i]["page"]: message for i, message in ocr_errors.items()}
+            for job, (full_text, words) in zip(ocr_jobs, ocr_results):
+                if job["tile"] is not None:
+                    words = drop_cut_words(words, job["tile"])
+                if job["dx"] or job["dy"]:
+                    words = offset_words(words, job["dx"], job["dy"])
+                if page_words[job["page"]] and job["tile"] is None:
+                    words = drop_covered_words(words, page_words[job["page"]])
+                page_words[job["page"]].extend(words)
+            del ocr_jobs
+            for page_num, key in page_keys.items():
+                if page_num not in page_errors:
+                    page_dpi, source = page_info[page_num]
+                    cache.set(PAGE_RESULTS_NAMESPACE, key,
+                              {"words": page_words[page_num], "page_dpi": page_dpi, "source": source})
+
+            for page_num in chunk:
+                if cancel is not None and cancel.is_set():
+                    return
+                page_dpi, source = page_info[page_num]
+                words = page_words.pop(page_num)
+                pix, scale = _annotation_pixmap(session, page_num, page_dpi, budget)
+                with span("postprocess", page=page_num):
+                    if source == "ocr_tiled":
+                        words = dedupe_words(words)
+                    part_boxes = extract_part_boxes(words, bom_refs)
+
+                with span("annotate", page=page_num):
+                    annotated, page_overlay = _annotate_page(
+                        pix, part_boxes, page_dpi, page_num, overlay_dir, overlay, scale
+                    )
+                del pix
+                with span("link", page=page_num):
+                    linked_table = linker.add_page(page_num, part_boxes)
+                    anomalies_table = linker.anomalies()
+
+                done += 1
+                yield {
+                    "page": page_num,
+                    "part_boxes": part_boxes,
+                    "annotated_image": annotated,
+                    "overlay": page_overlay,
+                    "linked_table": linked_table,
+                    "anomalies_table": anomalies_table,
+                    "word_source": source,
+                    "page_dpi": page_dpi,
+                    "reused": page_num in reused_pages,
+                    "error": page_errors.get(page_num),
+                    "done": done,
+                    "total": len(pages),
+                }
+
+
+def _annotate_page(pix, part_boxes: List[Dict], page_dpi: int, page_num: int,
+                   overlay_dir: Optional[str], overlay: str, scale: float = 1.0):
+    """
+    Returns (annotated image path or bytes, overlay dict or None) for one page.
+    scale: pix pixels per page_dpi pixel (below 1 when rendered smaller to fit a memory budget)
+    """
+    width, height = round(pix.width / scale), round(pix.height / scale)
+    base = os.path.join(overlay_dir, f"annotated_diagram_{page_num}") if overlay_dir else None
+    if overlay != "vector":
+        return annotate_pixmap(pix, part_boxes, base and f"{base}.png", scale), None
+
+    page_overlay = overlay_json(part_boxes, width, height, page_dpi)
+    # Shrunk in place and the render may be cached in the session; copy without alpha
+    preview = preview_pixmap(fitz.Pixmap(pix, 0), part_boxes, full_width=width)
+    if base is None:
+        return preview, page_overlay
+    os.makedirs(overlay_dir, exist_ok=True)
+    with open(f"{base}.json", "w") as f:
+        json.dump(page_overlay, f)
+    with open(f"{base}.svg", "w") as f:
+        f.write(overlay_svg(part_boxes, width, height))
+    with open(f"{base}.png", "wb") as f:
+        f.write(preview)
+    return f"{base}.png", page_overlay
+
+
+def run_ocr_and_link(
+    pdf_path,
+    diagram_pages: List[int],
+    bom_df: pd.DataFrame,
+    overlay_dir: Optional[str] = None,
+    dpi: int = 300,
+    chunk_size: int = DEFAULT_BATCH_SIZE * DEFAULT_MAX_IN_FLIGHT,
+    use_text_layer: bool = True,
+    tiling: str = "auto",
+    overlay: str = "png",
+) -> Dict:
+    """
+    OCR the diagram pages, detect part callouts and link them to the BOM
+    (all pages at once; see iter_ocr_and_link for the arguments and a streaming form).
+    Returns:
+        {"detected_refs_by_page", "annotated_images", "linked_tables", "anomalies_table",
+         "word_sources", "page_dpi", "reused_pages", "failed_pages"}
+        annotated_images maps page -> PNG path (overlay_dir given) or PNG bytes
+        word_sources maps page -> "text_layer", "text_layer+ocr", "ocr" or "ocr_tiled"
+        page_dpi maps page -> DPI of the box coordinates and overlay
+        reused_pages lists pages whose words came from an earlier run of identical page content
+        failed_pages maps page -> OCR error for pages Vision could not (fully) process
+    """
+    result = {
+        "detected_refs_by_page": {},
+        "annotated_images": {},
+        "linked_tables": {},
+        "anomalies_table": None,
+        "word_sources": {},
+        "page_dpi": {},
+        "reused_pages": [],
+        "failed_pages": {},
+    }
+    for page in iter_ocr_and_link(
+        pdf_path, diagram_pages, bom_df, overlay_dir=overlay_dir, dpi=dpi, chunk_size=chunk_size,
+        use_text_layer=use_text_layer, tiling=tiling, first_chunk=None, overlay=overlay
+    ):
+        page_num = page["page"]
+        result["detected_refs_by_page"][page_num] = page["part_boxes"]
+        result["annotated_images"][page_num] = page["annotated_image"]
+        result["linked_tables"][page_num] = page["linked_table"]
+        result["word_sources"][page_num] = page["word_source"]
+        result["page_dpi"][page_num] = page["page_dpi"]
+        if page["reused"]:
+            result["reused_pages"].append(page_num)
+        if page["error"]:
+            result["failed_pages"][page_num] = page["error"]
+        result["anomalies_table"] = page["anomalies_table"]
+
+    if result["anomalies_table"] is None:
+        # No pages: everything in the BOM is missing from the diagrams
+        result["anomalies_table"] = IncrementalLinker(bom_df).anomalies()
+    return result
+
+
+def process_document(job: Dict, output_dir: str = "output") -> Dict:
+    """
+    Run the full flow (BOM extraction -> OCR -> linking) for one PDF and write results.
+    job: {"pdf": path, "diagram_pages": "1,3-5" or list, "table_pages": ..., "manufacturer": str,
+          (page selections left out or "auto" are filled in by the page classifier)
+          "name": optional output folder name, "document_name": optional name in the results store
+          (default: name), "use_text_layer": optional bool (default True),
+          "table_engine": optional "auto"/"local"/"extracttable",
+          "tiling": optional "auto"/"always"/"never", "overlay": optional "png"/"vector"}
+    Writes into output_dir/<name>/: bom.csv, linked_page_<n>.csv, anomalies.csv,
+    overlays/annotated_diagram_<n>.png and summary.json. With overlay "vector" the PNGs
+    are downscaled previews next to .json/.svg overlays, plus an annotated.pdf copy of the input.
+    The BOM and linked detections are also saved to the results store (see get_results_store).
+    Returns the summary dict (never raises; failures are reported in "error").
+    Status is "ok", "error", or "incomplete" when pages still failed at Vision or
+    ExtractTable after retries (listed in failed_table_pages / failed_diagram_pages)
+    or the classifier found no diagram pages to link (see "warning").
+    The summary's "metrics" holds this document's stage timings and counters.
+    Set $PIPELINE_MEMORY_BUDGET_MB to bound page buffers per process (see iter_ocr_and_link).
+    """
+    with metrics_scope() as scope:
+        with span("document"):
+            summary = _process_document(job, output_dir)
+    summary["metrics"] = scope.snapshot()
+    summary["peak_rss_mb"] = round(peak_rss_mb(), 1)  # of the (worker) process so far
+    with open(os.path.join(summary["output_dir"], "summary.json"), "w") as f:
+        json.dump(summary, f, indent=2, default=str)
+    return summary
+
+
+def _process_document(job: Dict, output_dir: str) -> Dict:
+    pdf_path = job["pdf"]
+    name = job.get("name") or os.path.splitext(os.path.basename(pdf_path))[0]
+    doc_dir = os.path.join(output_dir, name)
+    summary = {"pdf": pdf_path, "name": name, "output_dir": doc_dir, "status": "ok"}
+    os.makedirs(doc_dir, exist_ok=True)
+
+    try:
+        with DocumentSession(pdf_path, name=job.get("document_name") or name) as session:
+            _run_document(job, session, doc_dir, summary)
+    except Exception as e:
+        summary["status"] = "error"
+        summary["error"] = f"{type(e).__name__}: {e}"
+        summary["traceback"] = traceback.format_exc()
+    return summary
+
+
+def _run_document(job: Dict, session: DocumentSession, doc_dir: str, summary: Dict):
+    """
+    Every stage shares the one open document and its render cache.
+    """
+    total_pages = session.page_count
+    diagram_pages = _as_page_list(job.get("diagram_pages"), total_pages)
+    table_pages = _as_page_list(job.get("table_pages"), total_pages)
+    if _auto_pages(job.get("diagram_pages")) or _auto_pages(job.get("table_pages")):
+        # Only pages the local classifier sees as diagrams/BOM tables go to Vision/ExtractTable
+        suggested = suggest_pages(session)
+        summary["page_classes"] = {label: format_page_range(pages) for label, pages in suggested.items()}
+        if _auto_pages(job.get("table_pages")):
+            table_pages = suggested["table"]
+            if not table_pages:
+                raise ValueError("No table pages selected (the page classifier found none; set table_pages)")
+        if _auto_pages(job.get("diagram_pages")):
+            diagram_pages = suggested["diagram"]
+            if not diagram_pages:
+                # BOM only: nothing was linked, which the caller should not mistake for a full run
+                summary["status"] = "incomplete"
+                summary["warning"] = "The page classifier found no diagram pages; set diagram_pages"
+    summary.update({"diagram_pages": diagram_pages, "table_pages": table_pages})
+    if not table_pages:
+        raise ValueError("No table pages selected")
+
+    bom_df = extract_bom_from_pdf(
+        session, table_pages, job["manufacturer"], engine=job.get("table_engine", "auto")
+    )
+    bom_df.to_csv(os.path.join(doc_dir, "bom.csv"), index=False)
+    summary["bom_rows"] = len(bom_df)
+    if bom_df.attrs.get("failed_pages"):
+        summary["status"] = "incomplete"
+        summary["failed_table_pages"] = bom_df.attrs["failed_pages"]
+    if bom_df.empty:
+        raise ValueError("No BOM rows extracted")
+
+    if diagram_pages:
+        result = run_ocr_and_link(
+            session, diagram_pages, bom_df, overlay_dir=os.path.join(doc_dir, "overlays"),
+            use_text_layer=job.get("use_text_layer", True), tiling=job.get("tiling", "auto"),
+            overlay=job.get("overlay", "png")
+        )
+        if job.get("overlay") == "vector":
+            annotate_pdf(session, result["detected_refs_by_page"], result["page_dpi"],
+                         os.path.join(doc_dir, "annotated.pdf"))
+        for page_num, linked_df in result["linked_tables"].items():
+            linked_df.to_csv(os.path.join(doc_dir, f"linked_page_{page_num}.csv"), index=False)
+        result["anomalies_table"].to_csv(os.path.join(doc_dir, "anomalies.csv"), index=False)
+        summary["linked_rows"] = {p: len(df) for p, df in result["linked_tables"].items()}
+        summary["anomalies"] = len(result["anomalies_table"])
+        summary["word_sources"] = result["word_sources"]
+        summary["page_dpi"] = result["page_dpi"]
+        summary["reused_pages"] = result["reused_pages"]
+        if result["failed_pages"]:
+            summary["status"] = "incomplete"
+            summary["failed_diagram_pages"] = result["failed_pages"]
+
+        store = get_results_store()
+        if store is not None:
+            summary["document_id"] = store.save_document(
+                session, job["manufacturer"], bom_df, result["linked_tables"], result["page_dpi"]
+            )
+
+
+def _auto_pages(pages) -> bool:
+    return pages is None or (isinstance(pages, str) and pages.strip().lower() in ("", "auto"))
+
+
+def _as_page_list(pages, total_pages: int) -> List[int]:
+    if pages is None:
+        return []
+    if isinstance(pages, (list, tuple)):
+        return sorted({int(p) for p in pages if 1 <= int(p) <= total_pages})
+    return parse_page_range(pages, total_pages)
+
+
+def load_jobs(
+    source: str,
+    manufacturer: Optional[str] = None,
+    diagram_pages: Optional[str] = None,
+    table_pages: Optional[str] = None,
+) -> List[Dict]:
+    """
+    Build the job list from a directory of PDFs or a manifest file.
+    Directory: every *.pdf uses the given manufacturer/page ranges.
+    Manifest (.csv or .json): one entry per PDF with columns/keys
+    pdf, manufacturer, diagram_pages, table_pages. Missing values fall back
+    to the given defaults; relative pdf paths are resolved against the manifest.
+    """
+    defaults = {"manufacturer": manufacturer, "diagram_pages": diagram_pages, "table_pages": table_pages}
+    if os.path.isdir(source):
+        entries = [
+            {"pdf": f}
+            for f in sorted(os.listdir(source)) if f.lower().endswith(".pdf")
+        ]
+        base_dir = source
+    else:
+        base_dir = os.path.dirname(os.path.abspath(source))
+        if source.lower().endswith(".json"):
+            with open(source) as f:
+                entries = json.load(f)
+        else:
+            with open(source, newline="") as f:
+                entries = list(csv.DictReader(f))
+
+    jobs = []
+    used_names = set()
+    for entry in entries:
+        job = dict(defaults)
+        job.update({k: v for k, v in entry.items() if v not in (None, "")})
+        if not os.path.isabs(job["pdf"]):
+            job["pdf"] = os.path.join(base_dir, job["pdf"])
+        if not job.get("manufacturer"):
+            raise ValueError(f"No manufacturer given for {job['pdf']}")
+
+        name = job.get("name") or os.path.splitext(os.path.basename(job["pdf"]))[0]
+        candidate, n = name, 2
+        while candidate in used_names:
+            candidate = f"{name}_{n}"
+            n += 1
+        used_names.add(candidate)
+        job["name"] = candidate
+        jobs.append(job)
+    return jobs
+
+
+def run_batch(jobs: List[Dict], output_dir: str = "output", workers: Optional[int] = None) -> List[Dict]:
+    """
+    Process documents across a process pool.
+    workers: number of worker processes (defaults to os.cpu_count(); 1 runs inline)
+    Returns the per-document summaries in job order and writes output_dir/batch_summary.json,
+    plus the metrics of all documents merged into metrics.json and metrics.prom.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    summaries = [None] * len(jobs)
+    metrics = get_metrics()  # documents are merged in as they finish (live for /metrics)
+
+    if workers == 1:
+        for i, job in enumerate(jobs):
+            summaries[i] = process_document(job, output_dir)
+            metrics.merge(summaries[i]["metrics"])
+            _print_progress(summaries[i], i + 1, len(jobs))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(workers,)) as pool:
+            futures = {pool.submit(process_document, job, output_dir): i for i, job in enumerate(jobs)}
+            for done, future in enumerate(as_completed(futures), start=1):
+                summaries[futures[future]] = future.result()
+                metrics.merge(summaries[futures[future]]["metrics"])
+                _print_progress(summaries[futures[future]], done, len(jobs))
+
+    with open(os.path.join(output_dir, "batch_summary.json"), "w") as f:
+        json.dump(summaries, f, indent=2, default=str)
+    metrics.write_json(os.path.join(output_dir, "metrics.json"))
+    with open(os.path.join(output_dir, "metrics.prom"), "w") as f:
+        f.write(metrics.to_prometheus())
+    return summaries
+
+
+def _init_worker(workers: int):
+    # Each worker gets an equal share of the Vision/ExtractTable rate limits
+    os.environ["PIPELINE_RATE_SHARE"] = str(workers)
+
+
+def _print_progress(summary: Dict, done: int, total: int):
+    status = summary["status"]
+    if status == "error":
+        status = f"error ({summary.get('error')})"
+    elif status == "incomplete" and summary.get("warning"):
+        status = f"incomplete ({summary['warning']})"
+    elif status == "incomplete":
+        failed = len(summary.get("failed_table_pages", {})) + len(summary.get("failed_diagram_pages", {}))
+        status = f"incomplete ({failed} pages failed after retries)"
+    print(f"[{done}/{total}] {summary['name']}: {status}")
@@ -1,9 +1,22 @@
+import os
 import re
-from typing import List, Dict, Optional
-from wordfreq import zipf_frequency
+import tempfile
+from functools import lru_cache
+from typing import Iterable, List, Dict, Optional
+from utils.cache import CACHE_DIR, cache_enabled
+from utils.metrics import incr
+from utils.spatial import GridIndex, suppress_duplicates
 
 TOKEN_RE = re.compile(r"^[A-Z0-9]{1,8}$", re.IGNORECASE)
+EDGE_PUNCT_RE = re.compile(r"^[^A-Za-z0-9]+|[^A-Za-z0-9]+$")
+PAGE_NUMBER_RE = re.compile(r"\d{1,2}")
+LEXICON_WORD_RE = re.compile(r"[a-z]{1,8}")  # only shapes TOKEN_RE can produce without digits
 ENGLISH_ZIPF_THRESHOLD = 2.0
+FRAGMENT_RE = re.compile(r"^[A-Za-z0-9]{1,3}$")  # pieces of a callout Vision may split ("1" "2" for 12)
+MERGE_GAP_RATIO = 0.6     # max gap between callout fragments, in text heights
+TIGHT_GAP_RATIO = 0.2     # fragments this close are one callout even when the BOM does not say so
+MAX_BASELINE_SHIFT = 0.3  # max vertical offset between fragments, in text heights
+DUPLICATE_IOU = 0.3       # the same token overlapping this much is one callout (double-printed labels)
 
 STOPWORDS = {
     # ... (same as your previous list)
@@ -23,10 +36,55 @@ STOPWORDS = {
     "LEFT","RIGHT","ASS","FOR","SIDE","STAND","SCREW","BOARD"
 }
 
-def _is_common_english_word(token: str) -> bool:
-    if any(ch.isdigit() for ch in token):
-        return False
-    return zipf_frequency(token.lower(), "en") >= ENGLISH_ZIPF_THRESHOLD
+def lexicon_path(threshold: float = ENGLISH_ZIPF_THRESHOLD) -> Optional[str]:
+    """
+    Where the precompiled lexicon lives: $PIPELINE_LEXICON_PATH, else the cache
+    folder, or None when caching is off (PIPELINE_CACHE=0).
+    """
+    if os.getenv("PIPELINE_LEXICON_PATH"):
+        return os.getenv("PIPELINE_LEXICON_PATH")
+    if not cache_enabled():
+        return None
+    cache_dir = os.getenv("PIPELINE_CACHE_DIR", CACHE_DIR)
+    return os.path.join(cache_dir, f"english_lexicon_z{threshold}.txt")
+
+
+def build_lexicon(threshold: float = ENGLISH_ZIPF_THRESHOLD, path: Optional[str] = None) -> frozenset:
+    """
+    Collect every English word (1-8 ASCII letters) with zipf frequency >= threshold
+    from wordfreq. With a path it is also saved as a word-per-line file, so later
+    processes can load the lexicon without importing wordfreq.
+    """
+    from wordfreq import iter_wordlist, zipf_frequency
+
+    words = set()
+    for word in iter_wordlist("en"):  # most frequent first
+        if zipf_frequency(word, "en") < threshold:
+            break
+        if LEXICON_WORD_RE.fullmatch(word):
+            words.add(word)
+
+    if path is None:
+        return frozenset(words)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        f.write("\n".join(sorted(words)))
+    os.replace(tmp_path, path)
+    return frozenset(words)
+
+
+def load_lexicon(threshold: float = ENGLISH_ZIPF_THRESHOLD) -> frozenset:
+    """
+    Load the precompiled lexicon, building it on first use (kept in memory only
+    when caching is off).
+    """
+    path = lexicon_path(threshold)
+    if path is None or not os.path.exists(path):
+        return build_lexicon(threshold, path)
+    with open(path) as f:
+        return frozenset(f.read().split())
+
 
 def _leading_zero_shift_numeric(s: str) -> Optional[str]:
     if not s.isdigit():
@@ -37,6 +95,7 @@ def _leading_zero_shift_numeric(s: str) -> Optional[str]:
         return None
     return stripped + ("0" * leading)
 
+@lru_cache(maxsize=65536)
 def _normalize_token(raw: str) -> Optional[str]:
     if raw is None:
         return None
@@ -51,72 +110,212 @@ def _normalize_token(raw: str) -> Optional[str]:
             t = t[:-2] + "0" + t[-1]
     return t
 
-def extract_part_boxes(words: List[Dict], bom_refs: set) -> List[Dict]:
+def _right_neighbours(frags: List[Dict]) -> Dict[int, tuple]:
     """
-    Returns a list of dicts for each detected part number:
-    {
-        'token': str,
-        'x': float,
-        'y': float,
-        'w': float,
-        'h': float,
-        'color': 'green' or 'red'
-    }
-    Only part numbers (not noise) are included.
+    For each fragment, the closest fragment starting just to its right on the
+    same line with a similar height: {index: (neighbour index, gap in pixels)}.
     """
-    candidates = []
-    for w in words:
-        raw = (w.get("text") or "").strip()
-        if raw == "":
+    index = GridIndex.from_boxes(frags)
+    right = {}
+    for i, w in enumerate(frags):
+        h = w["h"]
+        if h <= 0:
             continue
-        token = re.sub(r"^[^A-Za-z0-9]+|[^A-Za-z0-9]+$", "", raw)
-        if token == "":
+        x1 = w["x"] + w["w"] / 2
+        best = None
+        for j in index.query(x1, w["y"] - h / 2, x1 + MERGE_GAP_RATIO * h, w["y"] + h / 2):
+            o = frags[j]
+            gap = (o["x"] - o["w"] / 2) - x1
+            if j == i or o["x"] <= w["x"] or gap < -0.1 * h or gap > MERGE_GAP_RATIO * h:
+                continue
+            if abs(o["y"] - w["y"]) > MAX_BASELINE_SHIFT * h or not 0.7 <= o["h"] / h <= 1.4:
+                continue
+            if best is None or gap < best[1]:
+                best = (j, gap)
+        if best is not None:
+            right[i] = best
+    return right
+
+
+def merge_split_callouts(words: List[Dict], bom_refs: set) -> List[Dict]:
+    """
+    Join runs of short words printed side by side on one line into a single word
+    (e.g. "1" "2" -> "12"). A run is joined when its pieces nearly touch, or when
+    the joined text is a BOM REF and the pieces are not all REFs themselves.
+    Neighbours come from a grid index, so dense pages stay near-linear.
+    """
+    frags = [w for w in words if FRAGMENT_RE.match((w.get("text") or "").strip())]
+    if len(frags) < 2:
+        return words
+    right = _right_neighbours(frags)
+    left = {}
+    for i, (j, gap) in right.items():
+        if j not in left or gap < left[j][1]:
+            left[j] = (i, gap)
+
+    merged, absorbed = {}, set()
+    for start in range(len(frags)):
+        if start in left or start not in right:
             continue
-        if not TOKEN_RE.match(token):
+        chain, gaps, cur = [start], [], start
+        while cur in right and left[right[cur][0]][0] == cur:
+            nxt, gap = right[cur]
+            chain.append(nxt)
+            gaps.append(gap)
+            cur = nxt
+        if len(chain) < 2:
             continue
-        candidates.append({
-            "raw": token,
-            "y": float(w.get("y", 0)),
-            "meta": w
-        })
-
-    # Exclude bottom-most pure-numeric token (likely page number)
-    page_candidate_index = None
-    max_y = -1.0
-    for idx, c in enumerate(candidates):
-        raw = c["raw"]
-        if re.fullmatch(r"\d{1,2}", raw):
-            if c["y"] > max_y:
-                max_y = c["y"]
-                page_candidate_index = idx
-
-    found = []
-    for idx, c in enumerate(candidates):
-        if page_candidate_index is not None and idx == page_candidate_index:
+        parts = [frags[k]["text"].strip() for k in chain]
+        joined = "".join(parts)
+        h = max(frags[k]["h"] for k in chain)
+        in_bom = joined.upper() in bom_refs and not all(p.upper() in bom_refs for p in parts)
+        if len(joined) > 8 or not (in_bom or max(gaps) <= TIGHT_GAP_RATIO * h):
             continue
-        raw = c["raw"].upper()
+        x0 = min(frags[k]["x"] - frags[k]["w"] / 2 for k in chain)
+        x1 = max(frags[k]["x"] + frags[k]["w"] / 2 for k in chain)
+        y0 = min(frags[k]["y"] - frags[k]["h"] / 2 for k in chain)
+        y1 = max(frags[k]["y"] + frags[k]["h"] / 2 for k in chain)
+        merged[id(frags[start])] = dict(
+            frags[start], text=joined, x=(x0 + x1) / 2, y=(y0 + y1) / 2, w=x1 - x0, h=y1 - y0
+        )
+        absorbed.update(id(frags[k]) for k in chain[1:])
+
+    if not merged:
+        return words
+    incr("callouts_merged", len(absorbed))
+    return [merged.get(id(w), w) for w in words if id(w) not in absorbed]
+
+
+class TokenClassifier:
+    """
+    Decides which OCR words are part callouts. Built once per process: holds the
+    English lexicon (loaded lazily) and memoizes the per-token decisions, which
+    repeat heavily across a page and across pages.
+    """
+
+    def __init__(self, stopwords: Iterable[str] = STOPWORDS, threshold: float = ENGLISH_ZIPF_THRESHOLD,
+                 lexicon: Optional[Iterable[str]] = None):
+        self.stopwords = frozenset(stopwords)
+        self.threshold = threshold
+        self._lexicon = frozenset(lexicon) if lexicon is not None else None
+        self.clean = lru_cache(maxsize=65536)(self._clean)
+        self.classify = lru_cache(maxsize=65536)(self._classify)
+
+    @property
+    def lexicon(self) -> frozenset:
+        if self._lexicon is None:
+            self._lexicon = load_lexicon(self.threshold)
+        return self._lexicon
+
+    def is_common_english_word(self, token: str) -> bool:
+        # Lexicon only holds letters, so tokens with digits never match
+        return token.lower() in self.lexicon
+
+    @staticmethod
+    def _clean(text: str) -> Optional[str]:
+        """
+        Strip surrounding punctuation; None unless the rest looks like a callout token.
+        """
+        raw = text.strip()
+        if raw == "":
+            return None
+        token = EDGE_PUNCT_RE.sub("", raw)
+        if token == "" or not TOKEN_RE.match(token):
+            return None
+        return token
+
+    def _classify(self, raw: str) -> Optional[str]:
+        """
+        raw: upper-cased candidate token. Returns the normalized part token, or None for noise.
+        """
         token = _normalize_token(raw)
         if not token:
-            continue
+            return None
         if token.isdigit():
             if len(token) < 1 or len(token) > 4:
-                continue
+                return None
             # Do NOT filter numeric tokens by stopwords or English word
         else:
-            if raw in STOPWORDS:
+            if raw in self.stopwords:
+                return None
+            if self.is_common_english_word(raw):
+                return None
+            if len(token) < 2 or len(token) > 8:
+                return None
+        return token
+
+    def extract_part_boxes(self, words: List[Dict], bom_refs: set) -> List[Dict]:
+        """
+        Classify a whole page of OCR words at once (see extract_part_boxes).
+        """
+        words = merge_split_callouts(words, bom_refs)
+        candidates = []
+        for w in words:
+            token = self.clean(w.get("text") or "")
+            if token is None:
                 continue
-            if _is_common_english_word(raw):
+            candidates.append((token, float(w.get("y", 0)), w))
+
+        # Exclude bottom-most pure-numeric token (likely page number)
+        page_candidate_index = None
+        max_y = -1.0
+        for idx, (raw, y, _) in enumerate(candidates):
+            if y > max_y and PAGE_NUMBER_RE.fullmatch(raw):
+                max_y = y
+                page_candidate_index = idx
+
+        found = []
+        for idx, (raw, _, meta) in enumerate(candidates):
+            if idx == page_candidate_index:
                 continue
-            if len(token) < 2 or len(token) > 8:
+            token = self.classify(raw.upper())
+            if token is None:
                 continue
+            color = "green" if token in bom_refs else "red"
+            box = meta.copy()
+            box.update({"token": token, "color": color})
+            found.append(box)
+
+        kept = suppress_duplicates(found, "token", DUPLICATE_IOU)
+        if len(kept) < len(found):
+            incr("callouts_deduplicated", len(found) - len(kept))
+        found = kept
+
+        # Sort: numeric first, then alphanumeric
+        def _sort_key(x: Dict):
+            t = x["token"]
+            return (0, int(t)) if t.isdigit() else (1, t)
+        return sorted(found, key=_sort_key)
+
+
+_default_classifier = None
+
+
+def get_classifier() -> TokenClassifier:
+    global _default_classifier
+    if _default_classifier is None:
+        _default_classifier = TokenClassifier()
+    return _default_classifier
+
+
+def extract_part_boxes(words: List[Dict], bom_refs: set) -> List[Dict]:
+    """
+    Returns a list of dicts for each detected part number:
+    {
+        'token': str,
+        'x': float,
+        'y': float,
+        'w': float,
+        'h': float,
+        'color': 'green' or 'red'
+    }
+    Only part numbers (not noise) are included. Callouts Vision split into
+    pieces are joined and repeated detections of one callout are dropped.
+    """
+    return get_classifier().extract_part_boxes(words, bom_refs)
 
-        color = "green" if token in bom_refs else "red"
-        box = c["meta"].copy()
-        box.update({"token": token, "color": color})
-        found.append(box)
 
-    # Sort: numeric first, then alphanumeric
-    def _sort_key(x: Dict):
-        t = x["token"]
-        return (0, int(t)) if t.isdigit() else (1, t)
-    return sorted(found, key=_sort_key)
\ No newline at end of file
+if __name__ == "__main__":
+    # Prebuild the lexicon (e.g. in a container image) so workers never import wordfreq
+    path = lexicon_path() or os.path.join(CACHE_DIR, f"english_lexicon_z{ENGLISH_ZIPF_THRESHOLD}.txt")
+    print(f"{len(build_lexicon(path=path))} words written to {path}")
@@ -0,0 +1,204 @@
+import hashlib
+import os
+import random
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+import requests
+
+from utils.metrics import incr
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+# Per-service defaults; override with <SERVICE>_RATE_PER_S, <SERVICE>_BURST,
+# <SERVICE>_MAX_RETRIES and <SERVICE>_BUDGET (e.g. VISION_RATE_PER_S=10).
+# Rates are in cost units per second: images for Vision, pages for ExtractTable.
+SERVICE_DEFAULTS = {
+    "vision": {"rate_per_s": 30.0, "burst": 16, "max_retries": 5},
+    "extracttable": {"rate_per_s": 2.0, "burst": 2, "max_retries": 4},
+}
+BASE_DELAY = 1.0   # seconds before the first retry
+MAX_DELAY = 60.0   # cap of the exponential backoff
+
+
+class RetryableError(Exception):
+    """
+    Transient API failure (429/5xx, per-item RESOURCE_EXHAUSTED/UNAVAILABLE, ...).
+    """
+
+    def __init__(self, message: str, status: Optional[int] = None, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class ServiceError(Exception):
+    """
+    API call that failed permanently or ran out of retries.
+    """
+
+
+class QuotaExceeded(ServiceError):
+    """
+    The key's remaining budget cannot cover the call.
+    """
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: rate tokens per second, at most capacity stored.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = max(rate, 1e-6)
+        self.capacity = max(capacity, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1) -> float:
+        """
+        Block until tokens are available (calls larger than capacity wait for a
+        full bucket). Returns the seconds waited.
+        """
+        tokens = min(tokens, self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return waited
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+
+def retry_status(exc: Exception) -> Optional[int]:
+    """
+    HTTP status carried by a client exception, if any (requests, ExtractTable, ...).
+    """
+    for obj in (exc, getattr(exc, "response", None)):
+        status = getattr(obj, "status_code", None) or getattr(obj, "status", None)
+        if isinstance(status, int):
+            return status
+    return None
+
+
+class ApiScheduler:
+    """
+    Central gate for one service and API key: every call takes cost tokens from
+    the bucket, is charged against the remaining budget (when known) and is
+    retried on RetryableError, connection errors and 429/5xx statuses with
+    exponential backoff and full jitter (Retry-After is honoured when given).
+    """
+
+    def __init__(self, service: str, rate_per_s: float, burst: float, max_retries: int,
+                 budget: Optional[float] = None, share: int = 1):
+        self.service = service
+        self.bucket = TokenBucket(rate_per_s, burst)
+        self.max_retries = max_retries
+        self.share = max(1, share)
+        self.budget = None if budget is None else budget / self.share
+        self.used = 0.0
+        self._reported = None
+        self._lock = threading.Lock()
+
+    def set_budget(self, remaining: Optional[float]):
+        """
+        Remaining units for this key (e.g. from ExtractTable check_usage()), split
+        over share processes like the rate; None means unknown. The units used so
+        far are only forgotten when the reported value changes, as it then already
+        accounts for them.
+        """
+        with self._lock:
+            if remaining == self._reported:
+                return
+            self._reported = remaining
+            self.budget = None if remaining is None else remaining / self.share
+            self.used = 0.0
+
+    def _charge(self, cost: float):
+        with self._lock:
+            if self.budget is not None and self.used + cost > self.budget:
+                raise QuotaExceeded(
+                    f"{self.service}: budget exhausted ({self.used:g} of {self.budget:g} used, call needs {cost:g})"
+                )
+            self.used += cost
+        incr("api_budget_used", cost, service=self.service)
+
+    def _refund(self, cost: float):
+        with self._lock:
+            self.used = max(0.0, self.used - cost)
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        delay = retry_after if retry_after else random.uniform(0, min(MAX_DELAY, BASE_DELAY * 2 ** attempt))
+        time.sleep(delay)
+        return delay
+
+    def call(self, fn: Callable, *args, cost: float = 1, **kwargs):
+        """
+        Run fn(*args, **kwargs) under the rate limit, budget and retry policy.
+        Raises QuotaExceeded, or ServiceError once retries are exhausted or on a
+        non-retryable failure.
+        """
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            self._charge(cost)
+            waited = self.bucket.acquire(cost)
+            if waited:
+                incr("rate_limit_wait_seconds", waited, service=self.service)
+            try:
+                return fn(*args, **kwargs)
+            except RetryableError as e:
+                last_error, retry_after, status = e, e.retry_after, e.status
+            except (requests.ConnectionError, requests.Timeout) as e:
+                last_error, retry_after, status = e, None, None
+            except Exception as e:
+                status = retry_status(e)
+                if status not in RETRY_STATUS:
+                    self._refund(cost)
+                    raise ServiceError(f"{self.service}: {type(e).__name__}: {e}") from e
+                last_error, retry_after = e, None
+            self._refund(cost)  # failed calls are not billed
+            incr("api_retries", service=self.service, status=status or "network")
+            if attempt < self.max_retries:
+                self.backoff(attempt, retry_after)
+        raise ServiceError(f"{self.service}: gave up after {self.max_retries + 1} attempts: {last_error}")
+
+
+_schedulers: Dict[tuple, ApiScheduler] = {}
+_schedulers_lock = threading.Lock()
+
+
+def _setting(service: str, name: str, default):
+    value = os.getenv(f"{service.upper()}_{name.upper()}")
+    return type(default)(value) if value not in (None, "") else default
+
+
+def get_scheduler(service: str, api_key: Optional[str] = None) -> ApiScheduler:
+    """
+    Process-wide scheduler per (service, API key), so separate keys get separate quotas.
+    The rate and budget are divided by $PIPELINE_RATE_SHARE (set by run_batch to the
+    number of worker processes) so the pool as a whole stays within the service limits.
+    """
+    key_id = hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:12]
+    with _schedulers_lock:
+        scheduler = _schedulers.get((service, key_id))
+        if scheduler is None:
+            defaults = SERVICE_DEFAULTS[service]
+            share = max(1, int(os.getenv("PIPELINE_RATE_SHARE", "1")))
+            budget = os.getenv(f"{service.upper()}_BUDGET")
+            scheduler = ApiScheduler(
+                service,
+                rate_per_s=_setting(service, "rate_per_s", defaults["rate_per_s"]) / share,
+                burst=max(1.0, _setting(service, "burst", float(defaults["burst"])) / share),
+                max_retries=_setting(service, "max_retries", defaults["max_retries"]),
+                budget=float(budget) if budget else None,
+                share=share,
+            )
+            _schedulers[(service, key_id)] = scheduler
+        return scheduler
@@ -0,0 +1,205 @@
+import os
+import sys
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Union
+
+import pandas as pd
+
+from utils.cache import make_file_key
+from utils.document import DocumentSession
+
+RESULTS_DB = os.getenv("PIPELINE_RESULTS_DB", os.path.join("tmp", "results.sqlite"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    doc_key TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL COLLATE NOCASE,
+    pdf_path TEXT,
+    manufacturer TEXT COLLATE NOCASE,
+    processed_at REAL
+);
+CREATE TABLE IF NOT EXISTS bom_rows (
+    document_id INTEGER NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+    ref TEXT COLLATE NOCASE,
+    part_number TEXT COLLATE NOCASE,
+    description TEXT,
+    page INTEGER
+);
+CREATE TABLE IF NOT EXISTS detections (
+    document_id INTEGER NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+    page INTEGER NOT NULL,
+    ref TEXT COLLATE NOCASE,
+    part_number TEXT COLLATE NOCASE,
+    description TEXT,
+    x REAL, y REAL, w REAL, h REAL,
+    color TEXT,
+    dpi INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_documents_manufacturer ON documents(manufacturer);
+CREATE INDEX IF NOT EXISTS idx_documents_name ON documents(name);
+CREATE INDEX IF NOT EXISTS idx_bom_part_number ON bom_rows(part_number);
+CREATE INDEX IF NOT EXISTS idx_bom_ref ON bom_rows(ref);
+CREATE INDEX IF NOT EXISTS idx_bom_document ON bom_rows(document_id);
+CREATE INDEX IF NOT EXISTS idx_detections_part_number ON detections(part_number);
+CREATE INDEX IF NOT EXISTS idx_detections_ref ON detections(ref);
+CREATE INDEX IF NOT EXISTS idx_detections_document ON detections(document_id, page);
+"""
+
+
+class ResultsStore:
+    """
+    SQLite store of processed manuals: one row per document, its BOM rows and
+    its linked detections (diagram page, REF, part number and box).
+    Part numbers, REFs, manufacturers and document names are indexed and
+    compared case-insensitively. Safe to share between threads and processes
+    (WAL journal, one connection per instance).
+    """
+
+    def __init__(self, path: str = RESULTS_DB):
+        self.path = path
+        db_dir = os.path.dirname(path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(_SCHEMA)
+
+    def save_document(
+        self,
+        pdf_path: Union[str, DocumentSession],
+        manufacturer: str,
+        bom_df: pd.DataFrame,
+        linked_tables: Dict[int, pd.DataFrame],
+        page_dpi: Optional[Dict[int, int]] = None,
+        name: Optional[str] = None,
+    ) -> int:
+        """
+        Store (or replace) the results of one PDF, identified by its content hash.
+        pdf_path: path, or a DocumentSession (its name and bytes are used; in-memory
+            sessions, e.g. uploads, are stored without a pdf_path)
+        linked_tables: {page: DataFrame with LINKED_COLUMNS} as from run_ocr_and_link
+        page_dpi: {page: DPI of the box coordinates}
+        Returns the document id.
+        """
+        if isinstance(pdf_path, DocumentSession):
+            doc_key, name = pdf_path.file_key, name or pdf_path.name
+            stored_path = os.path.abspath(pdf_path.path) if pdf_path.path else None
+        else:
+            doc_key = make_file_key(pdf_path)
+            name = name or os.path.splitext(os.path.basename(pdf_path))[0]
+            stored_path = os.path.abspath(pdf_path)
+        page_dpi = page_dpi or {}
+
+        bom_records = [
+            (row.get("REF"), row.get("PART_NUMBER"), row.get("DESCRIPTION"),
+             int(row["PAGE"]) if pd.notna(row.get("PAGE")) else None)
+            for row in bom_df.to_dict("records")
+        ]
+        detection_records = [
+            (int(page_num), row["REF"], row["PART_NUMBER"], row["DESCRIPTION"],
+             float(row["X"]), float(row["Y"]), float(row["W"]), float(row["H"]), row["Color"],
+             page_dpi.get(page_num))
+            for page_num, linked_df in linked_tables.items() if not linked_df.empty
+            for row in linked_df.to_dict("records")
+        ]
+
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM documents WHERE doc_key = ?", (doc_key,))
+            doc_id = self._conn.execute(
+                "INSERT INTO documents (doc_key, name, pdf_path, manufacturer, processed_at) VALUES (?, ?, ?, ?, ?)",
+                (doc_key, name, stored_path, manufacturer, time.time()),
+            ).lastrowid
+            self._conn.executemany(
+                "INSERT INTO bom_rows (document_id, ref, part_number, description, page) VALUES (?, ?, ?, ?, ?)",
+                [(doc_id, *r) for r in bom_records],
+            )
+            self._conn.executemany(
+                "INSERT INTO detections (document_id, page, ref, part_number, description, x, y, w, h, color, dpi) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(doc_id, *r) for r in detection_records],
+            )
+        return doc_id
+
+    def find_part(
+        self,
+        part_number: Optional[str] = None,
+        ref: Optional[str] = None,
+        manufacturer: Optional[str] = None,
+        document: Optional[str] = None,
+        limit: int = 1000,
+    ) -> pd.DataFrame:
+        """
+        Diagram pages and box coordinates showing a part.
+        Any combination of filters may be given; matching is exact and case-insensitive.
+        Returns DataFrame with columns [document, manufacturer, pdf_path, page, ref,
+        part_number, description, x, y, w, h, color, dpi].
+        """
+        where, params = [], []
+        for column, value in (("d.part_number", part_number), ("d.ref", ref),
+                              ("doc.manufacturer", manufacturer), ("doc.name", document)):
+            if value:
+                where.append(f"{column} = ?")
+                params.append(str(value).strip())
+        sql = (
+            "SELECT doc.name AS document, doc.manufacturer, doc.pdf_path, d.page, d.ref, d.part_number, "
+            "d.description, d.x, d.y, d.w, d.h, d.color, d.dpi "
+            "FROM detections d JOIN documents doc ON doc.id = d.document_id"
+        )
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY doc.name, d.page LIMIT ?"
+        with self._lock:
+            return pd.read_sql_query(sql, self._conn, params=params + [limit])
+
+    def documents(self, manufacturer: Optional[str] = None) -> pd.DataFrame:
+        """
+        Processed documents with their BOM row and detection counts.
+        """
+        sql = (
+            "SELECT doc.id, doc.name, doc.manufacturer, doc.pdf_path, doc.processed_at, "
+            "(SELECT COUNT(*) FROM bom_rows b WHERE b.document_id = doc.id) AS bom_rows, "
+            "(SELECT COUNT(*) FROM detections d WHERE d.document_id = doc.id) AS detections "
+            "FROM documents doc"
+        )
+        params = []
+        if manufacturer:
+            sql += " WHERE doc.manufacturer = ?"
+            params.append(manufacturer)
+        with self._lock:
+            return pd.read_sql_query(sql + " ORDER BY doc.name", self._conn, params=params)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_default_store = None
+_store_lock = threading.Lock()
+
+
+def get_results_store() -> Optional[ResultsStore]:
+    """
+    Process-wide store at $PIPELINE_RESULTS_DB, or None when set to "0"/"off".
+    """
+    global _default_store
+    path = os.getenv("PIPELINE_RESULTS_DB", RESULTS_DB)
+    if path.lower() in ("0", "false", "no", "off"):
+        return None
+    with _store_lock:
+        if _default_store is None or _default_store.path != path:
+            _default_store = ResultsStore(path)
+    return _default_store
+
+
+if __name__ == "__main__":
+    # python -m utils.results_store <part number> [manufacturer]
+    if len(sys.argv) < 2:
+        print(get_results_store().documents().to_string(index=False))
+    else:
+        found = get_results_store().find_part(sys.argv[1], manufacturer=sys.argv[2] if len(sys.argv) > 2 else None)
+        print(found.to_string(index=False) if not found.empty else f"No diagrams show part {sys.argv[1]}")
@@ -0,0 +1,107 @@
+import math
+from collections import defaultdict
+from statistics import median
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+CELL_HEIGHTS = 2.0  # grid cell edge in median box heights
+
+
+def corners(box: Dict) -> Tuple[float, float, float, float]:
+    """
+    (x0, y0, x1, y1) of a center-based {"x","y","w","h"} box.
+    """
+    return box["x"] - box["w"] / 2, box["y"] - box["h"] / 2, box["x"] + box["w"] / 2, box["y"] + box["h"] / 2
+
+
+def iou(a: Dict, b: Dict) -> float:
+    ix = min(a["x"] + a["w"] / 2, b["x"] + b["w"] / 2) - max(a["x"] - a["w"] / 2, b["x"] - b["w"] / 2)
+    iy = min(a["y"] + a["h"] / 2, b["y"] + b["h"] / 2) - max(a["y"] - a["h"] / 2, b["y"] - b["h"] / 2)
+    if ix <= 0 or iy <= 0:
+        return 0.0
+    inter = ix * iy
+    union = a["w"] * a["h"] + b["w"] * b["h"] - inter
+    return inter / union if union > 0 else 0.0
+
+
+def cell_size(boxes: Sequence[Dict]) -> float:
+    """
+    Grid cell edge suited to a page of word boxes: a few text heights, so a
+    neighbourhood query touches a handful of cells.
+    """
+    heights = [b["h"] for b in boxes if b["h"] > 0]
+    return max(1.0, CELL_HEIGHTS * median(heights)) if heights else 64.0
+
+
+class GridIndex:
+    """
+    Uniform grid over center-based word/callout boxes (page pixels). Each box is
+    registered in every cell it overlaps, so rectangle queries only look at
+    nearby boxes and page-wide neighbour passes stay near-linear instead of pairwise.
+    Box ids are their insertion order.
+    """
+
+    def __init__(self, cell: float):
+        self.cell = cell
+        self.boxes: List[Dict] = []
+        self._cells = defaultdict(list)
+
+    @classmethod
+    def from_boxes(cls, boxes: Sequence[Dict], cell: Optional[float] = None) -> "GridIndex":
+        index = cls(cell or cell_size(boxes))
+        for box in boxes:
+            index.insert(box)
+        return index
+
+    def _range(self, x0: float, y0: float, x1: float, y1: float):
+        c = self.cell
+        return range(math.floor(x0 / c), math.floor(x1 / c) + 1), range(math.floor(y0 / c), math.floor(y1 / c) + 1)
+
+    def insert(self, box: Dict) -> int:
+        box_id = len(self.boxes)
+        self.boxes.append(box)
+        cols, rows = self._range(*corners(box))
+        for cx in cols:
+            for cy in rows:
+                self._cells[(cx, cy)].append(box_id)
+        return box_id
+
+    def query(self, x0: float, y0: float, x1: float, y1: float) -> Iterator[int]:
+        """
+        Ids of boxes overlapping the rectangle (each once).
+        """
+        seen = set()
+        cols, rows = self._range(x0, y0, x1, y1)
+        for cx in cols:
+            for cy in rows:
+                for box_id in self._cells.get((cx, cy), ()):
+                    if box_id in seen:
+                        continue
+                    seen.add(box_id)
+                    bx0, by0, bx1, by1 = corners(self.boxes[box_id])
+                    if bx0 <= x1 and bx1 >= x0 and by0 <= y1 and by1 >= y0:
+                        yield box_id
+
+    def neighbours(self, box: Dict, margin: float) -> Iterator[int]:
+        """
+        Ids of boxes within margin pixels of box (edge to edge), box itself included if indexed.
+        """
+        x0, y0, x1, y1 = corners(box)
+        return self.query(x0 - margin, y0 - margin, x1 + margin, y1 + margin)
+
+
+def suppress_duplicates(boxes: List[Dict], key: str = "text", min_iou: float = 0.5) -> List[Dict]:
+    """
+    Drop boxes that repeat an earlier kept box with the same key value over the
+    same area (IoU >= min_iou). Order is kept; the first occurrence wins.
+    """
+    if not boxes:
+        return []
+    index = GridIndex(cell_size(boxes))
+    kept = []
+    for box in boxes:
+        if any(index.boxes[i][key] == box[key] and iou(index.boxes[i], box) >= min_iou
+               for i in index.neighbours(box, 0)):
+            continue
+        index.insert(box)
+        kept.append(box)
+    return kept
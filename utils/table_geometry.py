@@ -0,0 +1,46 @@
+import pandas as pd
+from typing import List
+
+from utils.text_layer import extract_text_layer_words, is_usable_text_layer
+
+MIN_TABLE_ROWS = 2
+
+
+def _table_to_df(rows: List[List]) -> pd.DataFrame:
+    """
+    Build an ExtractTable-style DataFrame: string column labels "0".."n-1",
+    header rows kept as data, empty cells as "".
+    """
+    n_cols = max((len(r) for r in rows), default=0)
+    data = [
+        [(str(c).replace("\n", " ").strip() if c is not None else "") for c in r] + [""] * (n_cols - len(r))
+        for r in rows
+    ]
+    return pd.DataFrame(data, columns=[str(i) for i in range(n_cols)])
+
+
+def extract_tables_from_page(page, min_columns: int = 1) -> List[pd.DataFrame]:
+    """
+    Rebuild tables from the page's text layer and vector ruling lines with
+    PyMuPDF's table finder (no rendering, no network).
+    Ruled tables are tried first; pages without ruling fall back to
+    word-alignment ("text") detection.
+    Returns list of DataFrames (same shape as ExtractTable's "df" output) or []
+    if the page has no usable text or no table with at least min_columns columns.
+    """
+    if not is_usable_text_layer(extract_text_layer_words(page, dpi=72)):
+        return []
+
+    for strategy in ("lines", "text"):
+        found = page.find_tables(strategy=strategy)
+        tables = []
+        for tab in found.tables:
+            rows = tab.extract()
+            if tab.header.external and tab.header.names:
+                rows = [tab.header.names] + rows
+            if len(rows) < MIN_TABLE_ROWS or tab.col_count < min_columns:
+                continue
+            tables.append(_table_to_df(rows))
+        if tables:
+            return tables
+    return []
@@ -0,0 +1,93 @@
+import fitz  # PyMuPDF
+from typing import Dict, List, Tuple
+
+from utils.postprocess import extract_part_boxes
+from utils.spatial import GridIndex
+
+MIN_TEXT_WORDS = 1  # pages with fewer usable words go to OCR
+MIN_CALLOUT_WORDS = 3  # BOM callouts a diagram's text layer needs before OCR is skipped
+MAX_GARBLED_RATIO = 0.1  # share of U+FFFD chars above which the text layer is not trusted
+MIN_IMAGE_AREA_RATIO = 0.05  # raster images smaller than this share of the page are not OCRed
+
+
+def extract_text_layer_words(page, dpi: int = 300) -> List[Dict]:
+    """
+    Read the page's native text objects with PyMuPDF word extraction.
+    Returns the same word dicts as ocr_client.detect_text_with_boxes:
+    {'text': str, 'x': float, 'y': float, 'w': float, 'h': float}
+    in the pixel space of a page rendered at dpi (center-based boxes).
+    """
+    mat = page.rotation_matrix * fitz.Matrix(dpi / 72, dpi / 72)
+    words = []
+    for x0, y0, x1, y1, text, *_ in page.get_text("words"):
+        text = text.strip()
+        if not text:
+            continue
+        r = fitz.Rect(x0, y0, x1, y1) * mat
+        words.append({
+            "text": text,
+            "x": (r.x0 + r.x1) / 2,
+            "y": (r.y0 + r.y1) / 2,
+            "w": r.width,
+            "h": r.height
+        })
+    return words
+
+
+def is_usable_text_layer(words: List[Dict]) -> bool:
+    """
+    True when the text layer has real, decodable text (not empty, not glyphs
+    without a unicode mapping).
+    """
+    text = "".join(w["text"] for w in words)
+    if len(words) < MIN_TEXT_WORDS or not any(ch.isalnum() for ch in text):
+        return False
+    return text.count("\ufffd") / len(text) <= MAX_GARBLED_RATIO
+
+
+def has_callout_text(words: List[Dict], bom_refs: set, min_callouts: int = MIN_CALLOUT_WORDS) -> bool:
+    """
+    True when the text layer holds at least min_callouts callouts listed in the
+    BOM (any callout-like tokens when bom_refs is empty; all of them for BOMs
+    shorter than that). A title or a few labels are not enough: diagrams with
+    callouts drawn as outlines have only those in their text layer.
+    """
+    boxes = extract_part_boxes(words, bom_refs)
+    if bom_refs:
+        boxes = [b for b in boxes if b["color"] == "green"]
+        min_callouts = min(min_callouts, len(bom_refs))
+    return len(boxes) >= min_callouts
+
+
+def raster_regions(page, dpi: int = 300, min_area_ratio: float = MIN_IMAGE_AREA_RATIO) -> List[Tuple[int, int, int, int]]:
+    """
+    Pixel boxes (x0, y0, x1, y1), in a page render at dpi, of embedded raster
+    images large enough to hold callouts that the text layer cannot see.
+    """
+    mat = page.rotation_matrix * fitz.Matrix(dpi / 72, dpi / 72)
+    page_area = abs(page.rect)
+    regions = []
+    for info in page.get_image_info():
+        r = fitz.Rect(info["bbox"]) & page.rect  # images may extend past the page edge
+        if r.is_empty or abs(r) < page_area * min_area_ratio:
+            continue
+        regions.append(tuple((r * mat).irect))
+    return regions
+
+
+def offset_words(words: List[Dict], dx: float, dy: float) -> List[Dict]:
+    """
+    Shift word boxes from a clipped render back into full-page pixel space.
+    """
+    return [dict(w, x=w["x"] + dx, y=w["y"] + dy) for w in words]
+
+
+def drop_covered_words(ocr_words: List[Dict], text_words: List[Dict]) -> List[Dict]:
+    """
+    Remove OCR words whose center falls inside a text-layer word box, so text
+    printed over a raster image is not reported twice.
+    """
+    if not ocr_words or not text_words:
+        return ocr_words
+    index = GridIndex.from_boxes(text_words)
+    return [w for w in ocr_words if next(index.query(w["x"], w["y"], w["x"], w["y"]), None) is None]
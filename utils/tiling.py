@@ -0,0 +1,92 @@
+import math
+from typing import Dict, List
+
+from utils.spatial import suppress_duplicates
+
+MIN_DPI = 150
+MAX_PAGE_PIXELS = 150_000_000  # full-page render budget used to pick the DPI of huge sheets
+TILE_THRESHOLD_PIXELS = 20_000_000  # pages above this (about A2 at 300 DPI) are OCRed in tiles
+TILE_PX = 2400  # tile edge in pixels, well inside Vision's size limits
+OVERLAP_PX = 200  # must exceed the largest callout so every word is whole in some tile
+EDGE_MARGIN_PX = 2  # words touching an inner tile edge are cut; the neighbour tile has them whole
+TILING_MODES = ("auto", "always", "never")
+
+
+def choose_dpi(page, base_dpi: int = 300, max_page_pixels: int = MAX_PAGE_PIXELS) -> int:
+    """
+    Rendering DPI for a page from its physical size: base_dpi unless the full
+    page would exceed max_page_pixels, never below MIN_DPI.
+    """
+    area_sq_in = (page.rect.width / 72) * (page.rect.height / 72)
+    if area_sq_in <= 0:
+        return base_dpi
+    fit_dpi = int(math.sqrt(max_page_pixels / area_sq_in))
+    return max(min(base_dpi, fit_dpi), min(MIN_DPI, base_dpi))
+
+
+def needs_tiling(width: int, height: int, mode: str = "auto") -> bool:
+    """
+    Whether a page render of width x height pixels should be OCRed in tiles.
+    """
+    if mode == "always":
+        return True
+    if mode == "never":
+        return False
+    return width * height > TILE_THRESHOLD_PIXELS
+
+
+def _starts(length: int, tile: int, overlap: int) -> List[int]:
+    if length <= tile:
+        return [0]
+    step = tile - overlap
+    starts = list(range(0, length - tile, step))
+    starts.append(length - tile)
+    return starts
+
+
+def tile_boxes(width: int, height: int, tile_px: int = TILE_PX, overlap_px: int = OVERLAP_PX) -> List[Dict]:
+    """
+    Split a width x height page render into overlapping tiles.
+    Returns list of {"box": (x0, y0, x1, y1) in page pixels,
+    "inner": (left, top, right, bottom) flags for edges shared with another tile}.
+    """
+    tiles = []
+    for y0 in _starts(height, tile_px, overlap_px):
+        for x0 in _starts(width, tile_px, overlap_px):
+            x1, y1 = min(x0 + tile_px, width), min(y0 + tile_px, height)
+            tiles.append({
+                "box": (x0, y0, x1, y1),
+                "inner": (x0 > 0, y0 > 0, x1 < width, y1 < height),
+            })
+    return tiles
+
+
+def drop_cut_words(words: List[Dict], tile: Dict) -> List[Dict]:
+    """
+    Remove words (tile pixel coordinates) that touch an inner tile edge; they are
+    fragments of a word the neighbouring tile sees in full.
+    """
+    x0, y0, x1, y1 = tile["box"]
+    w_tile, h_tile = x1 - x0, y1 - y0
+    left, top, right, bottom = tile["inner"]
+    kept = []
+    for w in words:
+        if left and w["x"] - w["w"] / 2 <= EDGE_MARGIN_PX:
+            continue
+        if top and w["y"] - w["h"] / 2 <= EDGE_MARGIN_PX:
+            continue
+        if right and w["x"] + w["w"] / 2 >= w_tile - EDGE_MARGIN_PX:
+            continue
+        if bottom and w["y"] + w["h"] / 2 >= h_tile - EDGE_MARGIN_PX:
+            continue
+        kept.append(w)
+    return kept
+
+
+def dedupe_words(words: List[Dict], min_iou: float = 0.5) -> List[Dict]:
+    """
+    Drop words (page pixel coordinates) that repeat an earlier word with the same
+    text over the same area, as happens in tile overlaps. Only nearby words are
+    compared (grid index), so this stays close to linear.
+    """
+    return suppress_duplicates(words, "text", min_iou)